@@ -1,15 +1,55 @@
 from fastapi import APIRouter, Depends
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import timedelta
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import cached_response
 from app.db.base import get_session
 from app.db.models.ranking import AppStoreRankingDaily
+from app.db.models.rollup import RankingGenreDaily
+from app.services import data_version_service, freshness_service, rollup_service
 
 router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
 
+# 类别日汇总按单个榜单分类（请求的 genre ID）读取：同一 app 可同时上多个分类榜，跨分类相加会重复计数。
+# 接口的 chart_genre 缺省时汇总读取用 DEFAULT_CHART_GENRE（与爬虫 --genre 默认值一致），
+# 明细表查询只在调用方显式传入 chart_genre 时才按分类过滤（缺省保持原来的全分类口径）。
+DEFAULT_CHART_GENRE = "36"
+
+
+async def _scope_version(session: AsyncSession, brand_id: int = 1, country: str = "cn", device: str = "iphone", **_):
+    """响应缓存键中的数据版本：按 (brand_id, country, device) 分片，新数据入库即递增。"""
+    return await data_version_service.get_version(session, brand_id, country, device)
+
+
+async def _latest_chart_date(session: AsyncSession, brand_id: int, country: str, device: str):
+    """分片最近一次 chart_date（新鲜度登记，内存快照）。"""
+    return await freshness_service.latest_date(session, "rankings", brand=brand_id, country=country, device=device)
+
+
+def _chart_genre_filter(chart_genre: Optional[str]) -> list:
+    """明细表的榜单分类条件：仅显式传入时生效。"""
+    return [AppStoreRankingDaily.genre == chart_genre] if chart_genre else []
+
+
+def _rollup_stmt(brand_id: int, country: str, device: str, chart_genre: Optional[str], start_date, end_date, *cols):
+    """类别日汇总（rankings_genre_daily）在分片 + 榜单分类 + 日期区间上的查询；cols 缺省为 merge_days 需要的列。"""
+    R = RankingGenreDaily
+    cols = cols or (R.chart_date, R.apps, R.best_rank_sum, R.best_rank_cnt, R.rank_sum, R.rank_sum_sq,
+                    R.rank_cnt, R.entries)
+    return select(*cols).where(
+        R.brand_id == brand_id,
+        R.country == country,
+        R.device == device,
+        R.genre == (chart_genre or DEFAULT_CHART_GENRE),
+        R.chart_date >= start_date,
+        R.chart_date <= end_date,
+    )
+
+
 @router.get("/topn-trend")
+@cached_response("analytics:topn-trend", _scope_version)
 async def topn_trend(
     days: int = 7,
     top: int = 5,
@@ -27,15 +67,7 @@ async def topn_trend(
     top = max(1, min(top, 50))
 
     # 1) 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"latest_date": None, "x": [], "series": {}}
 
@@ -114,11 +146,13 @@ async def topn_trend(
     }
 
 @router.get("/top-apps")
+@cached_response("analytics:top-apps", _scope_version)
 async def top_apps(
     brand_id: int = 1,          # 0=付费, 1=免费, 2=畅销
     country: str = "cn",
     device: str = "iphone",
     limit: int = 10,
+    chart_genre: Optional[str] = None,  # 榜单分类 genre ID（见 DEFAULT_CHART_GENRE）
     session: AsyncSession = Depends(get_session),
 ):
     """返回最近一次 *chart_date* 的 TopN 应用列表。
@@ -128,15 +162,7 @@ async def top_apps(
     limit = max(1, min(limit, 50))
 
     # 1) 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return []
 
@@ -156,6 +182,7 @@ async def top_apps(
             AppStoreRankingDaily.brand_id == brand_id,
             AppStoreRankingDaily.country == country,
             AppStoreRankingDaily.device == device,
+            *_chart_genre_filter(chart_genre),
         )
         .order_by(
             (AppStoreRankingDaily.ranking.is_(None)).asc(),
@@ -167,17 +194,9 @@ async def top_apps(
     )
     rows = (await session.execute(top_stmt)).all()
 
-    # 3) 同日、同维度下的 genre 占比（全集）
-    genre_stmt = (
-        select(AppStoreRankingDaily.app_genre, func.count().label("cnt"))
-        .where(
-            AppStoreRankingDaily.chart_date == latest_date,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-        .group_by(AppStoreRankingDaily.app_genre)
-    )
+    # 3) 同日、同维度下的 genre 占比（全集，读类别日汇总的明细行数）
+    genre_stmt = _rollup_stmt(brand_id, country, device, chart_genre, latest_date, latest_date,
+                              RankingGenreDaily.app_genre, RankingGenreDaily.entries)
     genre_rows = (await session.execute(genre_stmt)).all()
     genre_counts = { (g or "未知"): int(c) for (g, c) in genre_rows }
     total_count = sum(genre_counts.values()) or 1
@@ -232,6 +251,7 @@ async def volatility_trend(
     brand_id: int = 1,
     country: str = "cn",
     device: str = "iphone",
+    chart_genre: Optional[str] = None,  # 榜单分类 genre ID（见 DEFAULT_CHART_GENRE）
     session: AsyncSession = Depends(get_session),
 ):
     """
@@ -242,53 +262,36 @@ async def volatility_trend(
     days = max(1, min(days, 365))
 
     # 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"labels": [], "values": []}
 
     start_date = latest_date - timedelta(days=days - 1)
 
-    # 查询每一天的排名标准差
-    stmt = (
-        select(
-            AppStoreRankingDaily.chart_date,
-            func.stddev_pop(AppStoreRankingDaily.ranking).label("stddev")
-        )
-        .where(
-            AppStoreRankingDaily.chart_date >= start_date,
-            AppStoreRankingDaily.chart_date <= latest_date,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-            AppStoreRankingDaily.ranking.isnot(None)
-        )
-        .group_by(AppStoreRankingDaily.chart_date)
-        .order_by(AppStoreRankingDaily.chart_date)
-    )
-    rows = await session.execute(stmt)
-    rows = rows.all()
+    # 每一天的排名标准差：由类别日汇总的 和 / 平方和 / 个数 合并还原（只计非空 ranking）
+    stmt = _rollup_stmt(brand_id, country, device, chart_genre, start_date, latest_date)
+    days_map = rollup_service.merge_days((await session.execute(stmt)).all())
 
-    labels = [r[0].isoformat() for r in rows]
-    values = [round(float(r[1]), 2) if r[1] is not None else 0.0 for r in rows]
+    labels, values = [], []
+    for d in sorted(days_map):
+        v = days_map[d]
+        if not v["rank_cnt"]:
+            continue
+        labels.append(d.isoformat())
+        values.append(round(rollup_service.stddev_pop(v["rank_sum"], v["rank_sum_sq"], v["rank_cnt"]), 2))
     return {"labels": labels, "values": values}
 
 
 # 类别热度趋势（趋势视图）
 @router.get("/genre-trend")
+@cached_response("analytics:genre-trend", _scope_version)
 async def genre_trend(
     days: int = 30,
     brand_id: int = 1,
     country: str = "cn",
     device: str = "iphone",
     genre: str = "all",    # 'all' 表示不限定类别
+    chart_genre: Optional[str] = None,  # 榜单分类 genre ID（见 DEFAULT_CHART_GENRE）
     session: AsyncSession = Depends(get_session),
 ):
     """
@@ -300,63 +303,23 @@ async def genre_trend(
     days = max(1, min(days, 365))
 
     # 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"labels": [], "app_count": [], "avg_rank": []}
 
     from datetime import timedelta
     start_date = latest_date - timedelta(days=days - 1)
 
-    # 公共过滤条件
-    def _base_where():
-        conds = [
-            AppStoreRankingDaily.chart_date >= start_date,
-            AppStoreRankingDaily.chart_date <= latest_date,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        ]
-        if genre != "all":
-            conds.append(AppStoreRankingDaily.app_genre == genre)
-        return conds
-
-    # 每日上榜应用数量（去重 app_id）
-    app_cnt_stmt = (
-        select(AppStoreRankingDaily.chart_date, func.count(func.distinct(AppStoreRankingDaily.app_id)))
-        .where(*_base_where())
-        .group_by(AppStoreRankingDaily.chart_date)
-        .order_by(AppStoreRankingDaily.chart_date)
-    )
-    app_cnt_rows = (await session.execute(app_cnt_stmt)).all()
-    app_cnt_map = {d.isoformat(): int(c) for d, c in app_cnt_rows}
-
-    # 每日平均最好名次
-    rank_expr = func.coalesce(AppStoreRankingDaily.ranking, AppStoreRankingDaily.index)
-    best_per_app = (
-        select(
-            AppStoreRankingDaily.chart_date.label("chart_date"),
-            AppStoreRankingDaily.app_id.label("app_id"),
-            func.min(rank_expr).label("best_rank"),
-        )
-        .where(*(_base_where() + [rank_expr.isnot(None)]))
-        .group_by(AppStoreRankingDaily.chart_date, AppStoreRankingDaily.app_id)
-    ).subquery()
-
-    avg_rank_stmt = (
-        select(best_per_app.c.chart_date, func.avg(best_per_app.c.best_rank))
-        .group_by(best_per_app.c.chart_date)
-        .order_by(best_per_app.c.chart_date)
-    )
-    avg_rank_rows = (await session.execute(avg_rank_stmt)).all()
-    avg_rank_map = {d.isoformat(): round(float(v), 2) for d, v in avg_rank_rows if v is not None}
+    # 读类别日汇总：每日去重 app 数、每日平均最好名次（同日同 app 取 MIN(COALESCE(ranking, index))）
+    stmt = _rollup_stmt(brand_id, country, device, chart_genre, start_date, latest_date)
+    if genre != "all":
+        stmt = stmt.where(RankingGenreDaily.app_genre == genre)
+    days_map = rollup_service.merge_days((await session.execute(stmt)).all())
+    app_cnt_map = {d.isoformat(): int(v["apps"]) for d, v in days_map.items()}
+    avg_rank_map = {
+        d.isoformat(): round(v["best_rank_sum"] / v["best_rank_cnt"], 2)
+        for d, v in days_map.items() if v["best_rank_cnt"]
+    }
 
     # 组装完整日期轴
     x_dates = [start_date + timedelta(days=i) for i in range(days)]
@@ -369,6 +332,7 @@ async def genre_trend(
 
 # 各类别环比增长率（增长视图）
 @router.get("/genre-growth")
+@cached_response("analytics:genre-growth", _scope_version)
 async def genre_growth(
     days: int = 30,
     brand_id: int = 1,
@@ -386,15 +350,7 @@ async def genre_growth(
     days = max(1, min(days, 365))
 
     # 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"items": []}
 
@@ -458,11 +414,13 @@ async def genre_growth(
     return {"items": items}
 
 @router.get("/overview-kpis")
+@cached_response("analytics:overview-kpis", _scope_version)
 async def overview_kpis(
     brand_id: int = 1,          # 0=付费, 1=免费, 2=畅销
     country: str = "cn",
     device: str = "iphone",
     days: int = 30,
+    chart_genre: Optional[str] = None,  # 榜单分类 genre ID（见 DEFAULT_CHART_GENRE）
     session: AsyncSession = Depends(get_session),
 ):
     """
@@ -474,15 +432,7 @@ async def overview_kpis(
     - volatility_index: 最新日排名的总体波动（使用 ranking 的总体标准差 stddev_pop），保留两位小数
     """
     # 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {
             "latest_date": None,
@@ -514,6 +464,7 @@ async def overview_kpis(
             AppStoreRankingDaily.brand_id == brand_id,
             AppStoreRankingDaily.country == country,
             AppStoreRankingDaily.device == device,
+            *_chart_genre_filter(chart_genre),
         )
         .distinct()
     )
@@ -528,6 +479,7 @@ async def overview_kpis(
             AppStoreRankingDaily.brand_id == brand_id,
             AppStoreRankingDaily.country == country,
             AppStoreRankingDaily.device == device,
+            *_chart_genre_filter(chart_genre),
         )
         .distinct()
     )
@@ -536,20 +488,16 @@ async def overview_kpis(
     new_entries = len(cur_ids - prev_ids)
     dropped_entries = len(prev_ids - cur_ids)
 
-    # 当前周期各类别占比
+    # 当前周期各类别占比（类别日汇总的明细行数按类别求和）
     genre_stmt = (
-        select(AppStoreRankingDaily.app_genre, func.count().label("cnt"))
-        .where(
-            AppStoreRankingDaily.chart_date >= cur_start,
-            AppStoreRankingDaily.chart_date <= cur_end,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-        .group_by(AppStoreRankingDaily.app_genre)
+        _rollup_stmt(brand_id, country, device, chart_genre, cur_start, cur_end,
+                     RankingGenreDaily.app_genre, func.sum(RankingGenreDaily.entries))
+        .group_by(RankingGenreDaily.app_genre)
     )
     genre_rows = (await session.execute(genre_stmt)).all()
-    genre_counts = {(g or "未知"): int(c) for (g, c) in genre_rows}
+    genre_counts: Dict[str, int] = {}
+    for g, c in genre_rows:
+        genre_counts[g or "未知"] = genre_counts.get(g or "未知", 0) + int(c or 0)
     cur_total = sum(genre_counts.values()) or 1
     if genre_counts:
         top_genre_name, top_genre_cnt = max(genre_counts.items(), key=lambda x: x[1])
@@ -558,18 +506,12 @@ async def overview_kpis(
 
     top_genre_pct = round(top_genre_cnt * 100.0 / cur_total, 1)
 
-    # 最新日的整体波动指数：排名总体标准差（只用非空 ranking）
-    vola_stmt = (
-        select(func.stddev_pop(AppStoreRankingDaily.ranking))
-        .where(
-            AppStoreRankingDaily.chart_date == latest_date,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-            AppStoreRankingDaily.ranking.isnot(None),
-        )
-    )
-    vola_val = (await session.execute(vola_stmt)).scalar_one_or_none()
+    # 最新日的整体波动指数：排名总体标准差（只用非空 ranking），由类别日汇总合并还原
+    latest_day = rollup_service.merge_days(
+        (await session.execute(_rollup_stmt(brand_id, country, device, chart_genre, latest_date, latest_date))).all()
+    ).get(latest_date)
+    vola_val = rollup_service.stddev_pop(latest_day["rank_sum"], latest_day["rank_sum_sq"],
+                                         latest_day["rank_cnt"]) if latest_day else None
     volatility_index = round(float(vola_val), 2) if vola_val is not None else 0.0
 
     return {
@@ -593,18 +535,6 @@ from math import ceil
 # 计算每个 app 在窗口内的总体标准差（stddev_pop）与平均名次（avg_rank），
 # 并可通过 min_presence 控制至少出现多少天才参与排名。
 
-def _stability_base_stmt(days: int, brand_id: int, country: str, device: str, session: AsyncSession):
-    # 最近一次 chart_date
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    return latest_stmt
-
 async def _stability_query(
     *,
     session: AsyncSession,
@@ -618,9 +548,7 @@ async def _stability_query(
 ):
     from datetime import timedelta
 
-    latest_date = (await session.execute(
-        _stability_base_stmt(days, brand_id, country, device, session)
-    )).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"latest_date": None, "period": None, "items": []}
 
@@ -682,6 +610,7 @@ async def _stability_query(
     }
 
 @router.get("/stable-top10")
+@cached_response("analytics:stable-top10", _scope_version)
 async def stable_top10(
     days: int = 30,
     brand_id: int = 1,          # 0=付费, 1=免费, 2=畅销
@@ -707,6 +636,7 @@ async def stable_top10(
     )
 
 @router.get("/volatile-top10")
+@cached_response("analytics:volatile-top10", _scope_version)
 async def volatile_top10(
     days: int = 30,
     brand_id: int = 1,          # 0=付费, 1=免费, 2=畅销
@@ -738,45 +668,31 @@ async def list_genres(
     brand_id: int = 1,
     country: str = "cn",
     device: str = "iphone",
+    chart_genre: Optional[str] = None,  # 榜单分类 genre ID（见 DEFAULT_CHART_GENRE）
     session: AsyncSession = Depends(get_session),
 ):
     """
     返回最近 days 天内（含最新日），在指定 brand_id/country/device 下出现过的 app_genre（中文），
-    按去重 app_id 数量从高到低排序。只返回字符串数组。
+    按窗口内“上榜 app·天”（类别日汇总的每日去重 app 数之和）从高到低排序。只返回字符串数组。
+    注意：排序口径已由“窗口内去重 app 数”改为“上榜 app·天”——窗口去重无法由日汇总相加得到；
+    两者通常只在热度接近的类别间顺序不同，持续在榜的 app 在新口径下权重更高。
     """
     # 找最近一次榜单日期
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"items": []}
 
     from datetime import timedelta
     start_date = latest_date - timedelta(days=max(1, min(days, 365)) - 1)
 
-    # 统计各类别热度（按去重 app_id）
+    # 统计各类别热度（类别日汇总：窗口内每日去重 app 数之和，即“上榜 app·天”）
+    app_days = func.sum(RankingGenreDaily.apps)
     stmt = (
-        select(
-            AppStoreRankingDaily.app_genre,
-            func.count(func.distinct(AppStoreRankingDaily.app_id)).label("cnt"),
-        )
-        .where(
-            AppStoreRankingDaily.chart_date >= start_date,
-            AppStoreRankingDaily.chart_date <= latest_date,
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-            AppStoreRankingDaily.app_genre.isnot(None),
-            AppStoreRankingDaily.app_genre != "",
-        )
-        .group_by(AppStoreRankingDaily.app_genre)
-        .order_by(func.count(func.distinct(AppStoreRankingDaily.app_id)).desc())
+        _rollup_stmt(brand_id, country, device, chart_genre, start_date, latest_date,
+                     RankingGenreDaily.app_genre, app_days)
+        .where(RankingGenreDaily.app_genre != "")
+        .group_by(RankingGenreDaily.app_genre)
+        .order_by(app_days.desc())
     )
     rows = (await session.execute(stmt)).all()
     items = [g for g, _ in rows]
@@ -786,6 +702,7 @@ async def list_genres(
 from collections import defaultdict
 
 @router.get("/feature-importance")
+@cached_response("analytics:feature-importance", _scope_version)
 async def feature_importance(
     days: int = 30,
     brand_id: int = 1,
@@ -815,15 +732,7 @@ async def feature_importance(
     days = max(1, min(days, 365))
 
     # 1) 最近一次 chart_date（按维度过滤）
-    latest_stmt = (
-        select(func.max(AppStoreRankingDaily.chart_date))
-        .where(
-            AppStoreRankingDaily.brand_id == brand_id,
-            AppStoreRankingDaily.country == country,
-            AppStoreRankingDaily.device == device,
-        )
-    )
-    latest_date = (await session.execute(latest_stmt)).scalar_one_or_none()
+    latest_date = await _latest_chart_date(session, brand_id, country, device)
     if not latest_date:
         return {"features": [], "scores": [], "raw_scores": [], "meta": {"n_samples": 0, "latest_date": None, "days": days}}
 
@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_session
 from app.db.models.ranking import AppStoreRankingDaily
 from app.db.models.rating import AppRatings
+from app.services import raw_payload_service
 
 # try:
 #     from app.db.models.app import AppInfo  # 可选：应用元数据(如不存在则跳过)
@@ -73,7 +74,7 @@ async def search_apps(
     country: Optional[str] = Query(None, description="区域，如 cn、us"),
     device: Optional[str] = Query(None, description="设备，如 iphone、ipad、android"),
     brand: Optional[str] = Query(None, description="榜单类型：free/paid/grossing，可选"),
-    genre: Optional[str] = Query(None, description="榜单分类（使用 rank_c->genre 过滤）"),
+    genre: Optional[str] = Query(None, description="榜单分类（按 rank_c_genre 过滤）"),
     window: Optional[int] = Query(None, ge=1, le=366, description="最近N天，和 date_from/date_to 互斥"),
     date_from: Optional[date] = Query(None),
     date_to: Optional[date] = Query(None),
@@ -112,18 +113,8 @@ async def search_apps(
     if brand:
         where_clauses.append(AppRatings.brand == brand)
     if genre:
-        # 兼容不同数据库方言
-        try:
-            dialect_name = session.bind.dialect.name  # 'postgresql', 'mysql', 'sqlite', etc.
-        except Exception:
-            dialect_name = None
-        rank_c_col = AppRatings.rank_c
-        where_clauses.append(rank_c_col.isnot(None))
-        if dialect_name == "postgresql":
-            where_clauses.append(rank_c_col["genre"].astext == genre)
-        else:
-            # MySQL / SQLite(JSON1)
-            where_clauses.append(func.json_extract(rank_c_col, "$.genre") == genre)
+        # 入库时已解析的类型化列（ix_ar_rank_c_genre）
+        where_clauses.append(AppRatings.rank_c_genre == genre)
     if date_from and date_to:
         where_clauses.append(AppRatings.chart_date.between(date_from, date_to))
 
@@ -205,10 +196,12 @@ async def get_app_detail(
     window: Optional[int] = Query(None, ge=1, le=366),
     date_from: Optional[date] = Query(None),
     date_to: Optional[date] = Query(None),
+    include_raw: bool = Query(False, description="是否返回原始 JSON（从 raw_payloads 副表读取）"),
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, Any]:
     """返回单个应用的详细信息（用于对比卡片）。
     优先从 AppInfo 读取 icon/publisher；不存在则回退到排名表的最近一条记录，仅返回 app_name。
+    raw_json 仅在 include_raw=true 时读取（副表按 raw_hash 取；历史行回退到热表的 raw_json 列）。
     """
     app_id = (app_id or "").strip()
     if not app_id:
@@ -226,6 +219,15 @@ async def get_app_detail(
     if last_row is None:
         raise HTTPException(status_code=404, detail="未找到应用或该筛选范围内无数据")
 
+    raw_json = None
+    if include_raw:
+        if last_row.raw_hash:
+            raw_json = await raw_payload_service.load_one_async(session, last_row.raw_hash)
+        else:
+            raw_json = (await session.execute(
+                select(AppStoreRankingDaily.raw_json).where(AppStoreRankingDaily.id == last_row.id)
+            )).scalar_one_or_none()
+
     # 序列化：将 SQLAlchemy 对象转为可 JSON 的字典
     def _to_json(o):
         from decimal import Decimal
@@ -271,7 +273,8 @@ async def get_app_detail(
         "continuous_first_days": last_row.continuous_first_days,
         # 其它
         "source": last_row.source,
-        "raw_json": last_row.raw_json,
+        "raw_json": raw_json,
+        "raw_hash": last_row.raw_hash,
         # 时间
         "crawled_at": _to_json(last_row.crawled_at),
         "updated_at": _to_json(last_row.updated_at),
@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_session  # 你现有的依赖
 from app.db.models.ranking import AppStoreRankingDaily
 from app.db.models.rating import AppRatings  # 使用 AppRatings 表（app_ratings）
+from app.services import freshness_service
 
 router = APIRouter(prefix="/api/v1", tags=["meta"])
 
@@ -32,7 +33,7 @@ async def get_meta_options(
       * is_ad: 固定返回 [0, 1]（即使库中只有单侧值，前端仍可优先展示“全部”）
       * chart_date: 返回 {"min": YYYY-MM-DD, "max": YYYY-MM-DD} 的日期范围（来自 AppRatings.update_time）
       * brand: 去重后的榜单类型列表（来自 AppRatings.brand；预期为 free/paid/grossing）
-      * app_genre: 返回最近N天内（基于 AppRatings.chart_date）在 rank_c->genre 中出现过的去重分类列表
+      * app_genre: 返回最近N天内（基于 AppRatings.chart_date）在 rank_c_genre 中出现过的去重分类列表
     """
     wanted = set(f.strip().lower() for f in (fields.split(",") if fields else [])) & VALID_FIELDS
     if not wanted:
@@ -85,34 +86,18 @@ async def get_meta_options(
         date_to = date.today()
         date_from = date_to - timedelta(days=window - 1)
 
-        # 兼容不同数据库方言
-        try:
-            dialect_name = session.bind.dialect.name
-        except Exception:
-            dialect_name = None
-
-        rank_c_col = AppRatings.rank_c
-        if dialect_name == "postgresql":
-            genre_expr = rank_c_col["genre"].astext
-        else:
-            genre_expr = func.json_extract(rank_c_col, "$.genre")
-
+        # 入库时已解析的类型化列（ix_ar_rank_c_genre）
         stmt = (
-            select(func.distinct(genre_expr).label("g"))
+            select(func.distinct(AppRatings.rank_c_genre).label("g"))
             .where(
                 AppRatings.chart_date.between(date_from, date_to),
-                rank_c_col.isnot(None),
+                AppRatings.rank_c_genre.isnot(None),
             )
         )
         rows = await session.execute(stmt)
         genres: List[str] = []
         for (g,) in rows.fetchall():
-            if g is None:
-                continue
-            val = str(g)
-            if val.startswith('"') and val.endswith('"'):
-                val = val[1:-1]
-            val = val.strip()
+            val = str(g).strip()
             if val:
                 genres.append(val)
 
@@ -169,13 +154,8 @@ async def get_overview_top1(
     """
     返回最新榜单日期的第一名应用信息。
     """
-    # 获取最新 chart_date
-    stmt_date = (
-        select(AppStoreRankingDaily.chart_date)
-        .order_by(AppStoreRankingDaily.chart_date.desc())
-        .limit(1)
-    )
-    latest_chart_date = (await session.execute(stmt_date)).scalar()
+    # 获取最新 chart_date（新鲜度登记，所有分片取最大）
+    latest_chart_date = await freshness_service.latest_date(session, "rankings")
     if not latest_chart_date:
         return {"chart_date": None, "app_name": None, "app_genre": None, "publisher": None}
     # 查询 index=1 的应用
@@ -210,13 +190,8 @@ async def get_overview_top_category(
     """
     返回最新榜单日期出现最多的分类（app_genre）及其占比。
     """
-    # 获取最新 chart_date
-    stmt_date = (
-        select(AppStoreRankingDaily.chart_date)
-        .order_by(AppStoreRankingDaily.chart_date.desc())
-        .limit(1)
-    )
-    latest_chart_date = (await session.execute(stmt_date)).scalar()
+    # 获取最新 chart_date（新鲜度登记，所有分片取最大）
+    latest_chart_date = await freshness_service.latest_date(session, "rankings")
     if not latest_chart_date:
         return {"chart_date": None, "app_genre": None, "count": 0, "ratio": 0.0}
     # 分组统计 app_genre 数量
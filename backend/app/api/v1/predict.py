@@ -1,6 +1,5 @@
 from datetime import date, timedelta, datetime
 from typing import List, Optional
-import json
 import os
 from pathlib import Path
 import hashlib
@@ -14,6 +13,7 @@ from sqlalchemy.orm import aliased
 
 from app.db.base import get_session
 from app.db.models.rating import AppRatings
+from app.services import freshness_service
 from app.predict.api.service import forecast_global as svc_forecast_global
 
 
@@ -58,7 +58,7 @@ class RankHistoryResponse(BaseModel):
 def _brand_key(brand: Optional[str]) -> Optional[str]:
     if not brand:
         return None
-    m = {"free": "rank_a", "paid": "rank_b", "grossing": "rank_c"}
+    m = {"free": "rank_a_change", "paid": "rank_b_change", "grossing": "rank_c_change"}
     b = (brand or "").lower()
     return m.get(b)
 
@@ -69,24 +69,6 @@ def _brand_cn(b: Optional[str]) -> Optional[str]:
     m = {"free": "免费", "paid": "付费", "grossing": "畅销"}
     return m.get(b.lower(), b)
 
-def _json_change(blob) -> Optional[int]:
-    """Safely extract `change` from rank_a/b/c which may be JSON string or dict."""
-    if blob is None:
-        return None
-    if isinstance(blob, dict):
-        try:
-            v = blob.get("change")
-            return int(v) if v is not None else None
-        except Exception:
-            return None
-    # try parse as json string
-    try:
-        obj = json.loads(blob)
-        v = obj.get("change")
-        return int(v) if v is not None else None
-    except Exception:
-        return None
-
 _MODEL_RE = re.compile(r"^(?:global_)?(?P<country>[a-z]{2})_(?P<device>iphone|ipad)_(?P<brand>free|paid|grossing)_(?:[a-z]+)(?:_\d+)?\.pt$", re.IGNORECASE)
 
 def _parse_model_name(model_name: str) -> tuple[str, str, str]:
@@ -109,20 +91,9 @@ async def _latest_date(
     brand: Optional[str] = None
 ) -> Optional[date]:
     """
-    获取给定过滤条件下的最新 update_time（最近一次抓取日期）。
+    获取给定过滤条件下的最新 update_time（最近一次抓取日期），取自新鲜度登记的内存快照。
     """
-    stmt = select(func.max(AppRatings.update_time))
-    if country:
-        stmt = stmt.where(AppRatings.country == country)
-    if device:
-        stmt = stmt.where(AppRatings.device == device)
-    if brand:
-        # 若模型中不存在 brand 字段，请将此 where 条件删除
-        stmt = stmt.where(AppRatings.brand == brand)
-
-    res = await session.execute(stmt)
-    latest: Optional[date] = res.scalar_one_or_none()
-    return latest
+    return await freshness_service.latest_date(session, "app_ratings", brand=brand, country=country, device=device)
 
 
 # ----------------------------
@@ -273,7 +244,7 @@ async def topn_latest(
         AppRatings.icon_url,
     ]
     if rk:
-        cols.append(getattr(AppRatings, rk).label("rank_json"))
+        cols.append(getattr(AppRatings, rk))  # 入库时已解析的 rank_x_change
 
     stmt = (
         select(*cols)
@@ -289,12 +260,9 @@ async def topn_latest(
     rows = await session.execute(stmt)
     items: List[TopNItem] = []
     for row in rows.all():
-        # row fields: when rk present -> (index, app_id, app_name, publisher, icon_url, rank_json)
+        # row fields: when rk present -> (index, app_id, app_name, publisher, icon_url, rank_x_change)
         idx = row[0]; app_id_v = row[1]; app_name = row[2]; publisher = row[3]; icon_url = row[4]
-        change_val = None
-        if rk:
-            rank_json = row[5]
-            change_val = _json_change(rank_json)
+        change_val = row[5] if rk else None
         items.append(
             TopNItem(
                 rank=int(idx) if idx is not None else 999999,
@@ -1,16 +1,22 @@
 # api/rankings.py
 from __future__ import annotations
 
+import base64
+import json
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional, Literal
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Literal, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import and_, asc, desc, func, select
+from sqlalchemy import and_, asc, desc, func, inspect, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import RESPONSE_CACHE, ResponseCache
 from app.db.base import get_session
+from app.db.models.ranking import AppStoreRankingDaily
 from app.db.models.rating import AppRatings
+from app.services import data_version_service, raw_payload_service
 
 router = APIRouter(prefix="/api/v1", tags=["rankings"])
 
@@ -32,6 +38,7 @@ ALLOWED_SORT_COLUMNS = {
     "keyword_cover_top3": AppRatings.keyword_cover_top3,
     "rating": AppRatings.rating,
     "rating_num": AppRatings.rating_num,
+    "rating_count": AppRatings.rating_count,  # 按数值排序（rating_num 为“132万”式原始串）
     "is_ad": AppRatings.is_ad,
 }
 
@@ -51,8 +58,9 @@ def _to_bool_from_int(x: Optional[int]) -> Optional[bool]:
 def _row_to_dict(obj: Any) -> Dict[str, Any]:
     if hasattr(obj, "to_dict"):
         return obj.to_dict()  # type: ignore[attr-defined]
-    # Fallback generic serializer
-    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}  # type: ignore[attr-defined]
+    # Fallback generic serializer；跳过未加载的延迟列（raw_json），避免在异步会话里触发懒加载
+    unloaded = inspect(obj).unloaded
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns if c.key not in unloaded}  # type: ignore[attr-defined]
 
 
 def _apply_filters(
@@ -86,6 +94,62 @@ def _apply_filters(
     return stmt
 
 
+async def _cached_total(session: AsyncSession, base_stmt, params: Dict[str, Any],
+                        cache: ResponseCache = RESPONSE_CACHE) -> int:
+    """
+    同一筛选条件的 total 复用，翻页不再重复 COUNT(*)。
+    键含匹配分片的数据版本之和（data_version_service），新数据入库后随之失效；版本不可用时每次都 COUNT。
+    """
+    version = await data_version_service.get_version_sum(session, params.get("country"), params.get("device"))
+    key = cache.key("rankings:total", params, version) if version is not None else None
+    if key is not None:
+        hit = await cache.get(key)
+        if hit is not None:
+            return int(hit)
+    count_stmt = select(func.count()).select_from(base_stmt.order_by(None).subquery())
+    total = int((await session.execute(count_stmt)).scalar_one() or 0)
+    if key is not None:
+        await cache.set(key, total)
+    return total
+
+
+def _encode_cursor(sort_key: str, sort_dir: str, value: Any, last_id: int) -> str:
+    if isinstance(value, date):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps({"k": sort_key, "d": sort_dir, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort_key: str, sort_dir: str) -> Tuple[Any, int]:
+    try:
+        obj = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value, last_id = obj["v"], int(obj["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if obj.get("k") != sort_key or obj.get("d") != sort_dir:
+        raise HTTPException(status_code=400, detail="cursor does not match sort_by/sort_dir")
+    if value is not None:
+        py_type = ALLOWED_SORT_COLUMNS[sort_key].type.python_type
+        if py_type is date:
+            value = date.fromisoformat(value)
+        elif py_type is Decimal:
+            value = Decimal(value)
+    return value, last_id
+
+
+def _seek(sort_col, sort_dir: str, value: Any, last_id: int):
+    """(sort_col, id) 之后的行；与 MySQL/SQLite 的 NULL 排序一致：升序 NULL 在前，降序 NULL 在后。"""
+    if sort_dir == "asc":
+        if value is None:
+            return or_(and_(sort_col.is_(None), AppRatings.id > last_id), sort_col.isnot(None))
+        return or_(sort_col > value, and_(sort_col == value, AppRatings.id > last_id))
+    if value is None:
+        return and_(sort_col.is_(None), AppRatings.id < last_id)
+    return or_(sort_col < value, and_(sort_col == value, AppRatings.id < last_id), sort_col.is_(None))
+
+
 @router.get("/rankings")
 async def get_rankings(
     # ---- Filters ----
@@ -104,14 +168,19 @@ async def get_rankings(
     # ---- Pagination ----
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    paginate: Literal["offset", "cursor"] = Query("offset", description="offset=按页码；cursor=按游标（深翻页不退化）"),
+    cursor: Optional[str] = Query(None, description="cursor 模式下上一页返回的 next_cursor；为空取第一页"),
+    with_total: bool = Query(True, description="是否返回 total（按筛选条件缓存）"),
     session: AsyncSession = Depends(get_session),
 ):
     """
     应用榜单 - 列表接口
     - 支持多条件组合筛选
-    - 排序字段白名单 + 升/降序
-    - 分页返回 {items, total, page, page_size}
+    - 排序字段白名单 + 升/降序（同值按 id 稳定排序）
+    - 分页返回 {items, total, page, page_size}；cursor 模式按 (排序列, id) 定位，另返回 next_cursor（无下一页为 null）
+    - total 按筛选条件 + 数据版本缓存（入库后失效）；with_total=false 时不计算，响应中也不含 total 键
     注意：自本次调整起，数据来自 AppRatings，`rank_a`/`rank_b`/`rank_c` 为 JSON 字段；`brand_id` 与价格过滤在该接口中被忽略。
+    原始 JSON 不随列表返回，按条目中的 `raw_hash` 调用 /raw/{raw_hash} 获取。
     """
     # Base
     base_stmt = select(AppRatings)
@@ -128,32 +197,58 @@ async def get_rankings(
         genre=genre,
     )
 
-    # Total count
-    count_stmt = select(func.count()).select_from(base_stmt.order_by(None).subquery())
-    total_result = await session.execute(count_stmt)
-    total: int = int(total_result.scalar_one() or 0)
+    payload: Dict[str, Any] = {"page_size": page_size}
+
+    # Total count（按筛选条件缓存）
+    if with_total:
+        payload["total"] = await _cached_total(session, base_stmt, {
+            "chart_date": chart_date, "app_genre": app_genre, "is_ad": is_ad,
+            "country": country, "device": device, "genre": genre,
+        })
 
     # Sorting (whitelist)
     sort_key = sort_by if sort_by in ALLOWED_SORT_COLUMNS else DEFAULT_SORT_BY
     sort_col = ALLOWED_SORT_COLUMNS[sort_key]
-    order_clause = asc(sort_col) if sort_dir == "asc" else desc(sort_col)
+    direction = asc if sort_dir == "asc" else desc
+    order_clause = [direction(sort_col)] if sort_col is AppRatings.id else [direction(sort_col), direction(AppRatings.id)]
 
     # Page slice
-    page_stmt = base_stmt.order_by(order_clause).offset((page - 1) * page_size).limit(page_size)
+    if paginate == "cursor":
+        page_stmt = base_stmt.order_by(*order_clause)
+        if cursor:
+            value, last_id = _decode_cursor(cursor, sort_key, sort_dir)
+            page_stmt = page_stmt.where(_seek(sort_col, sort_dir, value, last_id))
+        # 多取一行判断是否还有下一页
+        page_stmt = page_stmt.limit(page_size + 1)
+    else:
+        page_stmt = base_stmt.order_by(*order_clause).offset((page - 1) * page_size).limit(page_size)
 
     # Execute
     result = await session.execute(page_stmt)
     rows = result.scalars().all()
-    items: List[Dict[str, Any]] = [_row_to_dict(r) for r in rows]
 
-    payload = {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-    }
+    if paginate == "cursor":
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = _encode_cursor(sort_key, sort_dir, getattr(last, sort_col.key), last.id)
+        payload.update(page=None, next_cursor=next_cursor)
+    else:
+        payload["page"] = page
+    payload["items"] = [_row_to_dict(r) for r in rows]
     return jsonable_encoder(payload)
 
+
+@router.get("/raw/{raw_hash}")
+async def get_raw_payload(raw_hash: str, session: AsyncSession = Depends(get_session)):
+    """按哈希取回原始 JSON（raw_payloads 副表，懒加载）。"""
+    raw = await raw_payload_service.load_one_async(session, raw_hash.strip().lower())
+    if raw is None:
+        raise HTTPException(status_code=404, detail="raw payload not found")
+    return {"raw_hash": raw_hash, "raw_json": raw}
+
+
 def _parse_app_ids(v: Optional[str], repeats: List[str]) -> List[str]:
     # 支持逗号分隔和重复参数
     collected = []
@@ -253,44 +348,42 @@ async def rankings_trend(
         # r 可能为 None
         series_map.setdefault(app_id, {})[d] = r
 
-    # —— 为卡片取 app 显示信息（范围内最近一条） ——
-    meta_map: Dict[str, Dict[str, Optional[str]]] = {a: {} for a in ids}
-    for a in ids:
-        sub_max = (
-            select(func.max(AppStoreRankingDaily.chart_date))
-            .where(
-                AppStoreRankingDaily.app_id == a,
-                AppStoreRankingDaily.country == country,
-                AppStoreRankingDaily.device == device,
-                AppStoreRankingDaily.chart_date.between(date_from, date_to),
-            )
-            .scalar_subquery()
-        )
-        meta_stmt = (
-            select(
-                AppStoreRankingDaily.app_name,
-                AppStoreRankingDaily.icon_url,
-                AppStoreRankingDaily.publisher,
-            )
-            .where(
-                AppStoreRankingDaily.app_id == a,
-                AppStoreRankingDaily.country == country,
-                AppStoreRankingDaily.device == device,
-                AppStoreRankingDaily.chart_date == sub_max,
-            )
-            .limit(1)
+    # —— 为卡片取 app 显示信息（范围内最近一条）：所有 app 一次集合查询，走 ix_rk_app_cd_date ——
+    meta_where = [
+        AppStoreRankingDaily.app_id.in_(ids),
+        AppStoreRankingDaily.country == country,
+        AppStoreRankingDaily.device == device,
+        AppStoreRankingDaily.chart_date.between(date_from, date_to),
+    ]
+    latest = (
+        select(AppStoreRankingDaily.app_id.label("app_id"), func.max(AppStoreRankingDaily.chart_date).label("max_d"))
+        .where(*meta_where)
+        .group_by(AppStoreRankingDaily.app_id)
+        .subquery()
+    )
+    meta_stmt = (
+        select(
+            AppStoreRankingDaily.app_id,
+            AppStoreRankingDaily.app_name,
+            AppStoreRankingDaily.icon_url,
+            AppStoreRankingDaily.publisher,
         )
-        meta_res = await session.execute(meta_stmt)
-        row = meta_res.first()
-        if row:
-            meta_map[a] = {
-                "app_name": row[0],
-                "icon_url": row[1],
-                "publisher": row[2],
-            }
-        else:
-            # 范围内无记录：留空
-            meta_map[a] = {"app_name": None, "icon_url": None, "publisher": None}
+        .join(latest, and_(AppStoreRankingDaily.app_id == latest.c.app_id,
+                           AppStoreRankingDaily.chart_date == latest.c.max_d))
+        .where(*meta_where)
+        .order_by(AppStoreRankingDaily.app_id, AppStoreRankingDaily.brand_id,
+                  AppStoreRankingDaily.genre, AppStoreRankingDaily.id)
+    )
+    # 范围内无记录的 app 留空；同日多条（不同 brand / genre）按 (brand_id, genre, id) 取第一条，结果确定
+    meta_map: Dict[str, Dict[str, Optional[str]]] = {
+        a: {"app_name": None, "icon_url": None, "publisher": None} for a in ids
+    }
+    seen_meta = set()
+    for a, app_name, icon_url, publisher in (await session.execute(meta_stmt)).all():
+        if a in seen_meta:
+            continue
+        seen_meta.add(a)
+        meta_map[a] = {"app_name": app_name, "icon_url": icon_url, "publisher": publisher}
 
     # —— 生成完整 points ——
     all_dates = [date_from + timedelta(days=i) for i in range(span_days)]
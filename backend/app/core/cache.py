@@ -0,0 +1,152 @@
+# app/core/cache.py
+"""
+接口响应缓存：进程内 LRU（按字节数限额）+ 可选共享层（Redis 协议，多个 worker 共用）。
+- 键 = 接口名 + 规范化参数 + 数据版本（data_version_service）；新数据入库后版本递增，旧条目不再命中，由 LRU / TTL 自然淘汰。
+- 值为 JSON 字节（jsonfast），命中时反序列化返回，与实时计算的结果一致（日期等已按 jsonable_encoder 转为字符串）。
+- 配置（环境变量）：
+    RESPONSE_CACHE_MAX_MB     进程内层上限，默认 64；0 关闭进程内层
+    RESPONSE_CACHE_REDIS_URL  共享层地址（如 redis://127.0.0.1:6379/0）；未设置或未安装 redis 包则只用进程内层
+    RESPONSE_CACHE_TTL        共享层条目过期秒数，默认 86400
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core import jsonfast
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # 可选依赖
+    aioredis = None
+
+_PREFIX = "hive:resp:"
+
+
+class LRUCache:
+    """按值字节数限额的线程安全 LRU。"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            v = self._data.get(key)
+            if v is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return v
+
+    def set(self, key: str, value: bytes) -> None:
+        size = len(value) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old) + len(key)
+            self._data[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                k, v = self._data.popitem(last=False)
+                self.bytes -= len(v) + len(k)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, redis_url: Optional[str] = None, ttl: int = 86400):
+        self.local = LRUCache(max_bytes) if max_bytes > 0 else None
+        self.ttl = ttl
+        self.shared = None
+        if redis_url:
+            if aioredis is None:
+                logging.warning("[cache] 未安装 redis 包，忽略 RESPONSE_CACHE_REDIS_URL，仅使用进程内缓存")
+            else:
+                self.shared = aioredis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    @staticmethod
+    def key(endpoint: str, params: Dict[str, Any], version: int) -> str:
+        norm = jsonfast.dumps(sorted((k, jsonable_encoder(v)) for k, v in params.items()))
+        digest = hashlib.blake2b(norm.encode("utf-8"), digest_size=12).hexdigest()
+        return f"{_PREFIX}{endpoint}:v{version}:{digest}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = self.local.get(key) if self.local is not None else None
+        if raw is None and self.shared is not None:
+            try:
+                raw = await self.shared.get(key)
+            except Exception as e:  # 共享层故障不影响接口
+                logging.warning(f"[cache] shared get failed: {e}")
+                raw = None
+            if raw is not None and self.local is not None:
+                self.local.set(key, raw)
+        return None if raw is None else jsonfast.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        raw = jsonfast.dumpb(value)
+        if self.local is not None:
+            self.local.set(key, raw)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, raw, ex=self.ttl)
+            except Exception as e:
+                logging.warning(f"[cache] shared set failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        if self.local is None:
+            return {"local": None, "shared": self.shared is not None}
+        return {"local": {"entries": len(self.local), "bytes": self.local.bytes,
+                          "hits": self.local.hits, "misses": self.local.misses},
+                "shared": self.shared is not None}
+
+
+RESPONSE_CACHE = ResponseCache(
+    max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    redis_url=os.getenv("RESPONSE_CACHE_REDIS_URL") or None,
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+)
+
+
+def cached_response(endpoint: str, version_of: Callable[..., Awaitable[Optional[int]]],
+                    cache: ResponseCache = RESPONSE_CACHE):
+    """
+    FastAPI 接口装饰器（放在 @router.get 之下）：按 endpoint + 除 session 外的全部参数 + 数据版本缓存返回值。
+    version_of(session, **params) 返回 None 时不走缓存。
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            session = kwargs.get("session")
+            params = {k: v for k, v in kwargs.items() if k != "session"}
+            version = await version_of(session, **params) if session is not None else None
+            if version is None:
+                return await fn(*args, **kwargs)
+            key = cache.key(endpoint, params, version)
+            hit = await cache.get(key)
+            if hit is not None:
+                return hit
+            value = jsonable_encoder(await fn(*args, **kwargs))
+            await cache.set(key, value)
+            return value
+        return wrapper
+    return deco
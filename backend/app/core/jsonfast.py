@@ -0,0 +1,42 @@
+# app/core/jsonfast.py
+"""
+JSON 编解码的统一入口：装了 orjson 就用 orjson，否则回退标准库 json。
+- 输出均为紧凑格式、保留中文（等价于 json.dumps(..., ensure_ascii=False, separators=(",", ":"))）。
+- orjson 不支持的对象（非 str 键、超 64 位整数等）自动回退标准库，调用方无需关心。
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+_SEPARATORS = (",", ":")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj: Any) -> bytes:
+    """序列化为 UTF-8 bytes（写文件/归档用）。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=_SEPARATORS, default=str).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """序列化为 str（写入数据库文本/JSON 列用）。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=_SEPARATORS, default=str)
@@ -0,0 +1 @@
+# app/db/migrations: 版本化的 schema 迁移（python -m app.db.migrations --help）
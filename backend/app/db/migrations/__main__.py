@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+schema 迁移命令行
+
+用法（在 backend/ 下）：
+  python -m app.db.migrations --status
+  python -m app.db.migrations --upgrade --dry-run          # 只打印将执行的 DDL
+  python -m app.db.migrations --upgrade --explain          # 执行并打印前后 EXPLAIN / 耗时对比
+  python -m app.db.migrations --upgrade --only 3           # 单独执行可选迁移（聚簇键重排，会重建表）
+"""
+
+import argparse
+import logging
+
+from app.db.base import sync_engine
+from app.db.migrations import probes, runner
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="schema 迁移")
+    parser.add_argument("--status", action="store_true", help="列出各迁移的执行状态")
+    parser.add_argument("--upgrade", action="store_true", help="执行待处理迁移")
+    parser.add_argument("--target", type=int, default=None, help="只执行到该版本（含）")
+    parser.add_argument("--only", type=int, nargs="+", default=None, help="只执行指定版本（含可选迁移）")
+    parser.add_argument("--include-optional", action="store_true", help="同时执行 OPTIONAL 迁移")
+    parser.add_argument("--dry-run", action="store_true", help="只打印 SQL，不执行")
+    parser.add_argument("--explain", action="store_true", help="迁移前后跑查询探针并对比")
+    parser.add_argument("--runs", type=int, default=5, help="探针计时次数（取中位数）")
+    args = parser.parse_args()
+
+    with sync_engine.connect() as conn:
+        if args.status or not args.upgrade:
+            done = runner.applied(conn)
+            conn.commit()
+            for m in runner.discover():
+                flag = "optional" if getattr(m, "OPTIONAL", False) else ""
+                state = f"applied {done[m.VERSION]}" if m.VERSION in done else "pending"
+                print(f"{m.VERSION:04d} {state:<28} {flag:<8} {m.DESCRIPTION}")
+            if not args.upgrade:
+                return
+
+        todo = runner.pending(conn, include_optional=args.include_optional, only=args.only, target=args.target)
+        if not todo:
+            print("nothing to migrate")
+            return
+        before = probes.run(conn, args.runs) if args.explain and not args.dry_run else {}
+        results = runner.upgrade(conn, todo, dry_run=args.dry_run)
+        for r in results:
+            print(f"{r['version']:04d} {r['description']} ({len(r['sql'])} statements, {r['seconds']:.1f}s)")
+            for sql in r["sql"]:
+                print(f"    {sql};")
+        if before:
+            after = probes.run(conn, args.runs)
+            print(probes.report(before, after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# app/db/migrations/m0001_hash_columns.py
+"""补齐变化检测与原文副表所需的列/表：app_ratings.row_hash、raw_hash 列与 raw_payloads。"""
+
+from typing import List
+
+from app.db.migrations.runner import column_exists, run_all, table_exists
+
+VERSION = 1
+DESCRIPTION = "row_hash / raw_hash columns and raw_payloads side table"
+
+RAW_PAYLOADS_SQL = (
+    "CREATE TABLE raw_payloads ("
+    "hash VARCHAR(32) NOT NULL PRIMARY KEY, codec VARCHAR(8) NOT NULL, raw_size INT NOT NULL, "
+    "data MEDIUMBLOB NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+)
+
+COLUMNS = (
+    ("app_ratings", "row_hash", "VARCHAR(16) NULL COMMENT '行内容指纹'"),
+    ("app_ratings", "raw_hash", "VARCHAR(32) NULL COMMENT '原始 JSON 在 raw_payloads 中的哈希'"),
+    ("appstore_rankings_daily", "raw_hash", "VARCHAR(32) NULL COMMENT '原始 JSON 在 raw_payloads 中的哈希'"),
+)
+
+
+def plan(conn) -> List[str]:
+    sqls = [] if table_exists(conn, "raw_payloads") else [RAW_PAYLOADS_SQL]
+    for table, col, ddl in COLUMNS:
+        if not column_exists(conn, table, col):
+            sqls.append(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
+    return sqls
+
+
+def up(conn) -> List[str]:
+    return run_all(conn, plan(conn))
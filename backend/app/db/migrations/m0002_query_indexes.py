@@ -0,0 +1,49 @@
+# app/db/migrations/m0002_query_indexes.py
+"""
+按接口实际查询形状建覆盖型复合索引（在线 DDL：ALGORITHM=INPLACE, LOCK=NONE）。
+appstore_rankings_daily（analytics.py / rankings.py trend / apps.py）：
+  - MAX(chart_date) / 当日 TopN / 窗口统计：WHERE brand_id, country, device, chart_date [BETWEEN]
+    取 ranking, index, app_id, app_genre → ix_rk_bcd_date_rank 前缀等值 + 日期范围，且覆盖所需列；
+  - 单 app 趋势 / 最近一条：WHERE app_id [IN], country, device, chart_date BETWEEN [, brand_id] → ix_rk_app_cd_date。
+app_ratings（predict.py / rankings.py 列表）：
+  - 最新 update_time / 当日 TopN：WHERE country, device, brand, update_time ORDER BY index → ix_ar_cdb_ut_idx；
+  - 单 app 历史：WHERE app_id, country, device, update_time BETWEEN [, brand] ORDER BY update_time → ix_ar_app_cd_ut；
+  - /rankings 列表：WHERE chart_date [, country, device] ORDER BY index → ix_ar_date_cd_idx。
+"""
+
+from typing import List
+
+from app.db.migrations.runner import index_columns, run_all
+
+VERSION = 2
+DESCRIPTION = "covering composite indexes for analytics / rankings / predict queries"
+
+# (表, 索引名, 列)；与模型 __table_args__ 中的 Index 定义一致
+INDEXES = (
+    ("appstore_rankings_daily", "ix_rk_bcd_date_rank",
+     ("brand_id", "country", "device", "chart_date", "ranking", "index", "app_id", "app_genre")),
+    ("appstore_rankings_daily", "ix_rk_app_cd_date",
+     ("app_id", "country", "device", "chart_date", "brand_id", "ranking")),
+    ("app_ratings", "ix_ar_cdb_ut_idx", ("country", "device", "brand", "update_time", "index")),
+    ("app_ratings", "ix_ar_app_cd_ut", ("app_id", "country", "device", "update_time", "brand", "index")),
+    ("app_ratings", "ix_ar_date_cd_idx", ("chart_date", "country", "device", "index")),
+)
+
+
+def _cols(cols) -> str:
+    return ", ".join(f"`{c}`" for c in cols)
+
+
+def plan(conn) -> List[str]:
+    sqls = []
+    for table, name, cols in INDEXES:
+        have = index_columns(conn, table, name)
+        if have == list(cols):
+            continue
+        drop = f"DROP INDEX {name}, " if have else ""
+        sqls.append(f"ALTER TABLE {table} {drop}ADD INDEX {name} ({_cols(cols)}), ALGORITHM=INPLACE, LOCK=NONE")
+    return sqls
+
+
+def up(conn) -> List[str]:
+    return run_all(conn, plan(conn))
@@ -0,0 +1,29 @@
+# app/db/migrations/m0003_clustered_day_key.py
+"""
+（可选）把旧库的主键 (id, chart_date) 重排为模型声明的聚簇键，使同一“榜单日”的行在 InnoDB 中物理相邻：
+  appstore_rankings_daily: PRIMARY KEY (chart_date, brand_id, country, device, id), UNIQUE KEY uq_daily_id (id, chart_date)
+  app_ratings:             PRIMARY KEY (chart_date, country, device, brand, id), UNIQUE KEY uq_ratings_id (id, chart_date)
+键取自模型（PrimaryKeyConstraint + 以 id 打头的 UniqueConstraint），执行后与模型的 CREATE TABLE 一致。
+id 仍为自增列，由 (id, chart_date) 唯一键打头（InnoDB 要求自增列是某个键的首列；唯一键须含分区列），
+与 partition_maint.py 的按月分区兼容。会重建整表，需在低峰期显式执行：--only 3 或 --include-optional。
+"""
+
+from typing import List
+
+from app.db.migrations.runner import align_keys_sql, run_all
+from app.db.models.ranking import AppStoreRankingDaily
+from app.db.models.rating import AppRatings
+
+VERSION = 3
+DESCRIPTION = "cluster fact tables by (chart_date, dims..., id)"
+OPTIONAL = True
+
+MODELS = (AppStoreRankingDaily, AppRatings)
+
+
+def plan(conn) -> List[str]:
+    return [sql for sql in (align_keys_sql(conn, m) for m in MODELS) if sql]
+
+
+def up(conn) -> List[str]:
+    return run_all(conn, plan(conn))
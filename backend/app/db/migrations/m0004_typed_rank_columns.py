@@ -0,0 +1,70 @@
+# app/db/migrations/m0004_typed_rank_columns.py
+"""
+app_ratings 类型化列：rank_{a,b,c}_{genre,ranking,change} 与 rating_count，加 ix_ar_rank_c_genre，
+并用 rating_service.typed_fields（与入库同一解析逻辑）按主键区间分批回填历史行。
+回填可重复执行：只处理 rating_count 与 rank_c_genre 均为 NULL 且原始列非空的行。
+"""
+
+import logging
+from typing import List
+
+from sqlalchemy import text
+
+from app.db.migrations.runner import column_exists, index_columns, run_all
+from app.services.rating_service import TYPED_COLUMNS, typed_fields
+
+VERSION = 4
+DESCRIPTION = "typed rank genre/ranking/change and numeric rating_count on app_ratings"
+
+BATCH = 5000
+
+COLUMNS = (
+    ("rank_a_genre", "VARCHAR(64) NULL COMMENT '总榜分类'"),
+    ("rank_a_ranking", "INT NULL COMMENT '总榜排名'"),
+    ("rank_a_change", "INT NULL COMMENT '总榜排名变化'"),
+    ("rank_b_genre", "VARCHAR(64) NULL COMMENT '应用榜分类'"),
+    ("rank_b_ranking", "INT NULL COMMENT '应用榜排名'"),
+    ("rank_b_change", "INT NULL COMMENT '应用榜排名变化'"),
+    ("rank_c_genre", "VARCHAR(64) NULL COMMENT '子分类'"),
+    ("rank_c_ranking", "INT NULL COMMENT '子分类排名'"),
+    ("rank_c_change", "INT NULL COMMENT '子分类排名变化'"),
+    ("rating_count", "BIGINT NULL COMMENT '评分总数（数值）'"),
+)
+BACKFILL_NOTE = "-- backfill typed columns from rank_a/b/c, rating_num (batched, python-side parsing)"
+
+
+def plan(conn) -> List[str]:
+    adds = [f"ADD COLUMN {c} {ddl}" for c, ddl in COLUMNS if not column_exists(conn, "app_ratings", c)]
+    sqls = [f"ALTER TABLE app_ratings {', '.join(adds)}"] if adds else []
+    if index_columns(conn, "app_ratings", "ix_ar_rank_c_genre") != ["rank_c_genre", "chart_date"]:
+        sqls.append("ALTER TABLE app_ratings ADD INDEX ix_ar_rank_c_genre (rank_c_genre, chart_date), "
+                    "ALGORITHM=INPLACE, LOCK=NONE")
+    return sqls + [BACKFILL_NOTE]
+
+
+def backfill(conn, batch: int = BATCH) -> int:
+    select_sql = text(
+        "SELECT id, chart_date, rank_a, rank_b, rank_c, rating_num FROM app_ratings "
+        "WHERE id > :last AND rating_count IS NULL AND rank_c_genre IS NULL "
+        "AND (rating_num IS NOT NULL OR rank_a IS NOT NULL OR rank_b IS NOT NULL OR rank_c IS NOT NULL) "
+        "ORDER BY id LIMIT :n"
+    )
+    sets = ", ".join(f"{c} = :{c}" for c in TYPED_COLUMNS)
+    update_sql = text(f"UPDATE app_ratings SET {sets} WHERE id = :id AND chart_date = :d")
+    last, done = 0, 0
+    while True:
+        rows = conn.execute(select_sql, {"last": last, "n": batch}).mappings().all()
+        if not rows:
+            break
+        last = rows[-1]["id"]
+        conn.execute(update_sql, [{**typed_fields(r), "id": r["id"], "d": r["chart_date"]} for r in rows])
+        conn.commit()
+        done += len(rows)
+        logging.info(f"[migrate]   backfill app_ratings id<={last}: {done} rows")
+    return done
+
+
+def up(conn) -> List[str]:
+    sqls = run_all(conn, [s for s in plan(conn) if s != BACKFILL_NOTE])
+    backfill(conn)
+    return sqls + [BACKFILL_NOTE]
@@ -0,0 +1,30 @@
+# app/db/migrations/m0005_data_versions.py
+"""data_versions：每个 (brand_id, country, device) 分片的数据版本，供接口响应缓存失效（见 data_version_service）。"""
+
+from typing import List
+
+from app.db.migrations.runner import run_all, table_exists
+
+VERSION = 5
+DESCRIPTION = "data_versions table for response cache invalidation"
+
+CREATE_SQL = (
+    "CREATE TABLE data_versions ("
+    "brand_id INT NOT NULL, country VARCHAR(8) NOT NULL, device VARCHAR(16) NOT NULL, "
+    "version BIGINT NOT NULL DEFAULT 0, "
+    "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (brand_id, country, device))"
+)
+# 以现有数据初始化，首次部署即有版本可用
+SEED_SQL = (
+    "INSERT IGNORE INTO data_versions (brand_id, country, device, version) "
+    "SELECT DISTINCT brand_id, country, device, 1 FROM appstore_rankings_daily"
+)
+
+
+def plan(conn) -> List[str]:
+    return [] if table_exists(conn, "data_versions") else [CREATE_SQL, SEED_SQL]
+
+
+def up(conn) -> List[str]:
+    return run_all(conn, plan(conn))
@@ -0,0 +1,31 @@
+# app/db/migrations/m0006_partition_freshness.py
+"""partition_freshness：各数据源分片的最早/最新日期与行数（见 freshness_service），建表后按现有数据初始化。"""
+
+from typing import List
+
+from app.db.migrations.runner import run_all, table_exists
+from app.services import freshness_service
+
+VERSION = 6
+DESCRIPTION = "partition_freshness registry (latest/earliest date, row count per partition)"
+
+CREATE_SQL = (
+    "CREATE TABLE partition_freshness ("
+    "source VARCHAR(16) NOT NULL, brand VARCHAR(32) NOT NULL, country VARCHAR(8) NOT NULL, device VARCHAR(16) NOT NULL, "
+    "earliest_date DATE NULL, latest_date DATE NULL, row_count BIGINT NOT NULL DEFAULT 0, "
+    "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (source, brand, country, device))"
+)
+
+
+def plan(conn) -> List[str]:
+    sqls = [] if table_exists(conn, "partition_freshness") else [CREATE_SQL]
+    return sqls + [freshness_service.refresh_sql(s) for s in freshness_service.SOURCES]
+
+
+def up(conn) -> List[str]:
+    sqls = run_all(conn, [] if table_exists(conn, "partition_freshness") else [CREATE_SQL])
+    for source in freshness_service.SOURCES:
+        freshness_service.rebuild_sync(conn, source)
+        sqls.append(freshness_service.refresh_sql(source))
+    return sqls
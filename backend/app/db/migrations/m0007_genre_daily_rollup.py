@@ -0,0 +1,32 @@
+# app/db/migrations/m0007_genre_daily_rollup.py
+"""rankings_genre_daily：按 (chart_date, brand_id, country, device, genre, app_genre) 的日汇总（见 rollup_service），建表后全量回填。"""
+
+from typing import List
+
+from app.db.migrations.runner import run_all, table_exists
+from app.services import rollup_service
+
+VERSION = 7
+DESCRIPTION = "rankings_genre_daily rollup table"
+
+CREATE_SQL = (
+    "CREATE TABLE rankings_genre_daily ("
+    "chart_date DATE NOT NULL, brand_id INT NOT NULL, country VARCHAR(8) NOT NULL, device VARCHAR(16) NOT NULL, "
+    "genre VARCHAR(64) NOT NULL DEFAULT '', app_genre VARCHAR(64) NOT NULL DEFAULT '', "
+    "apps INT NOT NULL DEFAULT 0, best_rank_sum BIGINT NOT NULL DEFAULT 0, best_rank_cnt INT NOT NULL DEFAULT 0, "
+    "rank_sum BIGINT NOT NULL DEFAULT 0, rank_sum_sq BIGINT NOT NULL DEFAULT 0, rank_cnt INT NOT NULL DEFAULT 0, "
+    "entries INT NOT NULL DEFAULT 0, "
+    "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (brand_id, country, device, genre, chart_date, app_genre))"
+)
+BACKFILL_NOTE = "-- rebuild rankings_genre_daily from appstore_rankings_daily"
+
+
+def plan(conn) -> List[str]:
+    return ([] if table_exists(conn, "rankings_genre_daily") else [CREATE_SQL]) + [BACKFILL_NOTE]
+
+
+def up(conn) -> List[str]:
+    sqls = run_all(conn, [] if table_exists(conn, "rankings_genre_daily") else [CREATE_SQL])
+    rollup_service.rebuild_sync(conn)
+    return sqls + [BACKFILL_NOTE]
@@ -0,0 +1,103 @@
+# app/db/migrations/probes.py
+"""
+代表性查询探针：与 analytics / rankings / predict 接口的查询形状一致，
+用于迁移前后对比 EXPLAIN（命中的索引、估算扫描行数、Extra）与实际耗时（N 次取中位数）。
+参数取自库中最新一天的数据，库为空时跳过。
+"""
+
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PROBES = (
+    ("rk_latest_date",
+     "SELECT MAX(chart_date) FROM appstore_rankings_daily "
+     "WHERE brand_id = :brand_id AND country = :country AND device = :device"),
+    ("rk_day_topn",
+     "SELECT app_id, app_genre, COALESCE(ranking, `index`) AS r FROM appstore_rankings_daily "
+     "WHERE brand_id = :brand_id AND country = :country AND device = :device AND chart_date = :d "
+     "ORDER BY ranking, `index` LIMIT 10"),
+    ("rk_window_genre",
+     "SELECT chart_date, app_genre, COUNT(DISTINCT app_id) FROM appstore_rankings_daily "
+     "WHERE brand_id = :brand_id AND country = :country AND device = :device "
+     "AND chart_date BETWEEN :d0 AND :d GROUP BY chart_date, app_genre"),
+    ("rk_app_trend",
+     "SELECT chart_date, brand_id, ranking FROM appstore_rankings_daily "
+     "WHERE app_id = :app_id AND country = :country AND device = :device AND chart_date BETWEEN :d0 AND :d "
+     "ORDER BY chart_date"),
+    ("ar_latest_time",
+     "SELECT MAX(update_time) FROM app_ratings WHERE country = :country AND device = :device AND brand = :brand"),
+    ("ar_latest_topn",
+     "SELECT app_id, `index` FROM app_ratings WHERE country = :country AND device = :device AND brand = :brand "
+     "AND update_time = :ut ORDER BY `index` LIMIT 50"),
+    ("ar_app_history",
+     "SELECT update_time, `index` FROM app_ratings WHERE app_id = :ar_app_id AND country = :country "
+     "AND device = :device AND update_time BETWEEN :ut0 AND :ut ORDER BY update_time"),
+    ("ar_day_list",
+     "SELECT id FROM app_ratings WHERE chart_date = :ar_d AND country = :country AND device = :device "
+     "ORDER BY `index` LIMIT 20"),
+)
+
+
+def sample_params(conn: Connection) -> Optional[Dict]:
+    rk = conn.execute(text(
+        "SELECT chart_date, brand_id, country, device, app_id FROM appstore_rankings_daily "
+        "ORDER BY chart_date DESC LIMIT 1")).first()
+    ar = conn.execute(text(
+        "SELECT chart_date, update_time, brand, app_id FROM app_ratings ORDER BY chart_date DESC LIMIT 1")).first()
+    if rk is None or ar is None:
+        return None
+    d = rk[0]
+    return {
+        "d": d, "d0": d.fromordinal(d.toordinal() - 29),
+        "brand_id": rk[1], "country": rk[2], "device": rk[3], "app_id": rk[4],
+        "ar_d": ar[0], "ut": ar[1], "ut0": ar[1].fromordinal(ar[1].toordinal() - 29),
+        "brand": ar[2], "ar_app_id": ar[3],
+    }
+
+
+def explain(conn: Connection, sql: str, params: Dict) -> List[Dict]:
+    res = conn.execute(text("EXPLAIN " + sql), params)
+    keys = list(res.keys())
+    return [dict(zip(keys, row)) for row in res]
+
+
+def timed(conn: Connection, sql: str, params: Dict, runs: int = 5) -> float:
+    cost = []
+    for _ in range(max(1, runs)):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).all()
+        cost.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(cost)
+
+
+def run(conn: Connection, runs: int = 5) -> Dict[str, Dict]:
+    params = sample_params(conn)
+    if params is None:
+        return {}
+    out = {}
+    for name, sql in PROBES:
+        plan = explain(conn, sql, params)
+        out[name] = {
+            "key": ",".join(str(p.get("key")) for p in plan),
+            "rows": sum(int(p.get("rows") or 0) for p in plan),
+            "extra": "; ".join(str(p.get("Extra") or "") for p in plan),
+            "ms": timed(conn, sql, params, runs),
+        }
+    return out
+
+
+def report(before: Dict[str, Dict], after: Dict[str, Dict]) -> str:
+    lines = [f"{'probe':<16} {'key (before → after)':<52} {'rows':>17} {'ms (median)':>19}"]
+    for name, _ in PROBES:
+        b, a = before.get(name), after.get(name)
+        if not b or not a:
+            continue
+        keys = f"{b['key']} → {a['key']}"
+        lines.append(f"{name:<16} {keys:<52} {b['rows']:>8}→{a['rows']:<8} {b['ms']:>8.2f}→{a['ms']:<8.2f}")
+        if a["extra"]:
+            lines.append(f"{'':<16} extra: {a['extra']}")
+    return "\n".join(lines)
@@ -0,0 +1,138 @@
+# app/db/migrations/runner.py
+"""
+版本化迁移执行器
+- 迁移模块放在本包下，文件名 mNNNN_<说明>.py，模块内定义：
+    VERSION: int / DESCRIPTION: str / OPTIONAL: bool（可选，默认 False）
+    up(conn) -> List[str]：执行并返回实际执行的 SQL（应幂等：先查 information_schema 再改）
+    plan(conn) -> List[str]：只返回将要执行的 SQL（--dry-run 用）
+- 已执行的版本记录在 schema_migrations；OPTIONAL 迁移只有显式 --include-optional 或 --only 时才执行。
+"""
+
+import importlib
+import logging
+import pkgutil
+import time
+from types import ModuleType
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import UniqueConstraint, text
+from sqlalchemy.engine import Connection
+
+_PKG = __name__.rsplit(".", 1)[0]
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INT NOT NULL PRIMARY KEY,
+  description VARCHAR(255) NOT NULL,
+  applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  seconds DOUBLE NULL
+)
+"""
+
+
+def discover() -> List[ModuleType]:
+    pkg = importlib.import_module(_PKG)
+    mods = [importlib.import_module(f"{_PKG}.{m.name}")
+            for m in pkgutil.iter_modules(pkg.__path__) if m.name.startswith("m") and m.name[1:5].isdigit()]
+    mods.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in mods]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return mods
+
+
+def applied(conn: Connection) -> Dict[int, str]:
+    conn.execute(text(CREATE_TABLE_SQL))
+    return {v: str(at) for v, at in conn.execute(text("SELECT version, applied_at FROM schema_migrations"))}
+
+
+def pending(conn: Connection, include_optional: bool = False, only: Optional[Sequence[int]] = None,
+            target: Optional[int] = None) -> List[ModuleType]:
+    done = applied(conn)
+    out = []
+    for m in discover():
+        if m.VERSION in done:
+            continue
+        if only is not None:
+            if m.VERSION in only:
+                out.append(m)
+            continue
+        if target is not None and m.VERSION > target:
+            continue
+        if getattr(m, "OPTIONAL", False) and not include_optional:
+            continue
+        out.append(m)
+    return out
+
+
+def upgrade(conn: Connection, migrations: Sequence[ModuleType], dry_run: bool = False) -> List[Dict]:
+    """依次执行迁移；每个迁移执行完即写入 schema_migrations（DDL 在 MySQL 中隐式提交）。"""
+    results = []
+    for m in migrations:
+        if dry_run:
+            sqls = m.plan(conn)
+            results.append({"version": m.VERSION, "description": m.DESCRIPTION, "sql": sqls, "seconds": 0.0})
+            continue
+        logging.info(f"[migrate] {m.VERSION:04d} {m.DESCRIPTION}")
+        t0 = time.perf_counter()
+        sqls = m.up(conn)
+        seconds = time.perf_counter() - t0
+        conn.execute(text("INSERT INTO schema_migrations (version, description, seconds) VALUES (:v, :d, :s)"),
+                     {"v": m.VERSION, "d": m.DESCRIPTION[:255], "s": seconds})
+        conn.commit()
+        logging.info(f"[migrate] {m.VERSION:04d} 完成：{len(sqls)} 条语句，{seconds:.1f}s")
+        results.append({"version": m.VERSION, "description": m.DESCRIPTION, "sql": sqls, "seconds": seconds})
+    return results
+
+
+# ---------- 供迁移模块使用的 information_schema 辅助 ----------
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() "
+        "AND table_name = :t AND column_name = :c"), {"t": table, "c": column}).first())
+
+
+def table_exists(conn: Connection, table: str) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :t"),
+        {"t": table}).first())
+
+
+def index_columns(conn: Connection, table: str, index: str) -> List[str]:
+    """索引的列（按顺序）；不存在返回空列表。"""
+    rows = conn.execute(text(
+        "SELECT column_name FROM information_schema.statistics WHERE table_schema = DATABASE() "
+        "AND table_name = :t AND index_name = :i ORDER BY seq_in_index"), {"t": table, "i": index}).all()
+    return [r[0] for r in rows]
+
+
+def run_all(conn: Connection, sqls: Sequence[str]) -> List[str]:
+    for sql in sqls:
+        logging.info(f"[migrate]   {sql}")
+        conn.execute(text(sql))
+    return list(sqls)
+
+
+def model_keys(model) -> Tuple[List[str], str, List[str]]:
+    """模型声明的 (主键列, 自增列键名, 自增列键列)；自增列键为以 id 打头的 UniqueConstraint。"""
+    table = model.__table__
+    id_key = next(c for c in table.constraints
+                  if isinstance(c, UniqueConstraint) and [col.name for col in c.columns][:1] == ["id"])
+    return [c.name for c in table.primary_key.columns], id_key.name, [c.name for c in id_key.columns]
+
+
+def align_keys_sql(conn: Connection, model) -> Optional[str]:
+    """把表的主键与自增列键对齐到模型声明（一条 ALTER，自增列在语句结束时始终是某个键的首列）；已一致返回 None。"""
+    table = model.__tablename__
+    pk, id_name, id_cols = model_keys(model)
+
+    def cols(names):
+        return ", ".join(f"`{c}`" for c in names)
+
+    parts = []
+    if index_columns(conn, table, "PRIMARY") != pk:
+        parts.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({cols(pk)})")
+    have = index_columns(conn, table, id_name)
+    if have != id_cols:
+        parts.append(("DROP INDEX " + id_name + ", " if have else "") + f"ADD UNIQUE KEY {id_name} ({cols(id_cols)})")
+    return f"ALTER TABLE {table} " + ", ".join(parts) if parts else None
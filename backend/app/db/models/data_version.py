@@ -0,0 +1,19 @@
+# app/db/models/data_version.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, BigInteger, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class DataVersion(Base):
+    """
+    榜单数据版本：每个 (brand_id, country, device) 分片一行，入库路径在写入 appstore_rankings_daily 的同一事务内递增。
+    接口响应缓存以该版本作为键的一部分，新数据入库后旧缓存自然失效。
+    """
+    __tablename__ = "data_versions"
+
+    brand_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment="榜单类型: 0付费 / 1免费 / 2畅销")
+    country: Mapped[str] = mapped_column(String(8), primary_key=True)
+    device: Mapped[str] = mapped_column(String(16), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, comment="单调递增的数据版本")
+    updated_at = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
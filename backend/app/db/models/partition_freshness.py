@@ -0,0 +1,22 @@
+# app/db/models/partition_freshness.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Date, BigInteger, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class PartitionFreshness(Base):
+    """
+    分片新鲜度登记：每个数据源的 (brand, country, device) 一行，记录最早/最新日期与行数。
+    由入库路径在写入后刷新（见 freshness_service），接口从内存快照读取，不再逐请求 MAX(chart_date)。
+    """
+    __tablename__ = "partition_freshness"
+
+    source: Mapped[str] = mapped_column(String(16), primary_key=True, comment="rankings / app_ratings")
+    brand: Mapped[str] = mapped_column(String(32), primary_key=True, comment="rankings 为 brand_id，app_ratings 为 free/paid/grossing")
+    country: Mapped[str] = mapped_column(String(8), primary_key=True)
+    device: Mapped[str] = mapped_column(String(16), primary_key=True)
+    earliest_date = mapped_column(Date, nullable=True, comment="rankings: chart_date；app_ratings: update_time")
+    latest_date = mapped_column(Date, nullable=True)
+    row_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
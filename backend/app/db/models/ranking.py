@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, DECIMAL, Boolean, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, DECIMAL, Boolean, JSON, UniqueConstraint, Index, \
+    PrimaryKeyConstraint
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -7,10 +9,19 @@ class AppStoreRankingDaily(Base):
     __tablename__ = "appstore_rankings_daily"
 
     __table_args__ = (
+        # 聚簇键：同一“榜单日 × 分片”的行物理相邻（旧库由 m0003 重排）
+        PrimaryKeyConstraint('chart_date', 'brand_id', 'country', 'device', 'id'),
+        # 自增列须为同一 CREATE TABLE 内某个键的首列（否则 1075）；唯一键须含分区列，故为 (id, chart_date)
+        UniqueConstraint('id', 'chart_date', name='uq_daily_id'),
         UniqueConstraint('chart_date', 'brand_id', 'genre', 'index', 'country', 'device', name='uq_daily_idx'),
+        # 按查询形状建的覆盖索引（见 app/db/migrations/m0002_query_indexes.py）
+        Index('ix_rk_bcd_date_rank', 'brand_id', 'country', 'device', 'chart_date', 'ranking', 'index', 'app_id', 'app_genre'),
+        Index('ix_rk_app_cd_date', 'app_id', 'country', 'device', 'chart_date', 'brand_id', 'ranking'),
+        # 按月 RANGE 分区（分区由 app/util/partition_maint.py 预建/过期）；MySQL 要求主键与每个唯一键都包含分区列
+        {"mysql_partition_by": "RANGE COLUMNS(chart_date) (PARTITION pmax VALUES LESS THAN (MAXVALUE))"},
     )
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    id = Column(Integer, autoincrement=True)
 
     # 维度
     chart_date = Column(Date, nullable=False, comment="榜单日期(YYYY-MM-DD)")
@@ -42,7 +53,9 @@ class AppStoreRankingDaily(Base):
 
     # 其它
     source = Column(String(32), nullable=False, default="qimai")
-    raw_json = Column(JSON, nullable=True)
+    # 原文已迁到 raw_payloads 副表（按 raw_hash 取）；本列仅保留历史数据，默认不随行加载
+    raw_json = deferred(Column(JSON, nullable=True))
+    raw_hash = Column(String(32), nullable=True, comment="原始 JSON 在 raw_payloads 中的哈希")
 
     # 时间
     crawled_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,6 +1,6 @@
 # app/db/models/rating.py
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Date, Integer, DECIMAL, UniqueConstraint
+from sqlalchemy import String, Date, Integer, BigInteger, DECIMAL, UniqueConstraint, Index, PrimaryKeyConstraint
 from app.db.base import Base
 
 # class AppRatingsDaily(Base):
@@ -26,7 +26,7 @@ class AppRatings(Base):
     """
     __tablename__ = "app_ratings"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True)
     app_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True, comment="应用ID")
     app_name: Mapped[str] = mapped_column(String(255), nullable=True, comment="应用名称")
     publisher: Mapped[str] = mapped_column(String(255), nullable=True, comment="发行者")
@@ -46,10 +46,35 @@ class AppRatings(Base):
     rank_c: Mapped[str] = mapped_column(String(255), nullable=True, comment="子分类排名 JSON")
     rating: Mapped[float] = mapped_column(DECIMAL(2,1), nullable=True, comment="评分")
     rating_num: Mapped[str] = mapped_column(String(64), nullable=True, comment="评分总数，原始字符串如132万")
+    # 入库时从 rank_a/b/c、rating_num 解析出的类型化列（见 rating_service.typed_fields），查询不再解析 JSON
+    rank_a_genre: Mapped[str] = mapped_column(String(64), nullable=True, comment="总榜分类")
+    rank_a_ranking: Mapped[int] = mapped_column(Integer, nullable=True, comment="总榜排名")
+    rank_a_change: Mapped[int] = mapped_column(Integer, nullable=True, comment="总榜排名变化")
+    rank_b_genre: Mapped[str] = mapped_column(String(64), nullable=True, comment="应用榜分类")
+    rank_b_ranking: Mapped[int] = mapped_column(Integer, nullable=True, comment="应用榜排名")
+    rank_b_change: Mapped[int] = mapped_column(Integer, nullable=True, comment="应用榜排名变化")
+    rank_c_genre: Mapped[str] = mapped_column(String(64), nullable=True, comment="子分类")
+    rank_c_ranking: Mapped[int] = mapped_column(Integer, nullable=True, comment="子分类排名")
+    rank_c_change: Mapped[int] = mapped_column(Integer, nullable=True, comment="子分类排名变化")
+    rating_count: Mapped[int] = mapped_column(BigInteger, nullable=True, comment="评分总数（数值）")
     is_ad: Mapped[bool] = mapped_column(Integer, nullable=True, comment="是否有广告")
     icon_url: Mapped[str] = mapped_column(String(512), nullable=True, comment="图标 URL")
-    raw_json: Mapped[str] = mapped_column(String(2000), nullable=True, comment="原始 JSON 数据")
+    # 原文已迁到 raw_payloads 副表（按 raw_hash 取）；本列仅保留历史数据，默认不随行加载
+    raw_json: Mapped[str] = mapped_column(String(2000), nullable=True, deferred=True, comment="原始 JSON 数据")
+    raw_hash: Mapped[str] = mapped_column(String(32), nullable=True, comment="原始 JSON 在 raw_payloads 中的哈希")
+    row_hash: Mapped[str] = mapped_column(String(16), nullable=True, comment="行内容指纹（blake2b-64 十六进制），用于变化检测")
 
     __table_args__ = (
+        # 聚簇键：同一“榜单日 × 分片”的行物理相邻（旧库由 m0003 重排）
+        PrimaryKeyConstraint('chart_date', 'country', 'device', 'brand', 'id'),
+        # 自增列须为同一 CREATE TABLE 内某个键的首列（否则 1075）；唯一键须含分区列，故为 (id, chart_date)
+        UniqueConstraint('id', 'chart_date', name='uq_ratings_id'),
         UniqueConstraint('chart_date', 'country', 'device', 'brand', 'app_id', name='uq_ratings_dim'),
+        # 按查询形状建的覆盖索引（见 app/db/migrations/m0002_query_indexes.py）
+        Index('ix_ar_cdb_ut_idx', 'country', 'device', 'brand', 'update_time', 'index'),
+        Index('ix_ar_app_cd_ut', 'app_id', 'country', 'device', 'update_time', 'brand', 'index'),
+        Index('ix_ar_date_cd_idx', 'chart_date', 'country', 'device', 'index'),
+        Index('ix_ar_rank_c_genre', 'rank_c_genre', 'chart_date'),
+        # 按月 RANGE 分区（分区由 app/util/partition_maint.py 预建/过期）；MySQL 要求主键与每个唯一键都包含分区列
+        {"mysql_partition_by": "RANGE COLUMNS(chart_date) (PARTITION pmax VALUES LESS THAN (MAXVALUE))"},
     )
\ No newline at end of file
@@ -0,0 +1,21 @@
+# app/db/models/raw_payload.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, DateTime, LargeBinary
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class RawPayload(Base):
+    """
+    原始响应条目的压缩副表（内容寻址）：热表只保存 raw_hash，需要时再按哈希取回。
+    相同内容只存一份（INSERT IGNORE），重复抓取不产生新行。
+    """
+    __tablename__ = "raw_payloads"
+
+    hash: Mapped[str] = mapped_column(String(32), primary_key=True, comment="blake2b-128 十六进制（原文 UTF-8）")
+    codec: Mapped[str] = mapped_column(String(8), nullable=False, default="zlib", comment="压缩方式")
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False, comment="原文字节数")
+    data: Mapped[bytes] = mapped_column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=False,
+                                        comment="压缩后的原文")
+    created_at = mapped_column(DateTime, server_default=func.now())
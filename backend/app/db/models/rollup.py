@@ -0,0 +1,33 @@
+# app/db/models/rollup.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, BigInteger, Date, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class RankingGenreDaily(Base):
+    """
+    appstore_rankings_daily 的日汇总：每个 (chart_date, brand_id, country, device, genre, app_genre) 一行。
+    由入库路径按“天 × 分片”整体重算（见 rollup_service），分析接口的长窗口趋势只读本表。
+    genre 为榜单分类（请求的 genre ID），同一 app 可同时上多个分类榜，跨 genre 不能相加，读取时须指定一个；
+    genre / app_genre 为空的行以空串汇总（主键不允许 NULL）。
+    """
+    __tablename__ = "rankings_genre_daily"
+
+    # 主键按 (分片, 榜单分类, 日期, 类别) 排列，趋势查询为分片 + 榜单分类等值 + 日期范围
+    brand_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    country: Mapped[str] = mapped_column(String(8), primary_key=True)
+    device: Mapped[str] = mapped_column(String(16), primary_key=True)
+    genre: Mapped[str] = mapped_column(String(64), primary_key=True, default="", comment="榜单分类 genre ID")
+    chart_date = mapped_column(Date, primary_key=True)
+    app_genre: Mapped[str] = mapped_column(String(64), primary_key=True, default="")
+
+    apps: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="去重 app 数")
+    best_rank_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0,
+                                               comment="各 app 当日最好名次 MIN(COALESCE(ranking, index)) 之和")
+    best_rank_cnt: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="有最好名次的 app 数")
+    rank_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, comment="非空 ranking 之和")
+    rank_sum_sq: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, comment="非空 ranking 平方和")
+    rank_cnt: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="非空 ranking 行数")
+    entries: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="明细行数")
+    updated_at = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,186 @@
+# app/services/bulk_load_service.py
+from datetime import date, datetime
+from decimal import Decimal
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+
+from app.db import base
+from app.services import data_version_service, freshness_service, raw_payload_service, rollup_service, write_service
+from app.services.rating_service import fill_typed, row_hash
+
+# -----------------------------
+# 回填用批量装载（LOAD DATA LOCAL INFILE）
+# -----------------------------
+# 职责：一年级别的回填不再逐页多行 upsert，而是：
+#   1) raw_json 拆到 raw_payloads 副表（INSERT IGNORE），行字典写成临时 TSV（MySQL 默认转义规则，NULL 写 \N）；
+#   2) LOAD DATA LOCAL INFILE 装入无索引的临时表 stg_*（会话级，连接关闭即消失）；
+#   3) 一条 INSERT ... SELECT ... ON DUPLICATE KEY UPDATE 合并进正式表（幂等，语义同 upsert_rows / upsert_app_ratings）。
+# 说明：需要服务端 local_infile=ON；客户端连接在此单独创建（pymysql + local_infile）。
+#       行字典格式与 ranking_service.build_rows() / normalize_rankinfo_to_app_ratings() 一致，可直接作为 BatchWriter 的 flusher。
+
+RANKING_COLUMNS = (
+    "chart_date", "brand_id", "country", "device", "genre", "app_genre",
+    "index", "ranking", "change", "is_ad",
+    "app_id", "app_name", "subtitle", "icon_url", "publisher", "publisher_id", "price",
+    "file_size_bytes", "file_size_mb", "continuous_first_days",
+    "source", "raw_json", "raw_hash", "crawled_at",
+)
+# 与 ranking_service.UPSERT_SQL 的 UPDATE 列一致
+RANKING_UPDATE = (
+    "ranking", "change", "is_ad", "app_name", "subtitle", "icon_url", "publisher", "publisher_id", "price",
+    "file_size_bytes", "file_size_mb", "continuous_first_days", "app_genre", "source", "raw_json", "raw_hash",
+)
+
+RATING_COLUMNS = write_service.RATING_COLUMNS + ("row_hash",)
+# 与 upsert_app_ratings 一致：除 id 外全部覆盖，但指纹未变的行保持原值（不产生实际写入）
+RATING_UPDATE = RATING_COLUMNS[:-1]
+
+# 单次 LOAD 的最大行数（临时文件约 1~2 KB/行）
+CHUNK_ROWS = 200_000
+
+_PAYLOAD_SQL = ("INSERT IGNORE INTO raw_payloads (hash, codec, raw_size, data) "
+                "VALUES (%(hash)s, %(codec)s, %(raw_size)s, %(data)s)")
+
+_engine: Optional[Engine] = None
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def bind(db_url: Optional[str] = None) -> Engine:
+    """创建（或重新绑定）装载用的同步引擎；db_url 缺省时用 base.SYNC_DATABASE_URL，异步驱动换成 pymysql。"""
+    global _engine
+    url = make_url(db_url or base.SYNC_DATABASE_URL)
+    if url.drivername in ("mysql", "mysql+aiomysql", "mysql+asyncmy"):
+        url = url.set(drivername="mysql+pymysql")
+    _engine = create_engine(url, pool_pre_ping=True, pool_recycle=3600, connect_args={"local_infile": True})
+    return _engine
+
+
+def _get_engine() -> Engine:
+    return _engine if _engine is not None else bind()
+
+
+def _q(col: str) -> str:
+    return f"`{col}`"
+
+
+def _field(v: Any) -> str:
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, (date, int, float, Decimal)):
+        return str(v)
+    return str(v).translate(_ESCAPES)
+
+
+def write_tsv(fp, rows: Sequence[Dict[str, Any]], columns: Sequence[str]) -> int:
+    """按列顺序写 TSV（LOAD DATA 默认格式），返回行数。"""
+    buf: List[str] = []
+    for r in rows:
+        buf.append("\t".join(_field(r.get(c)) for c in columns))
+        if len(buf) >= 5000:
+            fp.write("\n".join(buf) + "\n")
+            buf = []
+    if buf:
+        fp.write("\n".join(buf) + "\n")
+    return len(rows)
+
+
+def _merge_sql(table: str, staging: str, columns: Sequence[str], update: Sequence[str],
+               extra_update: str = "", hash_col: Optional[str] = None) -> str:
+    cols = ", ".join(_q(c) for c in columns)
+    if hash_col:
+        # 指纹列必须最后赋值（MySQL 按书写顺序求值）
+        h = _q(hash_col)
+        sets = ",\n  ".join(f"{_q(c)}=IF({h} <=> VALUES({h}), {_q(c)}, VALUES({_q(c)}))" for c in update)
+        sets += f",\n  {h}=VALUES({h})"
+    else:
+        sets = ",\n  ".join(f"{_q(c)}=VALUES({_q(c)})" for c in update)
+    if extra_update:
+        sets += ",\n  " + extra_update
+    # 临时表无唯一键，同一批内重复的键按装载顺序逐行合并，后出现者覆盖
+    return (f"INSERT INTO {table} ({cols})\nSELECT {cols} FROM {staging}\n"
+            f"ON DUPLICATE KEY UPDATE\n  {sets}")
+
+
+def bulk_merge(table: str, rows: Sequence[Dict[str, Any]], columns: Sequence[str], update: Sequence[str],
+               extra_update: str = "", hash_col: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> int:
+    """rows → 临时 TSV → LOAD DATA 到临时表 → 一条集合式合并。返回装载行数。"""
+    if not rows:
+        return 0
+    staging = f"stg_{table}"
+    col_list = ", ".join(_q(c) for c in columns)
+    merge = _merge_sql(table, staging, columns, update, extra_update, hash_col)
+    total = 0
+    with _get_engine().connect() as conn:
+        dbapi = conn.connection.dbapi_connection
+        cur = dbapi.cursor()
+        try:
+            cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+            cur.execute(f"CREATE TEMPORARY TABLE {staging} ENGINE=InnoDB AS SELECT {col_list} FROM {table} LIMIT 0")
+            for i in range(0, len(rows), chunk_rows):
+                chunk, payloads = raw_payload_service.extract(rows[i:i + chunk_rows])
+                if payloads:
+                    cur.executemany(_PAYLOAD_SQL, payloads)
+                fd, path = tempfile.mkstemp(prefix=f"{staging}-", suffix=".tsv")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as fp:
+                        write_tsv(fp, chunk, columns)
+                    cur.execute(f"TRUNCATE TABLE {staging}")
+                    cur.execute(
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 "
+                        "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                        f"({col_list})",
+                        (path,),
+                    )
+                    cur.execute(merge)
+                    dbapi.commit()
+                    total += len(chunk)
+                finally:
+                    os.unlink(path)
+            cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+        except Exception:
+            dbapi.rollback()
+            raise
+        finally:
+            cur.close()
+    return total
+
+
+def bulk_upsert_rows(rows: List[Dict[str, Any]]) -> int:
+    """appstore_rankings_daily 的批量装载版 upsert_rows()。"""
+    if not rows:
+        return 0
+    now = datetime.now()
+    rows = [r if r.get("crawled_at") else {**r, "crawled_at": now} for r in rows]
+    with _get_engine().connect() as conn:
+        new_rows = freshness_service.new_rows_sync(conn, "rankings", rows)
+    n = bulk_merge("appstore_rankings_daily", rows, RANKING_COLUMNS, RANKING_UPDATE,
+                   extra_update="`updated_at`=NOW()")
+    with _get_engine().begin() as conn:
+        freshness_service.apply_sync(conn, "rankings", rows, new_rows)
+        rollup_service.refresh_sync(conn, rows)
+        data_version_service.bump_sync(conn, rows)
+    return n
+
+
+def bulk_upsert_app_ratings(records: List[Dict[str, Any]]) -> int:
+    """app_ratings 的批量装载版 upsert_app_ratings()；按 row_hash 跳过内容未变化的行。"""
+    for r in records:
+        fill_typed(r)
+        if not r.get("row_hash"):
+            r["row_hash"] = row_hash(r)
+    with _get_engine().connect() as conn:
+        new_rows = freshness_service.new_rows_sync(conn, "app_ratings", records)
+    n = bulk_merge("app_ratings", records, RATING_COLUMNS, RATING_UPDATE, hash_col="row_hash")
+    with _get_engine().begin() as conn:
+        freshness_service.apply_sync(conn, "app_ratings", records, new_rows)
+        data_version_service.bump_sync(conn, records)
+    return n
@@ -0,0 +1,106 @@
+# app/services/data_version_service.py
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.data_version import DataVersion
+
+# -----------------------------
+# 数据版本（data_versions，每个 (brand_id, country, device) 一行）
+# -----------------------------
+# 写：write_service / bulk_load_service 写入 appstore_rankings_daily / app_ratings 时，在同一事务里对涉及的分片 version + 1
+#     （app_ratings 的 brand 名按 BRAND_IDS 映射为 brand_id；两张表共用版本，只会让对方的缓存多失效一次）；
+# 读：接口按分片取版本作为响应缓存键的一部分（见 app/core/cache.py）。整表很小，一次读全表并在进程内
+#     缓存 DATA_VERSION_TTL 秒（默认 5），即新数据最多延迟这么久对接口可见。
+# 旧库需先建表：python -m app.db.migrations --upgrade（m0005）。
+
+VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))
+
+Scope = Tuple[int, str, str]
+
+# app_ratings.brand -> brand_id（与 rank_crawl.BRAND_MAP 一致）
+BRAND_IDS = {"paid": 0, "free": 1, "grossing": 2}
+
+BUMP_SQL = text(
+    "INSERT INTO data_versions (brand_id, country, device, version) VALUES (:brand_id, :country, :device, 1) "
+    "ON DUPLICATE KEY UPDATE version = version + 1, updated_at = NOW()"
+)
+
+_lock = threading.Lock()
+_snapshot: Optional[Dict[Scope, int]] = None
+_loaded_at = 0.0
+_warned = False
+
+
+def scope_params(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """行涉及的分片（排序后按固定顺序加锁，避免并发写入互相死锁）。"""
+    scopes = set()
+    for r in rows:
+        brand_id = r["brand_id"] if "brand_id" in r else BRAND_IDS.get(r.get("brand"))
+        if brand_id is not None:
+            scopes.add((brand_id, r["country"], r["device"]))
+    return [{"brand_id": b, "country": c, "device": d} for b, c, d in sorted(scopes)]
+
+
+def bump_sync(db, rows: Sequence[Dict[str, Any]]) -> None:
+    """同步会话内递增版本（由调用方提交）。"""
+    params = scope_params(rows)
+    if params:
+        db.execute(BUMP_SQL, params)
+
+
+async def bump_async(session: AsyncSession, rows: Sequence[Dict[str, Any]]) -> None:
+    params = scope_params(rows)
+    if params:
+        await session.execute(BUMP_SQL, params)
+
+
+async def _reload(session: AsyncSession) -> Optional[Dict[Scope, int]]:
+    global _warned
+    try:
+        rows = (await session.execute(
+            select(DataVersion.brand_id, DataVersion.country, DataVersion.device, DataVersion.version))).all()
+    except Exception as e:
+        # 未建表等：不缓存，照常查询
+        await session.rollback()
+        if not _warned:
+            logging.warning(f"[data_version] 读取 data_versions 失败，响应缓存停用：{e}")
+            _warned = True
+        return None
+    return {(b, c, d): int(v) for b, c, d, v in rows}
+
+
+async def _current(session: AsyncSession) -> Optional[Dict[Scope, int]]:
+    global _snapshot, _loaded_at
+    now = time.monotonic()
+    with _lock:
+        fresh = now - _loaded_at < VERSION_TTL
+        snap = _snapshot
+    if not fresh:
+        # 读取失败同样缓存 TTL 秒，避免每个请求都重试
+        snap = await _reload(session)
+        with _lock:
+            _snapshot, _loaded_at = snap, now
+    return snap
+
+
+async def get_version(session: AsyncSession, brand_id: int, country: str, device: str) -> Optional[int]:
+    """分片当前版本；无记录为 0，data_versions 不可用时返回 None（调用方应跳过缓存）。"""
+    snap = await _current(session)
+    if snap is None:
+        return None
+    return snap.get((brand_id, country, device), 0)
+
+
+async def get_version_sum(session: AsyncSession, country: Optional[str] = None,
+                          device: Optional[str] = None) -> Optional[int]:
+    """匹配分片（country/device 为空表示不限）的版本之和：任一分片入库都会使其增大，供跨分片的缓存作键。"""
+    snap = await _current(session)
+    if snap is None:
+        return None
+    return sum(v for (_, c, d), v in snap.items() if (not country or c == country) and (not device or d == device))
@@ -0,0 +1,224 @@
+# app/services/freshness_service.py
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.partition_freshness import PartitionFreshness
+from app.db.models.ranking import AppStoreRankingDaily
+from app.db.models.rating import AppRatings
+
+# -----------------------------
+# 分片新鲜度登记（partition_freshness）
+# -----------------------------
+# 写：write_service / bulk_load_service 每批写入时按批内数据增量维护：earliest = LEAST(旧值, 批内最小日期)、
+#     latest = GREATEST(旧值, 批内最大日期)、row_count += 批内新增行数（新增行按唯一键在写入前探测，
+#     app_ratings 直接复用变化检测已查到的指纹）；代价只与批大小有关，不再对整个分片重算 MIN/MAX/COUNT(*)。
+#     source 与 write_service 的 kind 同名。整体重算 rebuild_sync 只用于迁移初始化与分区过期后。
+#     并发写同一新键时 row_count 可能略有偏差，rebuild_sync 可校正。
+# 读：接口用 latest_date() 从进程内快照取最新日期（整表很小，每 FRESHNESS_TTL 秒重载一次，默认 5），
+#     不再逐请求 SELECT MAX(chart_date)；登记表不可用（未迁移）时回退到原聚合查询。
+# 旧库需先建表并回填：python -m app.db.migrations --upgrade（m0006）。
+
+FRESHNESS_TTL = float(os.getenv("FRESHNESS_TTL", "5"))
+
+# source -> (表, 品牌列, 日期列)
+SOURCES = {
+    "rankings": ("appstore_rankings_daily", "brand_id", "chart_date"),
+    "app_ratings": ("app_ratings", "brand", "update_time"),
+}
+
+Key = Tuple[str, str, str, str]
+
+
+def refresh_sql(source: str, where: str = "") -> str:
+    table, brand_col, date_col = SOURCES[source]
+    return (
+        "INSERT INTO partition_freshness (source, brand, country, device, earliest_date, latest_date, row_count) "
+        f"SELECT '{source}', {brand_col}, country, device, MIN({date_col}), MAX({date_col}), COUNT(*) FROM {table} "
+        f"{where} GROUP BY {brand_col}, country, device "
+        "ON DUPLICATE KEY UPDATE earliest_date = VALUES(earliest_date), latest_date = VALUES(latest_date), "
+        "row_count = VALUES(row_count), updated_at = NOW()"
+    )
+
+
+# source -> 唯一键（uq_daily_idx / uq_ratings_dim）；探测新增行时最后一列走 IN，其余列等值
+_UNIQUE_KEYS = {
+    "rankings": ("chart_date", "brand_id", "genre", "country", "device", "index"),
+    "app_ratings": ("chart_date", "country", "device", "brand", "app_id"),
+}
+
+
+def _exists_sql(source: str):
+    table = SOURCES[source][0]
+    *eq, last = _UNIQUE_KEYS[source]
+    cols = ", ".join(f"`{c}`" for c in _UNIQUE_KEYS[source])
+    where = " AND ".join(f"`{c}` = :{c}" for c in eq)
+    return text(f"SELECT {cols} FROM {table} WHERE {where} AND `{last}` IN :keys").bindparams(
+        bindparam("keys", expanding=True))
+
+
+_EXISTS_SQL = {s: _exists_sql(s) for s in SOURCES}
+
+DELTA_SQL = text(
+    "INSERT INTO partition_freshness (source, brand, country, device, earliest_date, latest_date, row_count) "
+    "VALUES (:source, :brand, :country, :device, :earliest, :latest, :inserted) "
+    "ON DUPLICATE KEY UPDATE "
+    "earliest_date = LEAST(COALESCE(earliest_date, VALUES(earliest_date)), VALUES(earliest_date)), "
+    "latest_date = GREATEST(COALESCE(latest_date, VALUES(latest_date)), VALUES(latest_date)), "
+    "row_count = row_count + VALUES(row_count), updated_at = NOW()"
+)
+
+
+def _norm(v: Any) -> Optional[str]:
+    return None if v is None else str(v)
+
+
+def _probes(source: str, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    *eq, last = _UNIQUE_KEYS[source]
+    groups: Dict[Tuple, set] = {}
+    for r in rows:
+        if r.get(last) is not None:  # 唯一键含 NULL 时不会冲突，必为新增
+            groups.setdefault(tuple(r.get(c) for c in eq), set()).add(r.get(last))
+    return [{**dict(zip(eq, g)), "keys": sorted(v, key=str)} for g, v in groups.items()]
+
+
+def _unseen(source: str, rows: Sequence[Dict[str, Any]], found: set) -> List[Dict[str, Any]]:
+    out, seen = [], set(found)
+    for r in rows:
+        k = tuple(_norm(r.get(c)) for c in _UNIQUE_KEYS[source])
+        if k not in seen:
+            seen.add(k)
+            out.append(r)
+    return out
+
+
+def new_rows_sync(db, source: str, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """rows 中库内尚不存在的行（按唯一键，批内去重）；须在写入前调用，结果交给 apply_sync。"""
+    found = set()
+    for p in _probes(source, rows):
+        found.update(tuple(map(_norm, r)) for r in db.execute(_EXISTS_SQL[source], p).all())
+    return _unseen(source, rows, found)
+
+
+async def new_rows_async(session: AsyncSession, source: str, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    found = set()
+    for p in _probes(source, rows):
+        found.update(tuple(map(_norm, r)) for r in (await session.execute(_EXISTS_SQL[source], p)).all())
+    return _unseen(source, rows, found)
+
+
+def delta_params(source: str, rows: Sequence[Dict[str, Any]],
+                 new_rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按分片汇总批内 最小/最大日期 与 新增行数。"""
+    _, brand_col, date_col = SOURCES[source]
+    acc: Dict[Tuple, Dict[str, Any]] = {}
+
+    def scope(r):
+        return acc.setdefault((str(r[brand_col]), r["country"], r["device"]),
+                              {"earliest": None, "latest": None, "inserted": 0})
+
+    for r in rows:
+        a = scope(r)
+        d = r.get(date_col)
+        if d is None:
+            continue
+        d = str(d)[:10]
+        a["earliest"] = d if a["earliest"] is None else min(a["earliest"], d)
+        a["latest"] = d if a["latest"] is None else max(a["latest"], d)
+    for r in new_rows:
+        scope(r)["inserted"] += 1
+    return [{"source": source, "brand": b, "country": c, "device": d, **a} for (b, c, d), a in sorted(acc.items())]
+
+
+def apply_sync(db, source: str, rows: Sequence[Dict[str, Any]], new_rows: Sequence[Dict[str, Any]]) -> None:
+    """按批增量更新涉及分片的登记（由调用方提交）。"""
+    params = delta_params(source, rows, new_rows)
+    if params:
+        db.execute(DELTA_SQL, params)
+
+
+async def apply_async(session: AsyncSession, source: str, rows: Sequence[Dict[str, Any]],
+                      new_rows: Sequence[Dict[str, Any]]) -> None:
+    params = delta_params(source, rows, new_rows)
+    if params:
+        await session.execute(DELTA_SQL, params)
+
+
+def rebuild_sync(db, source: str) -> None:
+    """整体重算某数据源的登记（迁移初始化、分区过期后调用；由调用方提交）。"""
+    db.execute(text("DELETE FROM partition_freshness WHERE source = :s"), {"s": source})
+    db.execute(text(refresh_sql(source)))
+
+
+# ---------- 读取 ----------
+_lock = threading.Lock()
+_snapshot: Optional[Dict[Key, Tuple[Optional[date], Optional[date], int]]] = None
+_loaded_at = 0.0
+_warned = False
+
+
+async def _reload(session: AsyncSession):
+    global _warned
+    try:
+        rows = (await session.execute(select(
+            PartitionFreshness.source, PartitionFreshness.brand, PartitionFreshness.country,
+            PartitionFreshness.device, PartitionFreshness.earliest_date, PartitionFreshness.latest_date,
+            PartitionFreshness.row_count,
+        ))).all()
+    except Exception as e:
+        await session.rollback()
+        if not _warned:
+            logging.warning(f"[freshness] 读取 partition_freshness 失败，回退到聚合查询：{e}")
+            _warned = True
+        return None
+    return {(s, b, c, d): (e, l, int(n or 0)) for s, b, c, d, e, l, n in rows}
+
+
+async def snapshot(session: AsyncSession) -> Optional[Dict[Key, Tuple[Optional[date], Optional[date], int]]]:
+    """{(source, brand, country, device): (earliest, latest, rows)}；登记表不可用时为 None。"""
+    global _snapshot, _loaded_at
+    now = time.monotonic()
+    with _lock:
+        fresh = now - _loaded_at < FRESHNESS_TTL
+        snap = _snapshot
+    if not fresh:
+        snap = await _reload(session)
+        with _lock:
+            _snapshot, _loaded_at = snap, now
+    return snap
+
+
+def _match(key: Key, source: str, brand, country, device) -> bool:
+    s, b, c, d = key
+    return (s == source and (brand in (None, "") or b == str(brand))
+            and (not country or c == country) and (not device or d == device))
+
+
+async def _aggregate_latest(session: AsyncSession, source: str, brand, country, device) -> Optional[date]:
+    model = AppStoreRankingDaily if source == "rankings" else AppRatings
+    brand_col = model.brand_id if source == "rankings" else model.brand
+    date_col = model.chart_date if source == "rankings" else model.update_time
+    stmt = select(func.max(date_col))
+    if brand not in (None, ""):
+        stmt = stmt.where(brand_col == brand)
+    if country:
+        stmt = stmt.where(model.country == country)
+    if device:
+        stmt = stmt.where(model.device == device)
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def latest_date(session: AsyncSession, source: str, brand: Any = None,
+                      country: Optional[str] = None, device: Optional[str] = None) -> Optional[date]:
+    """匹配分片中的最新日期（brand/country/device 为空表示不限）；无数据返回 None。"""
+    snap = await snapshot(session)
+    if snap is None:
+        return await _aggregate_latest(session, source, brand, country, device)
+    dates = [v[1] for k, v in snap.items() if v[1] is not None and _match(k, source, brand, country, device)]
+    return max(dates) if dates else None
@@ -1,9 +1,10 @@
 
 
-from typing import List, Dict, Any
-import json
-from sqlalchemy import text
+from typing import List, Dict, Any, Optional
+from sqlalchemy import bindparam, text
+from app.core import jsonfast
 from app.db.base import SessionLocal
+from app.services.write_service import RANKING_UPSERT_SQL, upsert_sync
 
 # -----------------------------
 # Qimai Rankings Upsert Service
@@ -14,40 +15,8 @@ from app.db.base import SessionLocal
 #   UNIQUE KEY uq_daily_idx (chart_date, brand_id, genre, `index`, country, device)
 # 与模型表 app.db.models.ranking.AppStoreRankingDaily 对应。
 
-UPSERT_SQL = text(
-    """
-    INSERT INTO appstore_rankings_daily (
-      chart_date, brand_id, country, device, genre, app_genre,
-      `index`, ranking, `change`, is_ad,
-      app_id, app_name, subtitle, icon_url, publisher, publisher_id, price,
-      file_size_bytes, file_size_mb, continuous_first_days,
-      source, raw_json, crawled_at
-    ) VALUES (
-      :chart_date, :brand_id, :country, :device, :genre, :app_genre,
-      :index, :ranking, :change, :is_ad,
-      :app_id, :app_name, :subtitle, :icon_url, :publisher, :publisher_id, :price,
-      :file_size_bytes, :file_size_mb, :continuous_first_days,
-      :source, :raw_json, NOW()
-    )
-    ON DUPLICATE KEY UPDATE
-      ranking=VALUES(ranking),
-      `change`=VALUES(`change`),
-      is_ad=VALUES(is_ad),
-      app_name=VALUES(app_name),
-      subtitle=VALUES(subtitle),
-      icon_url=VALUES(icon_url),
-      publisher=VALUES(publisher),
-      publisher_id=VALUES(publisher_id),
-      price=VALUES(price),
-      file_size_bytes=VALUES(file_size_bytes),
-      file_size_mb=VALUES(file_size_mb),
-      continuous_first_days=VALUES(continuous_first_days),
-      app_genre=VALUES(app_genre),
-      source=VALUES(source),
-      raw_json=VALUES(raw_json),
-      updated_at=NOW();
-    """
-)
+# 语句定义在 write_service（同步/异步写入口共用）
+UPSERT_SQL = RANKING_UPSERT_SQL
 
 
 def _to_int(x):
@@ -64,8 +33,12 @@ def _to_dec(x):
         return None
 
 
-def _build_row(date_str: str, brand_id: int, genre: int, item: Dict[str, Any]) -> Dict[str, Any]:
-    """将七麦 list 单条记录扁平化为写库所需的行字典。"""
+def _build_row(date_str: str, brand_id: int, genre: int, item: Dict[str, Any],
+               item_json: Optional[str] = None, country: str = "cn", device: str = "iphone") -> Dict[str, Any]:
+    """
+    将七麦 list 单条记录扁平化为写库所需的行字典。item_json 为已序列化的 item（可复用）。
+    country/device 取抓取链路的维度（item 里不一定带，且不区分 iphone/ipad）。
+    """
     app = (item.get("appInfo") or {})
     klass = (item.get("class") or {})
 
@@ -75,8 +48,8 @@ def _build_row(date_str: str, brand_id: int, genre: int, item: Dict[str, Any]) -
     return {
         "chart_date": date_str,
         "brand_id": brand_id,
-        "country": app.get("country") or "cn",
-        "device": "iphone",
+        "country": country,
+        "device": device,
         "genre": genre,
         "app_genre": item.get("appGenre") or item.get("genre"),
         "index": item.get("index"),
@@ -94,24 +67,65 @@ def _build_row(date_str: str, brand_id: int, genre: int, item: Dict[str, Any]) -
         "file_size_mb": file_size_mb,
         "continuous_first_days": _to_int(app.get("continuousFirstDays")),
         "source": "qimai",
-        "raw_json": json.dumps(item, ensure_ascii=False),
+        "raw_json": item_json if item_json is not None else jsonfast.dumps(item),
     }
 
 
-def upsert_page(date_str: str, brand_id: int, genre: int, items: List[Dict[str, Any]]) -> int:
+def build_rows(date_str: str, brand_id: int, genre: int, items: List[Dict[str, Any]],
+               item_jsons: Optional[List[str]] = None, country: str = "cn",
+               device: str = "iphone") -> List[Dict[str, Any]]:
+    """整页扁平化，供后台批量写入器先收集、后统一 upsert_rows()。"""
+    if item_jsons is None:
+        return [_build_row(date_str, brand_id, genre, it, country=country, device=device) for it in items]
+    return [_build_row(date_str, brand_id, genre, it, j, country=country, device=device)
+            for it, j in zip(items, item_jsons)]
+
+
+def upsert_rows(rows: List[Dict[str, Any]]) -> int:
+    """
+    多行写入（幂等），行字典由 build_rows() 生成，可跨页/跨天合并。
+    按字节切块、每块一条多行 INSERT（见 write_service.upsert_sync）。
+    :return: 写入/更新的记录数
+    """
+    return upsert_sync("rankings", rows)
+
+
+def upsert_page(date_str: str, brand_id: int, genre: int, items: List[Dict[str, Any]],
+                country: str = "cn", device: str = "iphone") -> int:
     """
     批量写入（幂等）：同一天/同榜单/同分类/同国家/同设备/同 index 冲突则更新。
     :return: 成功写入/更新的记录数
     """
     if not items:
         return 0
+    return upsert_rows(build_rows(date_str, brand_id, genre, items, country=country, device=device))
 
-    rows = [_build_row(date_str, brand_id, genre, it) for it in items]
 
+def day_counts(start: str, end: str, brand_ids: List[int], genre: int,
+               country: str = "cn", device: str = "iphone") -> Dict[tuple, int]:
+    """
+    统计 [start, end] 内每个 (chart_date, brand_id) 已入库的行数（按 genre/country/device 过滤）。
+    供爬虫断点续抓规划器判断哪些天已完整。
+    :return: {("YYYY-MM-DD", brand_id): 行数}
+    """
+    if not brand_ids:
+        return {}
+    stmt = text(
+        """
+        SELECT chart_date, brand_id, COUNT(*) AS cnt
+        FROM appstore_rankings_daily
+        WHERE chart_date BETWEEN :start AND :end
+          AND brand_id IN :brand_ids
+          AND genre = :genre AND country = :country AND device = :device
+        GROUP BY chart_date, brand_id
+        """
+    ).bindparams(bindparam("brand_ids", expanding=True))
     db = SessionLocal()
     try:
-        db.execute(UPSERT_SQL, rows)
-        db.commit()
-        return len(rows)
+        rows = db.execute(stmt, {
+            "start": start, "end": end, "brand_ids": list(brand_ids),
+            "genre": str(genre), "country": country, "device": device,
+        }).all()
+        return {(str(d), int(b)): int(c) for d, b, c in rows}
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,19 +1,156 @@
 # app/services/rating_service.py
-from typing import List, Dict, Any
-from sqlalchemy.dialects.mysql import insert
+import json
+import re
+from datetime import date as _date
+from hashlib import blake2b
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func, select
 from app.db.base import SessionLocal
 from app.db.models.rating import AppRatings
+from app.services.write_service import upsert_sync
 
-def upsert_app_ratings(records: List[Dict[str, Any]]) -> int:
+# 变化检测：row_hash 覆盖除 id / row_hash / raw_hash 外的全部列（raw_json 按原文计入）；库内指纹相同的行不再写库。
+# 旧库需先加列：ALTER TABLE app_ratings ADD COLUMN row_hash VARCHAR(16) NULL COMMENT '行内容指纹';
+# （row_hash 为 NULL 的历史行首次遇到时按“变化”重写一次，顺带补齐指纹。）
+HASH_COLUMNS = tuple(c.name for c in AppRatings.__table__.columns if c.name not in ("id", "row_hash", "raw_hash"))
+_KEY = ("chart_date", "country", "device", "brand", "app_id")  # 与 uq_ratings_dim 一致
+
+
+# 类型化列：rank_{a,b,c}_{genre,ranking,change} + rating_count，入库时解析一次（旧库由迁移 m0004 加列并回填）
+RANK_SCOPES = ("rank_a", "rank_b", "rank_c")
+TYPED_COLUMNS = tuple(f"{s}_{f}" for s in RANK_SCOPES for f in ("genre", "ranking", "change")) + ("rating_count",)
+_COUNT_RE = re.compile(r"^([0-9]+(?:\.[0-9]+)?)\s*(万|亿|[wWkK])?\+?$")
+_COUNT_UNITS = {"万": 10_000, "亿": 100_000_000, "w": 10_000, "k": 1_000}
+
+
+def parse_count(v: Any) -> Optional[int]:
+    """计数字符串转整数：132万 / 1.2亿 / 12,345 / 3.5w；无法解析返回 None。"""
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return int(v)
+    m = _COUNT_RE.match(str(v).strip().replace(",", ""))
+    if not m:
+        return None
+    unit = _COUNT_UNITS.get((m.group(2) or "").lower(), 1)
+    return int(round(float(m.group(1)) * unit))
+
+
+def _int_or_none(v: Any) -> Optional[int]:
+    try:
+        return None if v is None or v == "" else int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def typed_fields(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """从 rank_a/b/c（dict 或 JSON 串）与 rating_num 解析类型化列。"""
+    out: Dict[str, Any] = {}
+    for scope in RANK_SCOPES:
+        obj = rec.get(scope)
+        if isinstance(obj, (str, bytes)):
+            try:
+                obj = json.loads(obj)
+            except ValueError:
+                obj = None
+        if not isinstance(obj, dict):
+            obj = {}
+        genre = obj.get("genre")
+        out[f"{scope}_genre"] = str(genre)[:64] if genre else None
+        out[f"{scope}_ranking"] = _int_or_none(obj.get("ranking"))
+        out[f"{scope}_change"] = _int_or_none(obj.get("change"))
+    out["rating_count"] = parse_count(rec.get("rating_num"))
+    return out
+
+
+def fill_typed(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """记录尚未带类型化列时就地补齐（normalize 已解析过的记录不重复解析）。"""
+    if "rating_count" not in rec:
+        rec.update(typed_fields(rec))
+    return rec
+
+
+def row_hash(rec: Dict[str, Any]) -> str:
+    """记录内容指纹（16 位十六进制）；None 与空串区分开。"""
+    raw = "\x1f".join("\x00" if rec.get(c) is None else str(rec.get(c)) for c in HASH_COLUMNS)
+    return blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _existing_hashes(db, records: List[Dict[str, Any]]) -> Dict[Tuple, Any]:
+    """按 (chart_date, country, device, brand) 分组、app_id IN (...) 走唯一索引前缀取库内指纹。"""
+    groups: Dict[Tuple, List[str]] = {}
+    for r in records:
+        groups.setdefault((r["chart_date"], r["country"], r["device"], r["brand"]), []).append(r["app_id"])
+    found: Dict[Tuple, Any] = {}
+    for (d, country, device, brand), app_ids in groups.items():
+        stmt = select(AppRatings.app_id, AppRatings.row_hash).where(
+            AppRatings.chart_date == d,
+            AppRatings.country == country,
+            AppRatings.device == device,
+            AppRatings.brand == brand,
+            AppRatings.app_id.in_(app_ids),
+        )
+        for app_id, h in db.execute(stmt).all():
+            found[(d, country, device, brand, app_id)] = h
+    return found
+
+
+def upsert_app_ratings_counts(records: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    变化检测写入（幂等）：先取库内指纹，只对新行/指纹不同的行做多行 upsert（write_service，同一会话）。
+    同一批内重复的键以最后一条为准。
+    :return: {"inserted": 新增行数, "changed": 内容变化行数, "unchanged": 跳过行数}
+    """
+    counts = {"inserted": 0, "changed": 0, "unchanged": 0}
     if not records:
-        return 0
+        return counts
+    latest: Dict[Tuple, Dict[str, Any]] = {}
+    for r in records:
+        if not r.get("row_hash"):
+            r["row_hash"] = row_hash(fill_typed(r))
+        latest[tuple(r[k] for k in _KEY)] = r
+    with SessionLocal() as db:
+        found = _existing_hashes(db, list(latest.values()))
+        to_write, inserted = [], []
+        for key, r in latest.items():
+            if key not in found:
+                counts["inserted"] += 1
+                inserted.append(r)
+            elif found[key] != r["row_hash"]:
+                counts["changed"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            to_write.append(r)
+        if to_write:
+            upsert_sync("app_ratings", to_write, db=db, new_rows=inserted)
+    return counts
+
+
+def upsert_app_ratings(records: List[Dict[str, Any]]) -> int:
+    """同 upsert_app_ratings_counts，返回处理的记录数（新增 + 变化 + 未变化）。"""
+    return sum(upsert_app_ratings_counts(records).values())
+
+
+def day_counts(start: _date, end: _date, brands: List[str],
+               country: str = "cn", device: str = "iphone") -> Dict[tuple, int]:
+    """
+    统计 [start, end] 内每个 (chart_date, brand) 已入库的行数。
+    注意：app_ratings 不保存请求时的 genre ID，因此不按 genre 区分；
+    rank_crawl 据此拒绝 --api index 同时抓多个分类。
+    :return: {("YYYY-MM-DD", brand): 行数}
+    """
+    if not brands:
+        return {}
     with SessionLocal() as db:
-        # 构建 INSERT ... ON DUPLICATE KEY UPDATE
-        # 建议你在 app_ratings 上加一个唯一索引：
-        # UNIQUE (chart_date, country, device, app_id)
-        stmt = insert(AppRatings).values(records)
-        update_cols = {c.name: stmt.inserted[c.name] for c in AppRatings.__table__.columns if c.name not in ("id",)}
-        ondup = stmt.on_duplicate_key_update(**update_cols)
-        result = db.execute(ondup)
-        db.commit()
-        return result.rowcount or len(records)
\ No newline at end of file
+        stmt = (
+            select(AppRatings.chart_date, AppRatings.brand, func.count())
+            .where(
+                AppRatings.chart_date.between(start, end),
+                AppRatings.brand.in_(brands),
+                AppRatings.country == country,
+                AppRatings.device == device,
+            )
+            .group_by(AppRatings.chart_date, AppRatings.brand)
+        )
+        return {(d.isoformat(), b): int(c) for d, b, c in db.execute(stmt).all()}
@@ -0,0 +1,92 @@
+# app/services/raw_payload_service.py
+import os
+import zlib
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models.raw_payload import RawPayload
+
+# -----------------------------
+# raw_json 副表（raw_payloads，内容寻址 + zlib 压缩）
+# -----------------------------
+# 职责：写入时把行里的 raw_json 换成 raw_hash（热表该列写 NULL），原文压缩后 INSERT IGNORE 进 raw_payloads；
+#      读取时按哈希批量取回并解压，只在调用方需要原文时才访问副表。
+# 说明：RAW_SIDE_STORE=0 时保持旧行为（raw_json 内联写热表）；历史行用 app/util/raw_payload_migrate.py 迁移。
+# 旧库需先建表/加列：
+#   CREATE TABLE raw_payloads (hash VARCHAR(32) NOT NULL PRIMARY KEY, codec VARCHAR(8) NOT NULL, raw_size INT NOT NULL,
+#                              data MEDIUMBLOB NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+#   ALTER TABLE app_ratings ADD COLUMN raw_hash VARCHAR(32) NULL;
+#   ALTER TABLE appstore_rankings_daily ADD COLUMN raw_hash VARCHAR(32) NULL;
+
+SIDE_STORE = os.getenv("RAW_SIDE_STORE", "1") not in ("0", "false", "no")
+CODEC = "zlib"
+
+INSERT_SQL = text(
+    "INSERT IGNORE INTO raw_payloads (hash, codec, raw_size, data) VALUES (:hash, :codec, :raw_size, :data)"
+)
+
+
+def encode(raw: str) -> Tuple[str, Dict[str, Any]]:
+    """原文 → (哈希, raw_payloads 行)。"""
+    b = raw.encode("utf-8")
+    h = blake2b(b, digest_size=16).hexdigest()
+    return h, {"hash": h, "codec": CODEC, "raw_size": len(b), "data": zlib.compress(b, 6)}
+
+
+def decode(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec in ("", "none"):
+        return bytes(data).decode("utf-8")
+    raise ValueError(f"unknown raw payload codec: {codec}")
+
+
+def extract(rows: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    把行中的 raw_json 拆到副表：返回 (改写后的行, 去重后的 raw_payloads 行)。
+    改写后的行 raw_json=None、raw_hash=原文哈希；未启用副表或无 raw_json 的行原样返回。
+    """
+    rows = list(rows)
+    if not SIDE_STORE:
+        return rows, []
+    out: List[Dict[str, Any]] = []
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        raw = r.get("raw_json")
+        if not isinstance(raw, str) or not raw:
+            out.append(r)
+            continue
+        h, p = encode(raw)
+        payloads.setdefault(h, p)
+        out.append({**r, "raw_json": None, "raw_hash": h})
+    return out, list(payloads.values())
+
+
+def load(db: Session, hashes: Iterable[str]) -> Dict[str, str]:
+    """同步按哈希批量取原文：{hash: raw_json}。"""
+    hs = sorted({h for h in hashes if h})
+    if not hs:
+        return {}
+    rows = db.execute(select(RawPayload.hash, RawPayload.codec, RawPayload.data).where(RawPayload.hash.in_(hs))).all()
+    return {h: decode(c, d) for h, c, d in rows}
+
+
+async def load_async(session: AsyncSession, hashes: Iterable[str]) -> Dict[str, str]:
+    """异步按哈希批量取原文：{hash: raw_json}。"""
+    hs = sorted({h for h in hashes if h})
+    if not hs:
+        return {}
+    res = await session.execute(
+        select(RawPayload.hash, RawPayload.codec, RawPayload.data).where(RawPayload.hash.in_(hs))
+    )
+    return {h: decode(c, d) for h, c, d in res.all()}
+
+
+async def load_one_async(session: AsyncSession, raw_hash: Optional[str]) -> Optional[str]:
+    if not raw_hash:
+        return None
+    return (await load_async(session, [raw_hash])).get(raw_hash)
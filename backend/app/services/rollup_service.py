@@ -0,0 +1,92 @@
+# app/services/rollup_service.py
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# -----------------------------
+# 类别日汇总（rankings_genre_daily）
+# -----------------------------
+# 写：write_service / bulk_load_service 写入 appstore_rankings_daily 后，对涉及的每个 (chart_date, brand_id, country, device)
+#     先删后插整体重算该天该分片的汇总（约两百行明细 → 十几行汇总，幂等，重复入库不会累加出错）；
+# 读：genre_trend / volatility_trend / list_genres / top_apps 的类别占比 / overview_kpis 直接读汇总，
+#     365 天趋势只扫几百到几千行小表，不再对明细做 COUNT(DISTINCT) / stddev_pop / 嵌套最好名次子查询。
+# 说明：同一 app 同日在同一分片下 app_genre 唯一，故同一榜单分类（genre）内跨类别求和（genre='all'）与直接对明细去重一致；
+#       同一 app 可同时上多个榜单分类，跨 genre 相加会重复计数，读取方须按单个 genre 过滤。
+# 旧库需先建表并回填：python -m app.db.migrations --upgrade（m0007）。
+
+_AGG_SELECT = """
+SELECT chart_date, brand_id, country, device, cg, g,
+       COUNT(*), COALESCE(SUM(best), 0), COUNT(best),
+       COALESCE(SUM(rs), 0), COALESCE(SUM(rsq), 0), SUM(rc), SUM(n)
+FROM (
+  SELECT chart_date, brand_id, country, device, COALESCE(genre, '') AS cg, COALESCE(app_genre, '') AS g, app_id,
+         MIN(COALESCE(ranking, `index`)) AS best,
+         SUM(ranking) AS rs, SUM(ranking * ranking) AS rsq, COUNT(ranking) AS rc, COUNT(*) AS n
+  FROM appstore_rankings_daily
+  {where}
+  GROUP BY chart_date, brand_id, country, device, cg, g, app_id
+) t
+GROUP BY chart_date, brand_id, country, device, cg, g
+"""
+
+_INSERT = ("INSERT INTO rankings_genre_daily (chart_date, brand_id, country, device, genre, app_genre, apps, "
+           "best_rank_sum, best_rank_cnt, rank_sum, rank_sum_sq, rank_cnt, entries)")
+
+_DAY_WHERE = "WHERE chart_date = :d AND brand_id = :brand_id AND country = :country AND device = :device"
+DELETE_DAY_SQL = text(f"DELETE FROM rankings_genre_daily {_DAY_WHERE}")
+INSERT_DAY_SQL = text(_INSERT + _AGG_SELECT.format(where=_DAY_WHERE))
+
+
+def day_params(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    days = {(str(r["chart_date"]), r["brand_id"], r["country"], r["device"]) for r in rows}
+    return [{"d": d, "brand_id": b, "country": c, "device": v} for d, b, c, v in sorted(days)]
+
+
+def refresh_sync(db, rows: Sequence[Dict[str, Any]]) -> int:
+    """重算 rows 涉及的“天 × 分片”汇总（由调用方提交）。:return: 重算的天数"""
+    params = day_params(rows)
+    for p in params:
+        db.execute(DELETE_DAY_SQL, p)
+        db.execute(INSERT_DAY_SQL, p)
+    return len(params)
+
+
+async def refresh_async(session: AsyncSession, rows: Sequence[Dict[str, Any]]) -> int:
+    params = day_params(rows)
+    for p in params:
+        await session.execute(DELETE_DAY_SQL, p)
+        await session.execute(INSERT_DAY_SQL, p)
+    return len(params)
+
+
+def rebuild_sync(db, start: Optional[str] = None, end: Optional[str] = None) -> None:
+    """整体重建（迁移初始化 / 手工修复）；可按日期区间限定。由调用方提交。"""
+    where, params = "", {}
+    if start and end:
+        where, params = "WHERE chart_date BETWEEN :start AND :end", {"start": start, "end": end}
+    db.execute(text(f"DELETE FROM rankings_genre_daily {where}"), params)
+    db.execute(text(_INSERT + _AGG_SELECT.format(where=where)), params)
+
+
+# ---------- 读取侧的合并计算 ----------
+def stddev_pop(rank_sum: float, rank_sum_sq: float, rank_cnt: int) -> Optional[float]:
+    """由和 / 平方和 / 个数还原总体标准差（与 MySQL stddev_pop 一致）。"""
+    if not rank_cnt:
+        return None
+    mean = rank_sum / rank_cnt
+    return math.sqrt(max(0.0, rank_sum_sq / rank_cnt - mean * mean))
+
+
+def merge_days(rows: Iterable[Tuple]) -> Dict[Any, Dict[str, float]]:
+    """
+    (chart_date, apps, best_rank_sum, best_rank_cnt, rank_sum, rank_sum_sq, rank_cnt, entries) 按天合并跨类别的汇总。
+    """
+    out: Dict[Any, Dict[str, float]] = {}
+    keys = ("apps", "best_rank_sum", "best_rank_cnt", "rank_sum", "rank_sum_sq", "rank_cnt", "entries")
+    for d, *vals in rows:
+        acc = out.setdefault(d, dict.fromkeys(keys, 0))
+        for k, v in zip(keys, vals):
+            acc[k] += int(v or 0)
+    return out
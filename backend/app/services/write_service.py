@@ -0,0 +1,215 @@
+# app/services/write_service.py
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.base import SessionLocal, async_session
+from app.services import data_version_service, freshness_service, raw_payload_service, rollup_service
+
+# -----------------------------
+# 统一写库入口（爬虫 / 接口触发的入库任务共用）
+# -----------------------------
+# 职责：rankings / app_ratings 两类行字典的多行 upsert，提供同步与异步两个入口：
+#   upsert_sync(kind, rows, db=None)          —— 爬虫、BatchWriter、脚本（base.SessionLocal，pymysql 连接池）
+#   await upsert_async(kind, rows, session=None) —— FastAPI 进程内的入库任务（base.async_session，aiomysql 连接池）
+# 说明：
+#   - 一次调用只占用一个会话/连接（可传入调用方已有的 db/session 复用），不再每页开关会话；
+#   - 行按估算字节数切块（DB_WRITE_BATCH_BYTES，默认 4 MiB），每块一条 executemany（驱动改写为多行 INSERT）并单独提交，
+#     控制单个事务的锁持有时间与包大小（需小于 max_allowed_packet）；
+#   - app_ratings 的 UPDATE 以 row_hash 为条件：指纹相同的行各列保持原值，不产生实际写入；
+#   - raw_json 在写入前拆到 raw_payloads 副表（见 raw_payload_service），热表只存 raw_hash；
+#   - 每块在同一事务里递增所涉分片的数据版本（data_version_service），接口响应缓存据此失效；
+#   - 写入前按唯一键探测新增行，全部块写完后按批增量更新所涉分片的新鲜度登记（freshness_service），接口据此取最新日期；
+#     rankings 另重算所涉“天 × 分片”的类别日汇总（rollup_service）并再递增一次版本，缓存不会停在汇总更新之前。
+
+MAX_BATCH_BYTES = int(os.getenv("DB_WRITE_BATCH_BYTES", str(4 * 1024 * 1024)))
+
+RANKING_UPSERT_SQL = text(
+    """
+    INSERT INTO appstore_rankings_daily (
+      chart_date, brand_id, country, device, genre, app_genre,
+      `index`, ranking, `change`, is_ad,
+      app_id, app_name, subtitle, icon_url, publisher, publisher_id, price,
+      file_size_bytes, file_size_mb, continuous_first_days,
+      source, raw_json, raw_hash, crawled_at
+    ) VALUES (
+      :chart_date, :brand_id, :country, :device, :genre, :app_genre,
+      :index, :ranking, :change, :is_ad,
+      :app_id, :app_name, :subtitle, :icon_url, :publisher, :publisher_id, :price,
+      :file_size_bytes, :file_size_mb, :continuous_first_days,
+      :source, :raw_json, :raw_hash, :crawled_at
+    )
+    ON DUPLICATE KEY UPDATE
+      ranking=VALUES(ranking),
+      `change`=VALUES(`change`),
+      is_ad=VALUES(is_ad),
+      app_name=VALUES(app_name),
+      subtitle=VALUES(subtitle),
+      icon_url=VALUES(icon_url),
+      publisher=VALUES(publisher),
+      publisher_id=VALUES(publisher_id),
+      price=VALUES(price),
+      file_size_bytes=VALUES(file_size_bytes),
+      file_size_mb=VALUES(file_size_mb),
+      continuous_first_days=VALUES(continuous_first_days),
+      app_genre=VALUES(app_genre),
+      source=VALUES(source),
+      raw_json=VALUES(raw_json),
+      raw_hash=VALUES(raw_hash),
+      updated_at=NOW()
+    """
+)
+
+RATING_COLUMNS = (
+    "app_id", "app_name", "publisher", "country", "brand", "device",
+    "chart_date", "last_release_time", "update_time",
+    "index", "genre", "keyword_cover", "keyword_cover_top3",
+    "rank_a", "rank_b", "rank_c", "rating", "rating_num", "is_ad", "icon_url", "raw_json", "raw_hash",
+    "rank_a_genre", "rank_a_ranking", "rank_a_change", "rank_b_genre", "rank_b_ranking", "rank_b_change",
+    "rank_c_genre", "rank_c_ranking", "rank_c_change", "rating_count",
+)
+
+
+def _rating_upsert_sql():
+    cols = ", ".join(f"`{c}`" for c in RATING_COLUMNS + ("row_hash",))
+    vals = ", ".join(f":{c}" for c in RATING_COLUMNS + ("row_hash",))
+    # row_hash 必须最后赋值（MySQL 按书写顺序求值）
+    sets = ",\n      ".join(f"`{c}`=IF(row_hash <=> VALUES(row_hash), `{c}`, VALUES(`{c}`))" for c in RATING_COLUMNS)
+    return text(f"INSERT INTO app_ratings ({cols}) VALUES ({vals})\n"
+                f"    ON DUPLICATE KEY UPDATE\n      {sets},\n      row_hash=VALUES(row_hash)")
+
+
+RATING_UPSERT_SQL = _rating_upsert_sql()
+
+
+def _prepare_rankings(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    now = datetime.now()
+    return [{**r, "crawled_at": r.get("crawled_at") or now, "raw_hash": r.get("raw_hash")} for r in rows]
+
+
+def _prepare_app_ratings(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from app.services.rating_service import fill_typed, row_hash
+    out = []
+    for r in rows:
+        fill_typed(r)
+        p = {c: r.get(c) for c in RATING_COLUMNS}
+        p["row_hash"] = r.get("row_hash") or row_hash(r)  # 按原文计算，须在拆出 raw_json 之前
+        out.append(p)
+    return out
+
+
+# kind -> (语句, 行预处理)
+KINDS = {
+    "rankings": (RANKING_UPSERT_SQL, _prepare_rankings),
+    "app_ratings": (RATING_UPSERT_SQL, _prepare_app_ratings),
+}
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    """估算单行在 INSERT 语句中的字节数（字符串按 UTF-8 上限估计，其它按 16 字节）。"""
+    n = 8
+    for v in row.values():
+        if isinstance(v, str):
+            n += (len(v) if v.isascii() else len(v) * 3) + 3
+        else:
+            n += 16
+    return n
+
+
+def chunk_by_bytes(rows: Sequence[Dict[str, Any]], max_bytes: int = MAX_BATCH_BYTES) -> Iterator[List[Dict[str, Any]]]:
+    """按估算字节数把行切块；单行超限时独立成块。"""
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for r in rows:
+        b = _row_bytes(r)
+        if chunk and size + b > max_bytes:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(r)
+        size += b
+    if chunk:
+        yield chunk
+
+
+def _plan(kind: str, rows: Sequence[Dict[str, Any]], max_bytes: Optional[int]):
+    if kind not in KINDS:
+        raise ValueError(f"unknown write kind: {kind}")
+    stmt, prepare = KINDS[kind]
+    return stmt, chunk_by_bytes(prepare(rows), max_bytes or MAX_BATCH_BYTES)
+
+
+def upsert_sync(kind: str, rows: Sequence[Dict[str, Any]], db: Optional[Session] = None,
+                max_bytes: Optional[int] = None, new_rows: Optional[Sequence[Dict[str, Any]]] = None) -> int:
+    """
+    同步多行 upsert（幂等）；db 为 None 时从连接池取一个会话，整个调用共用。
+    new_rows 为库内尚不存在的行（调用方已探测过时传入，否则写入前按唯一键探测），用于新鲜度登记的 row_count。
+    :return: 提交的行数
+    """
+    if not rows:
+        return 0
+    stmt, chunks = _plan(kind, rows, max_bytes)
+    own = db is None
+    db = SessionLocal() if own else db
+    total = 0
+    try:
+        if new_rows is None:
+            new_rows = freshness_service.new_rows_sync(db, kind, rows)
+        for chunk in chunks:
+            chunk, payloads = raw_payload_service.extract(chunk)
+            if payloads:
+                db.execute(raw_payload_service.INSERT_SQL, payloads)
+            db.execute(stmt, chunk)
+            data_version_service.bump_sync(db, chunk)
+            db.commit()
+            total += len(chunk)
+        freshness_service.apply_sync(db, kind, rows, new_rows)
+        if kind == "rankings":
+            rollup_service.refresh_sync(db, rows)
+            data_version_service.bump_sync(db, rows)
+        db.commit()
+        return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own:
+            db.close()
+
+
+async def upsert_async(kind: str, rows: Sequence[Dict[str, Any]], session: Optional[AsyncSession] = None,
+                       max_bytes: Optional[int] = None) -> int:
+    """异步多行 upsert（幂等），供 FastAPI 进程内的入库任务使用；语义同 upsert_sync。"""
+    if not rows:
+        return 0
+    stmt, chunks = _plan(kind, rows, max_bytes)
+    if session is None:
+        async with async_session() as s:
+            return await _upsert_async(s, kind, rows, stmt, chunks)
+    return await _upsert_async(session, kind, rows, stmt, chunks)
+
+
+async def _upsert_async(session: AsyncSession, kind: str, rows, stmt, chunks) -> int:
+    total = 0
+    try:
+        new_rows = await freshness_service.new_rows_async(session, kind, rows)
+        for chunk in chunks:
+            chunk, payloads = raw_payload_service.extract(chunk)
+            if payloads:
+                await session.execute(raw_payload_service.INSERT_SQL, payloads)
+            await session.execute(stmt, chunk)
+            await data_version_service.bump_async(session, chunk)
+            await session.commit()
+            total += len(chunk)
+        await freshness_service.apply_async(session, kind, rows, new_rows)
+        if kind == "rankings":
+            await rollup_service.refresh_async(session, rows)
+            await data_version_service.bump_async(session, rows)
+        await session.commit()
+        return total
+    except Exception:
+        await session.rollback()
+        raise
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发抓取引擎（供 rank_crawl.py 使用）
+- 以 asyncio 调度多条“翻页链路”：同一 (date, brand, genre, country, device) 内按页顺序抓取，
+  遇到非 10000 / 空页即停止；不同链路之间并发执行。
+- 在途请求数由 concurrency 控制；全局速率预算由 RateLimiter（令牌桶，线程安全）控制，
+  每一次 HTTP 尝试（含重试）都会先取令牌，并通过 record() 回报结果（自适应调速见 rate_control.py）。
+- 实际 HTTP 仍复用 rank_crawl 中基于 requests.Session 的 fetch_* 函数（放入线程池执行），
+  页面处理（normalize → upsert）同样在线程池中执行，不阻塞事件循环。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# 七麦 brand_id ↔ 榜单名（rank_crawl / raw_archive / mock_qimai 共用）
+BRAND_MAP = {0: "paid", 1: "free", 2: "grossing"}
+BRAND_NAME_TO_ID = {v: k for k, v in BRAND_MAP.items()}
+
+
+@dataclass(frozen=True)
+class PageChain:
+    """一条需要顺序翻页的抓取链路。"""
+    api: str            # index / indexPlus
+    date_str: str       # YYYY-MM-DD
+    brand: str          # free / paid / grossing
+    brand_id: int       # 0付费 / 1免费 / 2畅销
+    genre: int
+    country: str
+    device: str
+    pages: Tuple[int, ...]
+
+
+class RateLimiter:
+    """线程安全的令牌桶：rate 为每秒请求数，rate<=0 表示不限速。"""
+
+    adaptive = False  # True 时由限速器自身处理退避，调用方不再额外 sleep
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate or 0)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """非阻塞取令牌：有则扣除并返回 True，否则返回 False。"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def record(self, outcome: str) -> None:
+        """请求结果回报（ok / 429 / timeout / code / error）；固定速率下忽略，自适应控制器据此调速。"""
+        return None
+
+
+# fetch_fn(chain, page) -> 原始响应字典
+FetchFn = Callable[[PageChain, int], Dict[str, Any]]
+# handle_fn(chain, page, data) -> 是否继续翻下一页
+HandleFn = Callable[[PageChain, int, Dict[str, Any]], bool]
+# on_chain_done(chain, ok, error) -> None；链路结束（含异常）时在事件循环线程回调
+DoneFn = Callable[[PageChain, bool, str], None]
+
+
+async def _run_chain(chain: PageChain, fetch_fn: FetchFn, handle_fn: HandleFn,
+                     pool: ThreadPoolExecutor, sleep: float) -> None:
+    loop = asyncio.get_running_loop()
+    for page in chain.pages:
+        data = await loop.run_in_executor(pool, fetch_fn, chain, page)
+        go_on = await loop.run_in_executor(pool, handle_fn, chain, page, data)
+        if not go_on:
+            break
+        if sleep > 0:
+            await asyncio.sleep(sleep)
+
+
+async def run_chains(chains: Iterable[PageChain], fetch_fn: FetchFn, handle_fn: HandleFn,
+                     concurrency: int = 4, sleep: float = 0.0,
+                     on_chain_done: Optional[DoneFn] = None) -> None:
+    """并发执行全部链路；concurrency 同时也是线程池大小（即最大在途请求数）。"""
+    concurrency = max(1, int(concurrency))
+    queue: asyncio.Queue = asyncio.Queue()
+    for c in chains:
+        queue.put_nowait(c)
+
+    async def worker(pool: ThreadPoolExecutor):
+        while True:
+            try:
+                chain = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            ok, err = True, ""
+            try:
+                await _run_chain(chain, fetch_fn, handle_fn, pool, sleep)
+            except Exception as e:
+                ok, err = False, str(e)
+                logging.warning(f"链路失败 (date={chain.date_str}, brand={chain.brand}, genre={chain.genre}): {e}")
+            finally:
+                queue.task_done()
+            if on_chain_done is not None:
+                try:
+                    on_chain_done(chain, ok, err)
+                except Exception as e:
+                    logging.warning(f"链路完成回调失败: {e}")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="crawl") as pool:
+        await asyncio.gather(*(worker(pool) for _ in range(concurrency)))
+
+
+def crawl(chains: Iterable[PageChain], fetch_fn: FetchFn, handle_fn: HandleFn,
+          concurrency: int = 4, sleep: float = 0.0, on_chain_done: Optional[DoneFn] = None) -> None:
+    """同步入口：供命令行脚本直接调用。"""
+    asyncio.run(run_chains(chains, fetch_fn, handle_fn, concurrency=concurrency, sleep=sleep,
+                           on_chain_done=on_chain_done))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬虫进程内指标（Prometheus 文本格式，无第三方依赖）
+- 请求：qimai_request_seconds 直方图（按 api），qimai_requests_total{api,brand,genre,outcome}
+  outcome = ok / 429 / timeout / code(非 10000) / error
+- 吞吐：crawl_pages_total / crawl_items_total{brand,genre}；pages/s、items/s 由 rate() 或周期摘要给出
+- 写库：crawl_db_flush_seconds 直方图（按 kind），crawl_db_rows_total{kind,result}
+- 队列深度等瞬时值：register_gauge(name, fn) 注册取值函数，导出时调用
+- 导出：serve(port) 提供 /metrics；start_dump(path, interval) 周期写文件并输出一行摘要日志，dump_file 收尾时写一次
+"""
+
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+FLUSH_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**kw) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += v
+        self.count += 1
+
+
+class CrawlMetrics:
+    """线程安全的简易指标注册表（计数器 / 直方图 / 取值型 gauge）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._hist_buckets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+        self.started = time.time()
+
+    # ---------- 基础 ----------
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, help: str = "", **labels) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            self._hist_buckets.setdefault(name, tuple(buckets))
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(self._hist_buckets[name])
+            h.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def register_gauge(self, name: str, fn: Callable[[], float], help: str = "") -> None:
+        with self._lock:
+            self._gauges[name] = fn
+            if help:
+                self._help[name] = help
+
+    def total(self, name: str) -> float:
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def total_by(self, name: str, label: str, value: str) -> float:
+        """按单个标签值过滤后的计数器合计。"""
+        with self._lock:
+            return sum(v for lk, v in self._counters.get(name, {}).items() if (label, value) in lk)
+
+    # ---------- 业务埋点 ----------
+    def observe_request(self, api: str, brand: str, genre, seconds: float, outcome: str) -> None:
+        self.observe("qimai_request_seconds", seconds, help="七麦接口单次请求耗时（秒）", api=api)
+        self.inc("qimai_requests_total", help="七麦接口请求次数（按结果）",
+                 api=api, brand=brand, genre=genre, outcome=outcome)
+
+    def record_page(self, brand: str, genre, items: int = 0, pages: int = 0) -> None:
+        if pages:
+            self.inc("crawl_pages_total", pages, help="已处理页数", brand=brand, genre=genre)
+        if items:
+            self.inc("crawl_items_total", items, help="已入库（或提交写入）的条目数", brand=brand, genre=genre)
+
+    def observe_flush(self, kind: str, rows: int, seconds: float, ok: bool) -> None:
+        self.observe("crawl_db_flush_seconds", seconds, buckets=FLUSH_BUCKETS,
+                     help="批量写库单次往返耗时（秒）", kind=kind)
+        self.inc("crawl_db_rows_total", rows, help="写库行数（ok / spooled）",
+                 kind=kind, result="ok" if ok else "spooled")
+
+    # ---------- 导出 ----------
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = {k: dict(v) for k, v in self._counters.items()}
+            hists = {k: {lk: (list(h.counts), h.sum, h.count, h.buckets) for lk, h in v.items()}
+                     for k, v in self._hists.items()}
+            gauges = dict(self._gauges)
+            helps = dict(self._help)
+        for name in sorted(counters):
+            lines.append(f"# HELP {name} {helps.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for lk, v in sorted(counters[name].items()):
+                lines.append(f"{name}{_fmt_labels(lk)} {v:g}")
+        for name in sorted(hists):
+            lines.append(f"# HELP {name} {helps.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for lk, (counts, total, n, buckets) in sorted(hists[name].items()):
+                acc = 0
+                for b, c in zip(buckets, counts):
+                    acc += c
+                    lines.append(f"{name}_bucket{_fmt_labels(lk, ('le', f'{b:g}'))} {acc}")
+                lines.append(f"{name}_bucket{_fmt_labels(lk, ('le', '+Inf'))} {n}")
+                lines.append(f"{name}_sum{_fmt_labels(lk)} {total:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(lk)} {n}")
+        for name in sorted(gauges):
+            try:
+                v = float(gauges[name]())
+            except Exception as e:
+                logging.debug(f"gauge {name} 取值失败: {e}")
+                continue
+            lines.append(f"# HELP {name} {helps.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {v:g}")
+        lines.append("# TYPE crawl_uptime_seconds gauge")
+        lines.append(f"crawl_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = max(1e-6, time.time() - self.started)
+        pages = self.total("crawl_pages_total")
+        items = self.total("crawl_items_total")
+        return {"elapsed": elapsed, "pages": pages, "items": items,
+                "pages_per_s": pages / elapsed, "items_per_s": items / elapsed}
+
+
+# 进程级单例（与 rank_crawl.SESSION 同样的用法）
+METRICS = CrawlMetrics()
+
+
+def serve(port: int, metrics: CrawlMetrics = METRICS, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """后台线程提供 GET /metrics。"""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            return
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"指标已暴露：http://{host}:{port}/metrics")
+    return server
+
+
+def dump_file(path: Optional[str], metrics: CrawlMetrics = METRICS) -> None:
+    """把指标写入文件（原子替换，可配 node_exporter textfile collector）。"""
+    if not path:
+        return
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            fp.write(metrics.render())
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"写入指标文件失败: {e}")
+
+
+def start_dump(path: Optional[str], interval: float = 15.0, metrics: CrawlMetrics = METRICS) -> threading.Event:
+    """周期写指标文件并输出一行吞吐摘要；返回用于停止的 Event。"""
+    stop = threading.Event()
+
+    def _loop():
+        last_pages, last_items, last_t = 0.0, 0.0, time.time()
+        while not stop.wait(interval):
+            now = time.time()
+            pages, items = metrics.total("crawl_pages_total"), metrics.total("crawl_items_total")
+            dt = max(1e-6, now - last_t)
+            logging.info(f"[metrics] {(pages - last_pages) / dt:.2f} 页/秒，{(items - last_items) / dt:.1f} 条/秒"
+                         f"（累计 {pages:.0f} 页 / {items:.0f} 条）")
+            last_pages, last_items, last_t = pages, items, now
+            dump_file(path, metrics)
+
+    threading.Thread(target=_loop, name="metrics-dump", daemon=True).start()
+    return stop
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+断点续抓：本地检查点账本 + 缺口规划器（供 rank_crawl.py --resume 使用）
+- CheckpointLedger：SQLite 文件，记录每个 (chart_date, api, brand, genre, country, device, page)
+  成功返回(code=10000)时的条目数；items=0 表示该链路已到末页。
+- plan_chains：结合数据库已入库行数与账本，只保留缺失页 / 不足 20 条的短页。
+  重跑一整年的回填时，只会重新请求缺口。
+- page_hashes：每页内容指纹（整页 hash + 每行 hash），重抓到完全相同的页时跳过写库，
+  有变化时只写变化的行（见 fingerprint / changed_keys）。
+- crawl_days：整天完成标记（--follow 模式抓到短页即视为当天榜单完整），规划时直接跳过。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.util.crawl_engine import PageChain
+
+PAGE_SIZE = 20  # 七麦每页固定 20 条
+
+# (page_hash, {row_key: row_hash})
+Fingerprint = Tuple[str, Dict[str, str]]
+
+_LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS crawl_pages (
+  chart_date TEXT NOT NULL,
+  api        TEXT NOT NULL,
+  brand      TEXT NOT NULL,
+  genre      INTEGER NOT NULL,
+  country    TEXT NOT NULL,
+  device     TEXT NOT NULL,
+  page       INTEGER NOT NULL,
+  items      INTEGER NOT NULL,
+  fetched_at REAL NOT NULL,
+  PRIMARY KEY (chart_date, api, brand, genre, country, device, page)
+);
+CREATE TABLE IF NOT EXISTS page_hashes (
+  chart_date TEXT NOT NULL,
+  api        TEXT NOT NULL,
+  brand      TEXT NOT NULL,
+  genre      INTEGER NOT NULL,
+  country    TEXT NOT NULL,
+  device     TEXT NOT NULL,
+  page       INTEGER NOT NULL,
+  page_hash  TEXT NOT NULL,
+  row_hashes TEXT NOT NULL,
+  PRIMARY KEY (chart_date, api, brand, genre, country, device, page)
+);
+CREATE TABLE IF NOT EXISTS crawl_days (
+  chart_date   TEXT NOT NULL,
+  api          TEXT NOT NULL,
+  brand        TEXT NOT NULL,
+  genre        INTEGER NOT NULL,
+  country      TEXT NOT NULL,
+  device       TEXT NOT NULL,
+  items        INTEGER NOT NULL,
+  completed_at REAL NOT NULL,
+  PRIMARY KEY (chart_date, api, brand, genre, country, device)
+);
+"""
+
+
+class CheckpointLedger:
+    """已完成页的本地账本（线程安全；单连接 + 锁，写入即提交）。"""
+
+    def __init__(self, path: str):
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_LEDGER_DDL)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def record(self, chain: PageChain, page: int, items: int, fp: Optional[Fingerprint] = None) -> None:
+        """记录成功页；fp 为该页内容指纹（数据已写库/落盘后才记录，保证“指纹相同 ⇒ 库内已是该内容”）。"""
+        key = (chain.date_str, chain.api, chain.brand, chain.genre, chain.country, chain.device, page)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawl_pages VALUES (?,?,?,?,?,?,?,?,?)",
+                key + (int(items), time.time()),
+            )
+            if fp is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO page_hashes VALUES (?,?,?,?,?,?,?,?,?)",
+                    key + (fp[0], json.dumps(fp[1], separators=(",", ":"))),
+                )
+            self._conn.commit()
+
+    def fingerprint(self, chain: PageChain, page: int) -> Optional[Fingerprint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_hash, row_hashes FROM page_hashes WHERE chart_date = ? AND api = ? AND brand = ? "
+                "AND genre = ? AND country = ? AND device = ? AND page = ?",
+                (chain.date_str, chain.api, chain.brand, chain.genre, chain.country, chain.device, page),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def pages(self, start: str, end: str) -> Dict[Tuple, Dict[int, int]]:
+        """返回 {(date, api, brand, genre, country, device): {page: items}}。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chart_date, api, brand, genre, country, device, page, items "
+                "FROM crawl_pages WHERE chart_date BETWEEN ? AND ?",
+                (start, end),
+            ).fetchall()
+        out: Dict[Tuple, Dict[int, int]] = {}
+        for d, api, brand, genre, country, device, page, items in rows:
+            out.setdefault((d, api, brand, int(genre), country, device), {})[int(page)] = int(items)
+        return out
+
+    def mark_day_complete(self, chain: PageChain, items: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawl_days VALUES (?,?,?,?,?,?,?,?)",
+                (chain.date_str, chain.api, chain.brand, chain.genre, chain.country, chain.device,
+                 int(items), time.time()),
+            )
+            self._conn.commit()
+
+    def completed_days(self, start: str, end: str) -> Set[Tuple]:
+        """返回已完成的 {(date, api, brand, genre, country, device)}。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chart_date, api, brand, genre, country, device "
+                "FROM crawl_days WHERE chart_date BETWEEN ? AND ?",
+                (start, end),
+            ).fetchall()
+        return {(d, api, brand, int(genre), country, device) for d, api, brand, genre, country, device in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def fingerprint(keys: List[str], item_jsons: List[str]) -> Fingerprint:
+    """按每条已序列化的 JSON 计算行 hash，整页 hash 由行 hash 顺序拼接得到（顺序变化也算变化）。"""
+    rows: Dict[str, str] = {}
+    page = hashlib.blake2b(digest_size=16)
+    for k, j in zip(keys, item_jsons):
+        h = hashlib.blake2b(j.encode("utf-8"), digest_size=8).hexdigest()
+        rows[k] = h
+        page.update(k.encode("utf-8"))
+        page.update(h.encode("ascii"))
+    return page.hexdigest(), rows
+
+
+def changed_keys(prev: Optional[Fingerprint], cur: Fingerprint) -> Optional[Set[str]]:
+    """返回需要写库的行 key；None 表示没有历史指纹（整页写入）。"""
+    if prev is None:
+        return None
+    if prev[0] == cur[0]:
+        return set()
+    old = prev[1]
+    return {k for k, h in cur[1].items() if old.get(k) != h}
+
+
+def chain_key(c: PageChain) -> Tuple:
+    return (c.date_str, c.api, c.brand, c.genre, c.country, c.device)
+
+
+def missing_pages(pages: Iterable[int], done: Dict[int, int]) -> Tuple[int, ...]:
+    """
+    单条链路的待抓页：
+      - 账本中无记录 → 缺失，需要抓；
+      - 条目数 < PAGE_SIZE → 短页（可能被截断），重抓；
+      - 条目数 == 0 → 已到末页，其后的页都不需要。
+    """
+    todo: List[int] = []
+    for p in pages:
+        items = done.get(p)
+        if items == 0:
+            break
+        if items is None or items < PAGE_SIZE:
+            # 短页之后紧跟一条空页记录，说明榜单本来就只有这么多，不再重抓
+            if items is not None and done.get(p + 1) == 0:
+                break
+            todo.append(p)
+    return tuple(todo)
+
+
+def load_db_counts(chains: List[PageChain]) -> Dict[Tuple, int]:
+    """按链路涉及的日期/榜单，从 MySQL 查询已入库行数。key 与 _db_key 对应。"""
+    from app.services import ranking_service
+    try:
+        from app.services import rating_service
+    except Exception:
+        rating_service = None
+
+    counts: Dict[Tuple, int] = {}
+    groups: Dict[Tuple, List[PageChain]] = {}
+    for c in chains:
+        groups.setdefault((c.api, c.genre, c.country, c.device), []).append(c)
+
+    for (api, genre, country, device), cs in groups.items():
+        start = min(c.date_str for c in cs)
+        end = max(c.date_str for c in cs)
+        try:
+            if api == "index" and rating_service is not None:
+                got = rating_service.day_counts(
+                    datetime.strptime(start, "%Y-%m-%d").date(),
+                    datetime.strptime(end, "%Y-%m-%d").date(),
+                    sorted({c.brand for c in cs}), country=country, device=device,
+                )
+                for (d, brand), n in got.items():
+                    counts[(api, d, brand, genre, country, device)] = n
+            else:
+                got = ranking_service.day_counts(
+                    start, end, sorted({c.brand_id for c in cs}), genre, country=country, device=device,
+                )
+                brand_by_id = {c.brand_id: c.brand for c in cs}
+                for (d, brand_id), n in got.items():
+                    counts[(api, d, brand_by_id.get(brand_id, str(brand_id)), genre, country, device)] = n
+        except Exception as e:
+            logging.warning(f"查询已入库行数失败，仅按账本规划: {e}")
+    return counts
+
+
+def _db_key(c: PageChain) -> Tuple:
+    return (c.api, c.date_str, c.brand, c.genre, c.country, c.device)
+
+
+def plan_chains(chains: List[PageChain], ledger: CheckpointLedger,
+                db_counts: Optional[Dict[Tuple, int]] = None,
+                max_pages: int = 5) -> List[PageChain]:
+    """过滤掉已完整的链路，并把每条链路收缩到缺口页。"""
+    if not chains:
+        return []
+    db_counts = db_counts or {}
+    start = min(c.date_str for c in chains)
+    end = max(c.date_str for c in chains)
+    done_map = ledger.pages(start, end)
+    completed = ledger.completed_days(start, end)
+    full_rows = max_pages * PAGE_SIZE
+
+    planned: List[PageChain] = []
+    skipped_db, skipped_ledger, total_pages = 0, 0, 0
+    for c in chains:
+        if db_counts.get(_db_key(c), 0) >= full_rows:
+            skipped_db += 1
+            continue
+        if chain_key(c) in completed:
+            skipped_ledger += 1
+            continue
+        pages = missing_pages(c.pages, done_map.get(chain_key(c), {}))
+        if not pages:
+            skipped_ledger += 1
+            continue
+        total_pages += len(pages)
+        planned.append(replace(c, pages=pages))
+    logging.info(
+        f"续抓规划：{len(chains)} 条链路 → 待抓 {len(planned)} 条 / {total_pages} 页"
+        f"（库内已满 {skipped_db}，账本已完成 {skipped_ledger}）"
+    )
+    return planned
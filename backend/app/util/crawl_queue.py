@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程共享的抓取任务队列（SQLite，带租约）
+- enqueue：把 genre × country × device × brand × date 展开后的翻页链路写入队列（重复入队忽略）。
+- lease：worker 原子地领取一批 pending 或租约已过期的任务，并写入自己的 worker_id 与到期时间；
+  多个 rank_crawl.py 进程指向同一个队列文件即可分摊工作、互不重复。
+- complete / fail：完成或失败回写；失败次数达到 max_attempts 后标记为 failed，不再派发。
+- progress：按 (api, genre, country, device, brand) 分区汇总各状态任务数，用于查看进度。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from app.util.crawl_engine import PageChain
+
+_QUEUE_DDL = """
+CREATE TABLE IF NOT EXISTS crawl_tasks (
+  task_id     TEXT PRIMARY KEY,
+  api         TEXT NOT NULL,
+  chart_date  TEXT NOT NULL,
+  brand       TEXT NOT NULL,
+  brand_id    INTEGER NOT NULL,
+  genre       INTEGER NOT NULL,
+  country     TEXT NOT NULL,
+  device      TEXT NOT NULL,
+  pages       TEXT NOT NULL,
+  status      TEXT NOT NULL DEFAULT 'pending',
+  worker      TEXT,
+  lease_until REAL,
+  attempts    INTEGER NOT NULL DEFAULT 0,
+  last_error  TEXT,
+  updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_crawl_tasks_status ON crawl_tasks (status, lease_until);
+"""
+
+
+def task_id_of(c: PageChain) -> str:
+    return "|".join([c.api, c.date_str, c.brand, str(c.genre), c.country, c.device])
+
+
+class CrawlQueue:
+    """SQLite 任务队列；同一进程内多线程共用一个连接（加锁），跨进程靠 BEGIN IMMEDIATE 串行化。"""
+
+    def __init__(self, path: str, max_attempts: int = 5):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max(1, int(max_attempts))
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_QUEUE_DDL)
+        self._lock = threading.Lock()
+
+    def _tx(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return out
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, chains: Iterable[PageChain]) -> int:
+        now = time.time()
+        rows = [
+            (task_id_of(c), c.api, c.date_str, c.brand, c.brand_id, c.genre, c.country, c.device,
+             json.dumps(list(c.pages)), now)
+            for c in chains
+        ]
+
+        def _do(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO crawl_tasks "
+                "(task_id, api, chart_date, brand, brand_id, genre, country, device, pages, updated_at) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?)",
+                rows,
+            )
+            return conn.total_changes - before
+        return self._tx(_do)
+
+    def lease(self, worker: str, n: int, lease_seconds: float = 300.0) -> List[PageChain]:
+        """领取至多 n 个任务：pending，或 leased 但租约已过期（原 worker 崩溃/卡死）。"""
+        now = time.time()
+
+        def _do(conn):
+            # 租约过期且已用尽重试次数的任务直接判定失败，避免永久停留在 leased
+            conn.execute(
+                "UPDATE crawl_tasks SET status = 'failed', last_error = 'lease expired', updated_at = ? "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT task_id, api, chart_date, brand, brand_id, genre, country, device, pages "
+                "FROM crawl_tasks "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) AND attempts < ? "
+                "ORDER BY chart_date, genre, country, device, brand LIMIT ?",
+                (now, self.max_attempts, int(n)),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE crawl_tasks SET status = 'leased', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                    [(worker, now + lease_seconds, now, r[0]) for r in rows],
+                )
+            return rows
+        rows = self._tx(_do)
+        return [
+            PageChain(api, d, brand, int(brand_id), int(genre), country, device, tuple(json.loads(pages)))
+            for _tid, api, d, brand, brand_id, genre, country, device, pages in rows
+        ]
+
+    def complete(self, worker: str, chain: PageChain) -> None:
+        self._tx(lambda conn: conn.execute(
+            "UPDATE crawl_tasks SET status = 'done', lease_until = NULL, last_error = NULL, updated_at = ? "
+            "WHERE task_id = ? AND worker = ?",
+            (time.time(), task_id_of(chain), worker),
+        ))
+
+    def fail(self, worker: str, chain: PageChain, error: str = "") -> None:
+        """失败：未超过重试上限则退回 pending，否则标记 failed。"""
+        self._tx(lambda conn: conn.execute(
+            "UPDATE crawl_tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_until = NULL, last_error = ?, updated_at = ? WHERE task_id = ? AND worker = ?",
+            (self.max_attempts, (error or "")[:500], time.time(), task_id_of(chain), worker),
+        ))
+
+    def progress(self) -> List[Dict[str, object]]:
+        """按分区汇总：[{api, genre, country, device, brand, pending, leased, done, failed, total}]。"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT api, genre, country, device, brand, "
+                "  CASE WHEN status = 'leased' AND lease_until < ? THEN 'expired' ELSE status END AS st, "
+                "  COUNT(*) "
+                "FROM crawl_tasks GROUP BY api, genre, country, device, brand, st "
+                "ORDER BY api, genre, country, device, brand",
+                (now,),
+            ).fetchall()
+        out: Dict[Tuple, Dict[str, object]] = {}
+        for api, genre, country, device, brand, st, cnt in rows:
+            key = (api, genre, country, device, brand)
+            p = out.setdefault(key, {
+                "api": api, "genre": genre, "country": country, "device": device, "brand": brand,
+                "pending": 0, "leased": 0, "expired": 0, "done": 0, "failed": 0, "total": 0,
+            })
+            p[st] = int(p.get(st, 0)) + int(cnt)
+            p["total"] = int(p["total"]) + int(cnt)
+        return list(out.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def format_progress(items: List[Dict[str, object]]) -> str:
+    head = f"{'api':<10}{'genre':>6} {'country':<8}{'device':<8}{'brand':<10}" \
+           f"{'done':>7}{'pending':>9}{'leased':>8}{'expired':>9}{'failed':>8}{'total':>8}"
+    lines = [head, "-" * len(head)]
+    for p in items:
+        lines.append(
+            f"{p['api']:<10}{p['genre']:>6} {p['country']:<8}{p['device']:<8}{p['brand']:<10}"
+            f"{p['done']:>7}{p['pending']:>9}{p['leased']:>8}{p['expired']:>9}{p['failed']:>8}{p['total']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def default_worker_id() -> str:
+    return f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}-{os.getpid()}"
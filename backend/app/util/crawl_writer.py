@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台批量写库（供 rank_crawl.py 使用）
+- 抓取线程只调用 submit(kind, rows)：记录进入内存队列后立即返回，不再等待 MySQL。
+- 后台线程跨页/跨天攒批，达到 batch_rows 或 flush_interval 即调用对应的 flusher 做一次多行 upsert。
+- 写库失败（MySQL 宕机）或积压超过 max_pending_rows（MySQL 变慢）时，批次落盘到 spool 目录；
+  写库恢复后由后台线程按文件顺序自动回放，回放成功即删除文件。上次运行遗留的 spool 同样会被回放。
+- on_durable 回调在批次“写库成功或已落盘”后触发（用于推进检查点账本）。
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import jsonfast
+
+# 需要在回放时还原为 date 的字段（app_ratings 记录）
+_DATE_FIELDS = ("chart_date", "update_time", "last_release_time")
+
+_BARRIER = "__barrier__"
+
+Flusher = Callable[[List[Dict[str, Any]]], int]
+Callback = Optional[Callable[[], None]]
+# on_flush(kind, rows, seconds, ok)：每次写库往返后回调（用于指标）
+FlushHook = Optional[Callable[[str, int, float, bool], None]]
+
+
+def _restore_dates(rec: Dict[str, Any]) -> Dict[str, Any]:
+    for k in _DATE_FIELDS:
+        v = rec.get(k)
+        if isinstance(v, str) and len(v) == 10:
+            try:
+                rec[k] = datetime.strptime(v, "%Y-%m-%d").date()
+            except ValueError:
+                pass
+    return rec
+
+
+class BatchWriter:
+    """按 kind（如 app_ratings / rankings）分别攒批写库的后台写入器。"""
+
+    def __init__(self, flushers: Dict[str, Flusher], spool_dir: str,
+                 batch_rows: int = 2000, flush_interval: float = 5.0,
+                 max_pending_rows: int = 50000, drain_interval: float = 30.0,
+                 on_flush: FlushHook = None):
+        self.flushers = flushers
+        self.spool_dir = spool_dir
+        self.batch_rows = max(1, int(batch_rows))
+        self.flush_interval = float(flush_interval)
+        self.max_pending_rows = max(self.batch_rows, int(max_pending_rows))
+        self.drain_interval = float(drain_interval)
+        self.on_flush = on_flush
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._q: "queue.Queue[Optional[Tuple[str, List[Dict[str, Any]], Callback]]]" = queue.Queue()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._db_ok = True
+        self._last_drain = 0.0
+
+        # 统计
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.spooled_rows = 0
+        self.drained_rows = 0
+
+    # ---------- 生产者侧 ----------
+    def start(self) -> "BatchWriter":
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, kind: str, rows: List[Dict[str, Any]], on_durable: Callback = None) -> None:
+        if not rows:
+            if on_durable:
+                on_durable()
+            return
+        with self._lock:
+            overloaded = self._pending_rows + len(rows) > self.max_pending_rows
+            if not overloaded:
+                self._pending_rows += len(rows)
+        if overloaded:
+            # MySQL 跟不上：直接落盘，抓取不被阻塞
+            self._spool(kind, rows)
+            if on_durable:
+                on_durable()
+            return
+        self._q.put((kind, rows, on_durable))
+
+    @property
+    def pending_rows(self) -> int:
+        """已提交但尚未写库/落盘的行数（积压深度）。"""
+        with self._lock:
+            return self._pending_rows
+
+    def after_pending(self, cb: Callable[[], None]) -> None:
+        """屏障：在此之前提交的全部数据写库（或落盘）后再回调 cb。"""
+        self._q.put((_BARRIER, [], cb))
+
+    def close(self) -> None:
+        """刷出全部内存数据并尽量回放 spool；之后写入器不可再用。"""
+        if self._thread is None:
+            return
+        self._q.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # ---------- 后台线程 ----------
+    def _run(self) -> None:
+        buffers: Dict[str, List[Dict[str, Any]]] = {}
+        callbacks: Dict[str, List[Callable[[], None]]] = {}
+        last_flush = time.monotonic()
+        self._drain_spool()
+        stop = False
+        while not stop:
+            timeout = max(0.05, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                stop = True
+            elif item and item[0] == _BARRIER:
+                for kind in list(buffers):
+                    self._flush(kind, buffers.pop(kind), callbacks.pop(kind, []))
+                self._call(item[2])
+                continue
+            elif item:
+                kind, rows, cb = item
+                buffers.setdefault(kind, []).extend(rows)
+                if cb:
+                    callbacks.setdefault(kind, []).append(cb)
+
+            due = stop or (time.monotonic() - last_flush) >= self.flush_interval
+            for kind in list(buffers):
+                if buffers[kind] and (due or len(buffers[kind]) >= self.batch_rows):
+                    self._flush(kind, buffers.pop(kind), callbacks.pop(kind, []))
+            if due:
+                last_flush = time.monotonic()
+            if stop or time.monotonic() - self._last_drain >= self.drain_interval:
+                self._drain_spool()
+
+    def _flush(self, kind: str, rows: List[Dict[str, Any]], callbacks: List[Callable[[], None]]) -> None:
+        flusher = self.flushers[kind]
+        done = 0
+        try:
+            if not self._db_ok:
+                # 上一次写库失败且尚未恢复：直接落盘，由回放负责探测恢复
+                raise RuntimeError("database unavailable")
+            while done < len(rows):
+                chunk = rows[done:done + self.batch_rows]
+                t0 = time.perf_counter()
+                flusher(chunk)
+                self._hook(kind, len(chunk), time.perf_counter() - t0, True)
+                done += len(chunk)
+                self.flushed_rows += len(chunk)
+                self.flush_count += 1
+        except Exception as e:
+            logging.warning(f"批量写库失败，{kind} 剩余 {len(rows) - done} 行落盘待回放: {e}")
+            self._db_ok = False
+            self._spool(kind, rows[done:])
+            self._hook(kind, len(rows) - done, 0.0, False)
+        finally:
+            with self._lock:
+                self._pending_rows -= len(rows)
+        for cb in callbacks:
+            self._call(cb)
+
+    def _hook(self, kind: str, rows: int, seconds: float, ok: bool) -> None:
+        if self.on_flush is not None:
+            try:
+                self.on_flush(kind, rows, seconds, ok)
+            except Exception as e:
+                logging.debug(f"on_flush 回调失败: {e}")
+
+    @staticmethod
+    def _call(cb: Callable[[], None]) -> None:
+        try:
+            cb()
+        except Exception as e:
+            logging.warning(f"写入回调失败: {e}")
+
+    # ---------- spool ----------
+    def _spool(self, kind: str, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        name = f"{int(time.time() * 1000):015d}-{os.getpid()}-{seq:06d}.{kind}.jsonl"
+        path = os.path.join(self.spool_dir, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fp:
+            for r in rows:
+                fp.write(jsonfast.dumpb(r) + b"\n")
+        os.replace(tmp, path)
+        self.spooled_rows += len(rows)
+
+    def _drain_spool(self) -> None:
+        self._last_drain = time.monotonic()
+        try:
+            files = sorted(f for f in os.listdir(self.spool_dir) if f.endswith(".jsonl"))
+        except FileNotFoundError:
+            return
+        for fname in files:
+            kind = fname.rsplit(".", 2)[-2]
+            flusher = self.flushers.get(kind)
+            if flusher is None:
+                continue
+            path = os.path.join(self.spool_dir, fname)
+            with open(path, "rb") as fp:
+                rows = [_restore_dates(jsonfast.loads(line)) for line in fp if line.strip()]
+            try:
+                for i in range(0, len(rows), self.batch_rows):
+                    t0 = time.perf_counter()
+                    flusher(rows[i:i + self.batch_rows])
+                    self._hook(kind, len(rows[i:i + self.batch_rows]), time.perf_counter() - t0, True)
+            except Exception as e:
+                logging.warning(f"spool 回放失败，稍后重试 ({fname}): {e}")
+                self._db_ok = False
+                return
+            os.remove(path)
+            self.drained_rows += len(rows)
+            logging.info(f"spool 回放完成：{fname}（{len(rows)} 行）")
+        self._db_ok = True
+
+    def pending_spool_files(self) -> int:
+        try:
+            return sum(1 for f in os.listdir(self.spool_dir) if f.endswith(".jsonl"))
+        except FileNotFoundError:
+            return 0
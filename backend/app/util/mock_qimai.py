@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地七麦榜单模拟服务（压测抓取层用，不访问 api.qimai.cn）
+- 接口：GET /rank/index?brand=&country=&device=&date=&page=&genre=
+        GET /rank/indexPlus/brand_id/{id}?country=&device=&date=&page=&genre=
+- 数据：--archive 指向 raw_archive 归档时按 (日期, 榜单, 分类, 市场, 页) 回放真实响应；
+  缺失或未提供归档时返回确定性的合成数据（同一请求多次返回相同内容）。
+- 故障注入：--latency/--jitter 延迟（毫秒）；--rate-429 随机 429；--limit-rps 超过服务端速率即 429；
+  --truncate-rate 返回不足 20 条的截断页；--bad-code-rate 返回非 10000 的 code；--max-pages 之后返回空页。
+- GET /__stats 返回各类响应计数（JSON）。
+
+用法：
+  python -m app.util.mock_qimai --port 8765 --latency 120 --jitter 60 --limit-rps 5 --rate-429 0.02
+  python -m app.util.rank_crawl --base-url http://127.0.0.1:8765 --no-db --api index \\
+      --start 2025-01-01 --end 2025-01-31 --concurrency 8 --metrics-file /tmp/crawl.prom
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+_HERE = Path(__file__).resolve()
+_BACKEND_DIR = _HERE.parents[2]  # .../hive_app/backend
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from app.core import jsonfast
+from app.util.crawl_engine import BRAND_MAP, RateLimiter
+from app.util.qimai_fixtures import synthetic_item
+from app.util.raw_archive import ArchiveReader
+
+_PLUS_RE = re.compile(r"^/rank/indexPlus/brand_id/(\d+)/?$")
+_BAD_CODES = ((10601, "访问频繁，请稍后再试"), (10002, "参数错误"), (20001, "请登录后查看"))
+
+
+class MockConfig:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 limit_rps: float = 0.0, truncate_rate: float = 0.0, bad_code_rate: float = 0.0,
+                 max_pages: int = 5, seed: int = 7):
+        self.latency = max(0.0, latency) / 1000.0
+        self.jitter = max(0.0, jitter) / 1000.0
+        self.rate_429 = rate_429
+        self.truncate_rate = truncate_rate
+        self.bad_code_rate = bad_code_rate
+        self.max_pages = max_pages
+        self.seed = seed
+        # 服务端令牌桶：非阻塞判断是否超速
+        self.limit_rps = limit_rps
+        self._bucket = RateLimiter(limit_rps, burst=max(1, int(limit_rps))) if limit_rps > 0 else None
+
+    def over_limit(self) -> bool:
+        return self._bucket is not None and not self._bucket.try_acquire()
+
+
+class MockQimai:
+    """请求 → 响应体的纯逻辑部分（HTTP 层见 serve）。"""
+
+    def __init__(self, cfg: MockConfig, archive: Optional[str] = None):
+        self.cfg = cfg
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._rnd = random.Random(cfg.seed)
+        self._locations: Dict[Tuple, Tuple[str, int, int]] = {}
+        if archive:
+            _chains, self._locations = ArchiveReader(archive).plan("0000-00-00", "9999-99-99")
+            logging.info(f"已加载归档索引：{len(self._locations)} 页")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _chance(self, p: float) -> bool:
+        if p <= 0:
+            return False
+        with self._lock:
+            return self._rnd.random() < p
+
+    def _sleep(self) -> None:
+        d = self.cfg.latency
+        if self.cfg.jitter:
+            with self._lock:
+                d += self._rnd.uniform(-self.cfg.jitter, self.cfg.jitter)
+        if d > 0:
+            time.sleep(d)
+
+    def _recorded(self, api: str, q: Dict[str, str], brand: str, page: int) -> Optional[bytes]:
+        key = (q.get("date", ""), api, brand, int(q.get("genre", 0) or 0), q.get("country", "cn"),
+               q.get("device", "iphone"))
+        loc = self._locations.get((key, page))
+        if loc is None:
+            return None
+        return jsonfast.dumpb(ArchiveReader.read(loc))
+
+    def _synthetic(self, api: str, q: Dict[str, str], brand: str, page: int) -> Dict[str, Any]:
+        if page > self.cfg.max_pages:
+            items = []
+        else:
+            seed_src = "|".join([api, q.get("date", ""), brand, q.get("genre", ""), q.get("country", ""),
+                                 q.get("device", ""), str(page), str(self.cfg.seed)])
+            rnd = random.Random(int(hashlib.md5(seed_src.encode("utf-8")).hexdigest()[:12], 16))
+            items = [synthetic_item(api, (page - 1) * 20 + k + 1, rnd) for k in range(20)]
+        return {"code": 10000, "msg": "成功", ("list" if api == "indexPlus" else "rankInfo"): items}
+
+    def respond(self, path: str, query: str) -> Tuple[int, bytes]:
+        """返回 (HTTP 状态码, 响应体)。"""
+        q = {k: v[0] for k, v in parse_qs(query).items()}
+        m = _PLUS_RE.match(path)
+        if m:
+            api, brand = "indexPlus", BRAND_MAP.get(int(m.group(1)), m.group(1))
+        elif path.rstrip("/") == "/rank/index":
+            api, brand = "index", q.get("brand", "free")
+        else:
+            self._count("404")
+            return 404, b'{"code":404,"msg":"not found"}'
+        page = int(q.get("page", 1) or 1)
+
+        self._sleep()
+        if self.cfg.over_limit() or self._chance(self.cfg.rate_429):
+            self._count("429")
+            return 429, b'{"code":429,"msg":"Too Many Requests"}'
+        if self._chance(self.cfg.bad_code_rate):
+            self._count("bad_code")
+            with self._lock:
+                code, msg = self._rnd.choice(_BAD_CODES)
+            return 200, jsonfast.dumpb({"code": code, "msg": msg})
+
+        body = self._recorded(api, q, brand, page) if self._locations else None
+        if body is not None and not self.cfg.truncate_rate:
+            self._count("recorded")
+            return 200, body
+        data = jsonfast.loads(body) if body is not None else self._synthetic(api, q, brand, page)
+        if self._chance(self.cfg.truncate_rate):
+            key = "list" if api == "indexPlus" else "rankInfo"
+            lst = data.get(key) or []
+            if len(lst) > 1:
+                with self._lock:
+                    data[key] = lst[:self._rnd.randint(1, len(lst) - 1)]
+                self._count("truncated")
+        self._count("recorded" if body is not None else "synthetic")
+        return 200, jsonfast.dumpb(data)
+
+
+def serve(mock: MockQimai, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            if u.path == "/__stats":
+                with mock._lock:
+                    status, body = 200, json.dumps(mock.stats).encode("utf-8")
+            else:
+                status, body = mock.respond(u.path, u.query)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            return
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="本地七麦榜单模拟服务")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--archive", type=str, default=None, help="raw_archive 归档目录，优先回放真实响应")
+    parser.add_argument("--latency", type=float, default=0.0, help="平均响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动（±毫秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--limit-rps", type=float, default=0.0, help="服务端速率上限（次/秒），超过即 429；0=不限")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="返回截断页（不足 20 条）的概率")
+    parser.add_argument("--bad-code-rate", type=float, default=0.0, help="返回非 10000 code 的概率")
+    parser.add_argument("--max-pages", type=int, default=5, help="合成数据的页数，之后返回空页")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    cfg = MockConfig(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, limit_rps=args.limit_rps,
+                     truncate_rate=args.truncate_rate, bad_code_rate=args.bad_code_rate,
+                     max_pages=args.max_pages, seed=args.seed)
+    mock = MockQimai(cfg, archive=args.archive)
+    server = serve(mock, args.host, args.port)
+    logging.info(f"Mock Qimai listening on http://{args.host}:{args.port}  (stats: /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(mock.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓取时直接写 ODS 层 Parquet（供 rank_crawl.py --save-parquet 使用）
+- 目录与 etl/dump_orm_to_parquet.py 一致：<root>/pt=YYYY-MM-DD/part-*.parquet，列与 app_ratings 导出列相同，
+  spark_ods_to_dwd.py 可直接读取，无需再从 MySQL 导一遍。
+- 记录按 chart_date 分区缓存，攒满 batch_rows 行（或 close 时）转成一张 Arrow 表写一个文件；
+  先写 .tmp 再改名，Spark 不会读到半个文件。
+- id 列没有自增主键可填，写 NULL；其余类型与 MySQL 导出一致（DATE→date32，DECIMAL(2,1)→decimal128(2,1)）。
+- 依赖 pyarrow（可选依赖，只在启用本功能时导入）。
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List
+
+# (列名, 类型名)；顺序与 dump_orm_to_parquet.py 的 SELECT 一致
+COLUMNS = (
+    ("id", "int64"), ("app_id", "string"), ("app_name", "string"), ("publisher", "string"),
+    ("country", "string"), ("brand", "string"), ("device", "string"),
+    ("chart_date", "date"), ("last_release_time", "date"), ("update_time", "date"),
+    ("index", "int64"), ("genre", "string"), ("keyword_cover", "int64"), ("keyword_cover_top3", "int64"),
+    ("rank_a", "string"), ("rank_b", "string"), ("rank_c", "string"),
+    ("rating", "decimal"), ("rating_num", "string"), ("is_ad", "int64"), ("icon_url", "string"),
+    ("raw_json", "string"),
+)
+
+_RATING_Q = Decimal("0.1")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("--save-parquet 需要 pyarrow：pip install pyarrow") from e
+    return pa, pq
+
+
+def arrow_schema(pa):
+    types = {"int64": pa.int64(), "string": pa.string(), "date": pa.date32(), "decimal": pa.decimal128(2, 1)}
+    return pa.schema([(name, types[t]) for name, t in COLUMNS])
+
+
+def _to_int(v):
+    if v is None or v == "":
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_rating(v):
+    if v is None or v == "":
+        return None
+    try:
+        d = Decimal(str(v)).quantize(_RATING_Q)
+    except (InvalidOperation, ValueError):
+        return None
+    return d if abs(d) < 10 else None
+
+
+def _to_str(v):
+    return None if v is None else str(v)
+
+
+_CONVERT = {"int64": _to_int, "string": _to_str, "decimal": _to_rating,
+            "date": lambda v: v if isinstance(v, date) else None}
+
+
+class ParquetSink:
+    """线程安全的分区缓冲：add(records) 由抓取线程调用，写文件在调用线程内完成。"""
+
+    def __init__(self, root: str, batch_rows: int = 20000, compression: str = "snappy"):
+        self.pa, self.pq = _import_pyarrow()
+        self.schema = arrow_schema(self.pa)
+        self.root = root
+        self.batch_rows = max(1, int(batch_rows))
+        self.compression = compression
+        self._buf: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._prefix = f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.files = 0
+        self.rows = 0
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, records: List[Dict[str, Any]]) -> None:
+        ready = []
+        with self._lock:
+            for rec in records:
+                d = rec.get("chart_date")
+                if not isinstance(d, date):
+                    continue
+                pt = d.strftime("%Y-%m-%d")
+                buf = self._buf.setdefault(pt, [])
+                buf.append(rec)
+                if len(buf) >= self.batch_rows:
+                    ready.append((pt, buf))
+                    self._buf[pt] = []
+        for pt, rows in ready:
+            self._write(pt, rows)
+
+    def _table(self, rows: List[Dict[str, Any]]):
+        arrays = []
+        for name, t in COLUMNS:
+            conv = _CONVERT[t]
+            arrays.append(self.pa.array([conv(r.get(name)) for r in rows], type=self.schema.field(name).type))
+        return self.pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _write(self, pt: str, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        out_dir = os.path.join(self.root, f"pt={pt}")
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{self._prefix}-{seq:05d}.parquet")
+        # 以 . 开头的临时文件会被 Spark/Hive 忽略
+        tmp = os.path.join(out_dir, f".{os.path.basename(path)}.tmp")
+        try:
+            self.pq.write_table(self._table(rows), tmp, compression=self.compression)
+            os.replace(tmp, path)
+        except Exception as e:
+            logging.error(f"写入 Parquet 失败（{pt}，{len(rows)} 行）: {e}")
+            return
+        with self._lock:
+            self.files += 1
+            self.rows += len(rows)
+        logging.debug(f"[parquet] {pt} 写入 {len(rows)} 行 -> {path}")
+
+    def flush(self) -> None:
+        with self._lock:
+            ready = [(pt, rows) for pt, rows in self._buf.items() if rows]
+            self._buf = {}
+        for pt, rows in ready:
+            self._write(pt, rows)
+
+    def close(self) -> None:
+        self.flush()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事实表按月 RANGE 分区与分区生命周期维护
+- 表：appstore_rankings_daily / app_ratings，按 chart_date 分区（app_ratings 的 update_time 与 chart_date 同日，不单独分区）。
+- 分区命名 pYYYYMM（VALUES LESS THAN 下月 1 日），另有兜底分区 pmax（MAXVALUE）。
+- --init：未分区的表改为分区表（主键与自增列键对齐到模型声明：PRIMARY KEY (chart_date, 分片列..., id) +
+  UNIQUE KEY (id, chart_date)，与 migrations m0003 及模型的 CREATE TABLE 相同；MySQL 要求每个唯一键包含分区列），
+  分区从表内最早月份建到当前月 + --ahead。
+- 例行维护（默认）：从 pmax 拆出未来 --ahead 个月的分区（REORGANIZE，pmax 为空时只改元数据）；
+  --retain-months 之外的过期分区 DROP，或 --archive 时先 EXCHANGE 到 <表>_arch_pYYYYMM 归档表再删空分区。
+- --status 打印各分区行数；--dry-run 只打印 SQL。适合每天由 cron 执行一次。
+
+用法：
+  python -m app.util.partition_maint --init --dry-run
+  python -m app.util.partition_maint --ahead 3 --retain-months 24 --archive
+  python -m app.util.partition_maint --status
+"""
+
+import argparse
+import logging
+import re
+import sys
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_HERE = Path(__file__).resolve()
+_BACKEND_DIR = _HERE.parents[2]  # .../hive_app/backend
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from sqlalchemy import text
+
+from app.db.base import SessionLocal
+from app.db.migrations.runner import align_keys_sql
+from app.db.models.ranking import AppStoreRankingDaily
+from app.db.models.rating import AppRatings
+from app.services import freshness_service
+
+TABLES = ("appstore_rankings_daily", "app_ratings")
+TABLE_SOURCES = {"appstore_rankings_daily": "rankings", "app_ratings": "app_ratings"}
+PART_COLUMN = "chart_date"
+# 键布局取自模型（见 migrations.runner.align_keys_sql），--init 后与 create_all 建出的表一致
+TABLE_MODELS = {m.__tablename__: m for m in (AppStoreRankingDaily, AppRatings)}
+_PART_RE = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+def month_add(d: date, n: int) -> date:
+    m = d.year * 12 + d.month - 1 + n
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def part_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def part_def(month: date) -> str:
+    return f"PARTITION {part_name(month)} VALUES LESS THAN ('{month_add(month, 1):%Y-%m-%d}')"
+
+
+def months_between(first: date, last: date) -> List[date]:
+    out, m = [], date(first.year, first.month, 1)
+    while m <= last:
+        out.append(m)
+        m = month_add(m, 1)
+    return out
+
+
+def list_partitions(db, table: str) -> List[Tuple[str, int]]:
+    """[(分区名, 估算行数)]，按序；未分区的表返回空列表。"""
+    rows = db.execute(text(
+        "SELECT partition_name, table_rows FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = :t AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position"), {"t": table}).all()
+    return [(name, int(n or 0)) for name, n in rows]
+
+
+def init_sql(db, table: str, ahead: int, today: date) -> List[str]:
+    """未分区表 → 按月分区表的 DDL（需要一次表重建，建议在低峰执行）。"""
+    first = db.execute(text(f"SELECT MIN({PART_COLUMN}) FROM {table}")).scalar() or today
+    months = months_between(first, month_add(today, ahead))
+    parts = ",\n  ".join([part_def(m) for m in months] + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+    keys = align_keys_sql(db, TABLE_MODELS[table])
+    return ([keys] if keys else []) + [
+        f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS({PART_COLUMN}) (\n  {parts}\n)",
+    ]
+
+
+def extend_sql(table: str, existing: List[str], ahead: int, today: date) -> List[str]:
+    """从 pmax 拆出缺失的未来月份分区。"""
+    have = {n for n in existing if _PART_RE.match(n)}
+    last = max((date(int(m.group(1)), int(m.group(2)), 1) for m in map(_PART_RE.match, have)), default=None)
+    start = month_add(last, 1) if last else date(today.year, today.month, 1)
+    todo = [m for m in months_between(start, month_add(today, ahead)) if part_name(m) not in have]
+    if not todo or "pmax" not in existing:
+        return []
+    parts = ",\n  ".join([part_def(m) for m in todo] + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+    return [f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (\n  {parts}\n)"]
+
+
+def expire_sql(table: str, existing: List[str], retain_months: int, today: date,
+               archive: bool) -> List[str]:
+    """超出保留期（分区上界 <= 本月 - retain_months）的分区：归档后删除，或直接删除。"""
+    cutoff = month_add(date(today.year, today.month, 1), -retain_months)
+    sqls: List[str] = []
+    for name in existing:
+        m = _PART_RE.match(name)
+        if not m:
+            continue
+        month = date(int(m.group(1)), int(m.group(2)), 1)
+        if month_add(month, 1) > cutoff:
+            continue
+        if archive:
+            arch = f"{table}_arch_{name}"
+            sqls += [
+                f"CREATE TABLE {arch} LIKE {table}",
+                f"ALTER TABLE {arch} REMOVE PARTITIONING",
+                f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {arch}",
+            ]
+        sqls.append(f"ALTER TABLE {table} DROP PARTITION {name}")
+    return sqls
+
+
+def maintain(table: str, ahead: int = 3, retain_months: Optional[int] = None, archive: bool = False,
+             init: bool = False, dry_run: bool = False, today: Optional[date] = None) -> List[str]:
+    today = today or date.today()
+    with SessionLocal() as db:
+        existing = [n for n, _ in list_partitions(db, table)]
+        if not existing:
+            if not init:
+                logging.warning(f"[{table}] 尚未分区，先执行 --init")
+                return []
+            sqls = init_sql(db, table, ahead, today)
+        else:
+            sqls = extend_sql(table, existing, ahead, today)
+            if retain_months:
+                sqls += expire_sql(table, existing, retain_months, today, archive)
+        for sql in sqls:
+            logging.info(f"[{table}] {sql}")
+            if not dry_run:
+                db.execute(text(sql))
+        if not dry_run:
+            db.commit()
+            if retain_months:
+                # 过期分区删除后最早日期/行数变化，重算新鲜度登记
+                freshness_service.rebuild_sync(db, TABLE_SOURCES[table])
+                db.commit()
+    return sqls
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="事实表按月分区维护")
+    parser.add_argument("--tables", nargs="+", default=list(TABLES), choices=TABLES)
+    parser.add_argument("--init", action="store_true", help="未分区的表改为按月分区（表重建）")
+    parser.add_argument("--ahead", type=int, default=3, help="预建未来月份分区数")
+    parser.add_argument("--retain-months", type=int, default=None, help="保留最近 N 个月，更早的分区删除/归档")
+    parser.add_argument("--archive", action="store_true", help="过期分区先 EXCHANGE 到归档表再删除")
+    parser.add_argument("--status", action="store_true", help="只打印分区状态")
+    parser.add_argument("--dry-run", action="store_true", help="只打印 SQL，不执行")
+    args = parser.parse_args()
+
+    for table in args.tables:
+        if args.status:
+            with SessionLocal() as db:
+                parts = list_partitions(db, table)
+            print(f"{table}: " + (", ".join(f"{n}({c})" for n, c in parts) if parts else "not partitioned"))
+            continue
+        sqls = maintain(table, ahead=args.ahead, retain_months=args.retain_months, archive=args.archive,
+                        init=args.init, dry_run=args.dry_run)
+        print(f"{table}: {len(sqls)} statement(s){' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
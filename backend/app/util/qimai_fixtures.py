@@ -0,0 +1,33 @@
+# app/util/qimai_fixtures.py
+"""
+合成七麦响应条目（ingest_bench 的合成页与 mock_qimai 的模拟服务共用，保证两边数据形状一致）。
+- index     → rankInfo 条目（rank_a/b/c、comment、keywordCover 等）
+- indexPlus → list 条目（appInfo、class、appGenre 等）
+"""
+
+import random
+from typing import Any, Dict
+
+
+def synthetic_item(api: str, idx: int, rnd: random.Random) -> Dict[str, Any]:
+    app_id = 1000000000 + rnd.randint(0, 5000)
+    app = {
+        "appId": app_id, "appName": f"App {app_id}", "publisher": f"Publisher {app_id % 300}",
+        "icon": f"https://is1-ssl.mzstatic.com/image/thumb/{app_id}/100x100bb.jpg", "country": "cn",
+    }
+    if api == "indexPlus":
+        app.update({"subtitle": "subtitle " * 3, "price": "0.00", "file_size": rnd.randint(10**7, 10**9),
+                    "continuousFirstDays": rnd.randint(0, 30)})
+        return {"index": idx, "change": rnd.randint(-50, 50), "is_ad": False, "appInfo": app,
+                "class": {"ranking": str(rnd.randint(1, 1500)), "genre": "游戏"},
+                "appGenre": "游戏", "publisher_id": app_id % 300}
+
+    def rank(genre):
+        return {"ranking": rnd.randint(1, 1500), "genre": genre, "change": rnd.randint(-50, 50)}
+    return {
+        "index": idx, "app_id": app_id, "appInfo": app, "is_ad": rnd.random() < 0.05,
+        "rank_a": rank("总榜"), "rank_b": rank("游戏"), "rank_c": rank("角色扮演"),
+        "comment": {"rating": round(rnd.uniform(3, 5), 1), "num": str(rnd.randint(10, 10**6))},
+        "keywordCover": str(rnd.randint(0, 5000)), "keywordCoverTop3": str(rnd.randint(0, 500)),
+        "lastReleaseTime": "2025-01-01",
+    }
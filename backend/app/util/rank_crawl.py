@@ -6,20 +6,53 @@ Qimai Top Charts Crawler (CN/iPhone)
 - 每天最多抓取 5 页（Top 200；20 条/页）
 - 必传单一分类：--genre（默认 36）
 - 内置重试&限速；可选是否保存原始响应/扁平JSONL
-- 直接调用 ranking_service.upsert_page() 批量写入 MySQL（幂等）
+- 常驻跟随：--follow 检测每个榜单/分类/市场的新 chart_date，只抓当天、遇短页即停并在账本标记完成
+- 列式输出：--save-parquet 把 normalize 后的 app_ratings 记录按天写入 ods_app_ratings/pt=YYYY-MM-DD/*.parquet（见 parquet_sink.py）
+- 原始响应归档：--save-raw 写入按天分段的 gzip + 索引（见 raw_archive.py）；--replay 从归档离线重放入库
+- 并发抓取：--concurrency 控制在途请求数，--rate 控制全局请求速率（见 crawl_engine.py）
+- 内容去重：每页记录内容指纹，重抓到相同页跳过写库，有变化只写变化的行并统计变化行数（--no-dedup 关闭）
+- 离线压测：--base-url 指向本地 mock_qimai.py（可注入延迟/429/截断页/非 10000），配合 --no-db 只测抓取层
+- 指标：请求耗时直方图、页/条吞吐、按 brand/genre 的 429/超时/非 10000 计数、写库耗时、队列深度，
+  --metrics-port 暴露 Prometheus /metrics，--metrics-file 周期写文件（见 crawl_metrics.py）
+- 自适应调速：健康时加性提速，遇 429/超时/非 10000 乘性降速，定期输出速率与错误率（见 rate_control.py）
+- 断点续抓：成功页写入 <out>/ledger.sqlite3；--resume 时只抓缺失/短页（见 crawl_planner.py）
+- 后台批量写库：跨页攒批多行 upsert，MySQL 慢/不可用时落盘 <out>/spool 并自动回放（见 crawl_writer.py）
+- 回填装载：--bulk-load 把批次写成 TSV，LOAD DATA LOCAL INFILE 进临时表后一条语句合并入正式表（见 bulk_load_service.py）
+- 多进程分摊：--queue 指向共享 SQLite 任务队列，--enqueue 展开任务矩阵，worker 按租约领取（见 crawl_queue.py）
+- 调用 rating_service.upsert_app_ratings() / ranking_service.upsert_rows() 批量写入 MySQL（幂等）；
+  app_ratings 按行指纹 row_hash 只重写内容变化的行，指标 app_ratings_upsert_rows_total{result=inserted|changed|unchanged}
 用法：
   python qimai_crawl.py --start 2024-08-25 --end 2025-08-24 --genre 36 --brands 0 1 2 --max_pages 5
 
   # 新接口抓取示例：
   python rank_crawl.py --api index --start 2025-09-01 --end 2025-09-14 --genre 36 --brands_names free paid grossing --max_pages 5 --save-raw --save-flat
+
+  # 一年回填（8 路并发，全局 6 次/秒）：
+  python rank_crawl.py --start 2024-09-01 --end 2025-08-31 --max_pages 5 --concurrency 8 --rate 6
+
+  # 多分类/多市场：先入队，再在多个终端各起一个 worker，随时查看进度
+  python rank_crawl.py --api indexPlus --queue qimai_out/queue.sqlite3 --enqueue --genres 36 6014 6016 --countries cn us --start 2025-01-01 --end 2025-08-31
+  python rank_crawl.py --queue qimai_out/queue.sqlite3 --concurrency 4 --rate 2
+  python rank_crawl.py --queue qimai_out/queue.sqlite3 --queue-status
+
+  # 常驻跟随最新榜单（每 5 分钟检查今天/昨天未完成的分区，抓到短页即标记完成）：
+  python rank_crawl.py --api index --follow --genre 36 --countries cn us --poll-interval 300
+  # 注意：app_ratings 的唯一键与断点续抓统计都不含 genre，--api index 一次只能抓一个分类（多分类请用 indexPlus）
+
+  # 修改 normalize/表结构后，从归档重放一年数据（不请求网络）：
+  python rank_crawl.py --api index --replay --start 2024-09-01 --end 2025-08-31 --concurrency 8
+
+  # 一年回填走 LOAD DATA 批量装载（每批 5 万行）：
+  python rank_crawl.py --api index --replay --bulk-load --start 2024-09-01 --end 2025-08-31 --concurrency 8
 """
 
 import argparse
-import json
 import os
 import sys
+import threading
 import time
 from datetime import datetime, timedelta
+from functools import lru_cache, partial
 from typing import Dict, Any, List
 import re
 
@@ -31,20 +64,56 @@ if str(_BACKEND_DIR) not in sys.path:
     sys.path.insert(0, str(_BACKEND_DIR))
 
 import requests
-from app.services.ranking_service import upsert_page
+from requests.adapters import HTTPAdapter
+from app.core import jsonfast
+from app.services import raw_payload_service
+from app.services.bulk_load_service import bulk_upsert_app_ratings, bulk_upsert_rows
+from app.services.ranking_service import build_rows, upsert_rows
+from app.services.rating_service import typed_fields
+from app.util.crawl_engine import BRAND_MAP, BRAND_NAME_TO_ID, PageChain, RateLimiter, crawl
+from app.util.crawl_metrics import METRICS, dump_file, start_dump
+from app.util.crawl_metrics import serve as serve_metrics
+from app.util.crawl_planner import (PAGE_SIZE, CheckpointLedger, Fingerprint, chain_key, changed_keys,
+                                    fingerprint, load_db_counts, plan_chains)
+from app.util.crawl_queue import CrawlQueue, default_worker_id, format_progress
+from app.util.crawl_writer import BatchWriter
+from app.util.parquet_sink import ParquetSink
+from app.util.rate_control import AimdRateController, start_reporter
+from app.util.raw_archive import ArchiveReader, RawArchive, replay_fetcher
 try:
     # backend/app/services/rating_service.py should define: upsert_app_ratings(records: List[dict]) -> int
-    from app.services.rating_service import upsert_app_ratings
+    from app.services.rating_service import upsert_app_ratings, upsert_app_ratings_counts
 except Exception:
-    upsert_app_ratings = None
+    upsert_app_ratings = upsert_app_ratings_counts = None
 import logging
 
 BASE_URL = "https://api.qimai.cn/rank/indexPlus/brand_id/{brand_id}"
 BASE_URL_INDEX = "https://api.qimai.cn/rank/index"
-BRAND_MAP = {0: "paid", 1: "free", 2: "grossing"}
-BRAND_NAME_TO_ID = {v: k for k, v in BRAND_MAP.items()}
 BRAND_ALLOWED = {"free", "paid", "grossing"}
 
+
+def set_base_url(base: str) -> None:
+    """切换接口域名（如指向本地 mock_qimai.py），路径保持不变。"""
+    global BASE_URL, BASE_URL_INDEX
+    base = base.rstrip("/")
+    BASE_URL = base + "/rank/indexPlus/brand_id/{brand_id}"
+    BASE_URL_INDEX = base + "/rank/index"
+
+
+# 写库入口：kind -> 多行 upsert 函数（后台写入器与同步模式共用）
+def _upsert_app_ratings(records: List[Dict[str, Any]]) -> int:
+    """变化检测写入 app_ratings，并把 新增/变化/未变化 行数计入指标。"""
+    counts = upsert_app_ratings_counts(records)
+    for result, n in counts.items():
+        if n:
+            METRICS.inc("app_ratings_upsert_rows_total", n, help="app_ratings 变化检测写入结果（行数）", result=result)
+    return sum(counts.values())
+
+
+WRITE_FLUSHERS = {"rankings": upsert_rows}
+if upsert_app_ratings:
+    WRITE_FLUSHERS["app_ratings"] = _upsert_app_ratings
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
 }
@@ -92,16 +161,28 @@ def daterange(start_date: datetime, end_date: datetime):
         yield d
         d += timedelta(days=1)
 
+def _report(limiter, outcome: str, backoff: float = 0.0, attempt: int = 0,
+            labels: tuple | None = None, started: float | None = None) -> None:
+    """向限速器回报本次尝试结果并记录请求指标；非自适应限速（或未限速）时保持原有的线性退避。"""
+    if labels is not None and started is not None:
+        METRICS.observe_request(*labels, time.perf_counter() - started, outcome)
+    if limiter is not None:
+        limiter.record(outcome)
+    if outcome != "ok" and not getattr(limiter, "adaptive", False):
+        time.sleep(backoff * (attempt + 1))
+
+
 def fetch_rank_page(date_str: str, brand_id: int, genre: int, page: int,
                     country: str = "cn", device: str = "iphone",
                     brand: str = "all", timeout=15, retries=3, backoff=1.6,
-                    analysis: str | None = None) -> Dict[str, Any]:
+                    analysis: str | None = None, limiter=None) -> Dict[str, Any]:
     """
     请求单页数据。返回原始响应字典。
     说明：
       - 按你的观测，analysis 参数可省略，这里不传。
       - code==10000 代表成功；否则记 log 并返回字典（便于排错）。
-      - 内置重试和限速处理。
+      - 内置重试和限速处理；传入 limiter（见 crawl_engine.RateLimiter / rate_control.AimdRateController）
+        时每次尝试前先取令牌，并回报 ok / 429 / timeout / 非 10000 code，由自适应控制器调速。
     """
     url = BASE_URL.format(brand_id=brand_id)
     params = {
@@ -115,16 +196,24 @@ def fetch_rank_page(date_str: str, brand_id: int, genre: int, page: int,
         params["analysis"] = analysis
     full_url = f"{url}?" + "&".join(f"{k}={v}" for k, v in params.items())
     brand_used = _brand_from_url(full_url, brand)
-    print(f"[DEBUG] Fetching: {full_url}  Country={country} Device={device}")
+    logging.debug(f"Fetching: {full_url}  Country={country} Device={device}")
+    labels = ("indexPlus", BRAND_MAP.get(brand_id, str(brand_id)), genre)
     last_err = None
     for attempt in range(retries):
+        started = None
         try:
+            if limiter is not None:
+                limiter.acquire()
+            started = time.perf_counter()
             r = SESSION.get(url, params=params, timeout=timeout)
             if r.status_code == 429:
-                time.sleep(backoff * (attempt + 1))
+                _report(limiter, "429", backoff, attempt, labels, started)
                 continue
             r.raise_for_status()
-            data = r.json()
+            # 只解码一次；响应原文随字典带出，供归档直接复用（不再重新序列化整页）
+            data = jsonfast.loads(r.content)
+            data["_body"] = r.content
+            _report(limiter, "ok" if data.get("code") == 10000 else "code", labels=labels, started=started)
             try:
                 code = data.get("code")
                 msg = data.get("msg") or data.get("message")
@@ -132,15 +221,18 @@ def fetch_rank_page(date_str: str, brand_id: int, genre: int, page: int,
             except Exception:
                 pass
             return data
+        except requests.Timeout as e:
+            last_err = e
+            _report(limiter, "timeout", backoff, attempt, labels, started)
         except Exception as e:
             last_err = e
-            time.sleep(backoff * (attempt + 1))
+            _report(limiter, "error", backoff, attempt, labels, started)
     # 最后一次失败，返回带错误信息的字典
     return {"code": -1, "msg": f"request-failed: {last_err}", "status": getattr(last_err, 'response', None).status_code if hasattr(last_err, 'response') and last_err.response else None}
 
 def fetch_rank_index(date_str: str, brand: str, genre: int, page: int,
                      country: str = "cn", device: str = "iphone",
-                     timeout=15, retries=3, backoff=1.6) -> Dict[str, Any]:
+                     timeout=15, retries=3, backoff=1.6, limiter=None) -> Dict[str, Any]:
     """
     请求新接口 /rank/index，使用 brand=free|paid|grossing；返回字典。
     参数与旧接口保持一致。
@@ -157,16 +249,24 @@ def fetch_rank_index(date_str: str, brand: str, genre: int, page: int,
     }
     full_url = f"{url}?" + "&".join(f"{k}={v}" for k, v in params.items())
     brand_used = _brand_from_url(full_url, brand)
-    print(f"[DEBUG] Fetching (index): {full_url}  Country={country} Device={device}")
+    logging.debug(f"Fetching (index): {full_url}  Country={country} Device={device}")
+    labels = ("index", brand, genre)
     last_err = None
     for attempt in range(retries):
+        started = None
         try:
+            if limiter is not None:
+                limiter.acquire()
+            started = time.perf_counter()
             r = SESSION.get(url, params=params, timeout=timeout)
             if r.status_code == 429:
-                time.sleep(backoff * (attempt + 1))
+                _report(limiter, "429", backoff, attempt, labels, started)
                 continue
             r.raise_for_status()
-            data = r.json()
+            # 只解码一次；响应原文随字典带出，供归档直接复用（不再重新序列化整页）
+            data = jsonfast.loads(r.content)
+            data["_body"] = r.content
+            _report(limiter, "ok" if data.get("code") == 10000 else "code", labels=labels, started=started)
             data["_brand_used"] = brand_used
             try:
                 code = data.get("code")
@@ -176,9 +276,12 @@ def fetch_rank_index(date_str: str, brand: str, genre: int, page: int,
             except Exception:
                 pass
             return data
+        except requests.Timeout as e:
+            last_err = e
+            _report(limiter, "timeout", backoff, attempt, labels, started)
         except Exception as e:
             last_err = e
-            time.sleep(backoff * (attempt + 1))
+            _report(limiter, "error", backoff, attempt, labels, started)
     return {
         "code": -1,
         "msg": f"request-failed: {last_err}",
@@ -207,7 +310,9 @@ def _brand_from_url(full_url: str, fallback: str | None = None) -> str | None:
 from typing import Dict, Any, List
 from datetime import date as _date
 
+@lru_cache(maxsize=4096)
 def _parse_date_ymd(s: str) -> _date | None:
+    # 同一页内 chart_date / lastReleaseTime 高度重复，strptime 结果缓存复用
     try:
         return datetime.strptime(s, "%Y-%m-%d").date()
     except Exception:
@@ -224,8 +329,8 @@ def _safe_int(v):
 
 
 def normalize_rankinfo_to_app_ratings(date_str: str, brand_id: int, brand_name: str, genre_id: int, country: str, device: str,
-                                       item: Dict[str, Any]) -> Dict[str, Any]:
-    """Map a rankInfo item to an AppRatings-compatible dict."""
+                                       item: Dict[str, Any], item_json: str | None = None) -> Dict[str, Any]:
+    """Map a rankInfo item to an AppRatings-compatible dict. item_json: 已序列化的 item（复用，避免重复 dumps）。"""
     app = item.get("appInfo", {}) or {}
     rank_a = item.get("rank_a") or {}
     rank_b = item.get("rank_b") or {}
@@ -237,6 +342,10 @@ def normalize_rankinfo_to_app_ratings(date_str: str, brand_id: int, brand_name:
     comment = item.get("comment") or {}
     rating = comment.get("rating")
     rating_num = comment.get("num")
+    # 副表（MEDIUMBLOB）存完整原文；仅内联写热表 String(2000) 时截断
+    raw_json = item_json if item_json is not None else jsonfast.dumps(item)
+    if not raw_payload_service.SIDE_STORE:
+        raw_json = raw_json[:2000]
 
     rec = {
         "app_id": str(item.get("app_id") or app.get("appId") or ""),
@@ -251,18 +360,418 @@ def normalize_rankinfo_to_app_ratings(date_str: str, brand_id: int, brand_name:
         "genre": genre_name,
         "keyword_cover": _safe_int(item.get("keywordCover")),
         "keyword_cover_top3": _safe_int(item.get("keywordCoverTop3")),
-        "rank_a": json.dumps(rank_a, ensure_ascii=False) if rank_a else None,
-        "rank_b": json.dumps(rank_b, ensure_ascii=False) if rank_b else None,
-        "rank_c": json.dumps(rank_c, ensure_ascii=False) if rank_c else None,
+        "rank_a": jsonfast.dumps(rank_a) if rank_a else None,
+        "rank_b": jsonfast.dumps(rank_b) if rank_b else None,
+        "rank_c": jsonfast.dumps(rank_c) if rank_c else None,
         "rating": rating,
         "rating_num": rating_num,
         "is_ad": 1 if item.get("is_ad") is True else 0 if item.get("is_ad") is False else None,
         "icon_url": app.get("icon"),
         "last_release_time": _parse_date_ymd(item.get("lastReleaseTime")) if item.get("lastReleaseTime") else None,
-        "raw_json": json.dumps(item, ensure_ascii=False)[:2000],
+        "raw_json": raw_json,
     }
+    # 类型化列直接取自已解码的 dict，写库时不再解析 JSON 串
+    rec.update(typed_fields({"rank_a": rank_a, "rank_b": rank_b, "rank_c": rank_c, "rating_num": rating_num}))
     return rec
 
+class CrawlState:
+    """并发抓取时各线程共享的输出句柄与计数器（写文件/累加计数均加锁）。"""
+
+    def __init__(self, args, archive: RawArchive | None = None, f_flat=None, ledger=None, writer=None, parquet=None):
+        self.args = args
+        self.parquet = parquet
+        self.archive = archive
+        self.f_flat = f_flat
+        self.ledger = ledger
+        self.writer = writer
+        self.total_ok = 0
+        self.total_pages = 0
+        self.total_items = 0
+        self._failures: Dict[PageChain, str] = {}
+        self._chain_items: Dict[PageChain, int] = {}
+        # --follow：遇到不足一页（20 条）即认为榜单已到末尾，不再请求下一页
+        self.stop_on_short = bool(getattr(args, "follow", False))
+        # 内容指纹去重：重放时需要强制重写，因此关闭
+        self.dedup = ledger is not None and not getattr(args, "no_dedup", False) and not getattr(args, "replay", False)
+        self.pages_unchanged = 0
+        self.pages_changed = 0
+        self.rows_changed = 0
+        self.pending_chains = 0  # 本进程尚未完成的链路数（crawl_chains_pending 指标）
+        self._lock = threading.Lock()
+
+    def count(self, pages: int = 0, ok: int = 0, items: int = 0, chain: PageChain | None = None):
+        with self._lock:
+            self.total_pages += pages
+            self.total_ok += ok
+            self.total_items += items
+        if chain is not None:
+            METRICS.record_page(chain.brand, chain.genre, items=items, pages=pages)
+
+    def write_flat(self, lines: List[str]):
+        """写入已序列化好的扁平 JSONL 行（不含换行符）。"""
+        if not self.f_flat:
+            return
+        buf = "\n".join(lines) + "\n"
+        with self._lock:
+            self.f_flat.write(buf)
+
+    def add_pending(self, n: int):
+        with self._lock:
+            self.pending_chains += n
+
+    def fail(self, chain: PageChain, reason: str):
+        """记录链路失败原因（非 10000 / brand 非法等），供任务队列判定重试。"""
+        with self._lock:
+            self._failures[chain] = reason
+
+    def pop_failure(self, chain: PageChain) -> str:
+        with self._lock:
+            return self._failures.pop(chain, "")
+
+    def pop_chain_items(self, chain: PageChain) -> int:
+        with self._lock:
+            return self._chain_items.pop(chain, 0)
+
+    def more_pages(self, n_items: int) -> bool:
+        return not (self.stop_on_short and n_items < PAGE_SIZE)
+
+    def checkpoint(self, chain: PageChain, page: int, items: int, fp: Fingerprint | None = None):
+        """成功页写入检查点账本（items=0 表示已到末页），并记录内容指纹。"""
+        if self.ledger is not None:
+            self.ledger.record(chain, page, items, fp)
+
+    def dedup_page(self, chain: PageChain, page: int, lst: List[Dict[str, Any]],
+                   item_jsons: List[str]) -> tuple:
+        """
+        计算页指纹并与账本中上次写入的指纹比对。
+        :return: (fp, keep)；keep 为与 lst 对齐的布尔列表（只写变化的行），None 表示整页写入。
+        """
+        if not self.dedup:
+            return None, None
+        keys = [f"{it.get('index')}|{it.get('app_id') or (it.get('appInfo') or {}).get('appId')}" for it in lst]
+        fp = fingerprint(keys, item_jsons)
+        changed = changed_keys(self.ledger.fingerprint(chain, page), fp)
+        if changed is None:
+            METRICS.inc("crawl_page_dedup_total", help="页内容指纹比对结果", result="new")
+            return fp, None
+        with self._lock:
+            if changed:
+                self.pages_changed += 1
+                self.rows_changed += len(changed)
+            else:
+                self.pages_unchanged += 1
+        if not changed:
+            METRICS.inc("crawl_page_dedup_total", help="页内容指纹比对结果", result="unchanged")
+            return fp, [False] * len(lst)
+        METRICS.inc("crawl_page_dedup_total", help="页内容指纹比对结果", result="changed")
+        METRICS.inc("crawl_rows_changed_total", len(changed), help="重抓时内容发生变化的行数")
+        logging.info(f"页面有变化：{chain.date_str} {chain.brand} genre={chain.genre} "
+                     f"{chain.country}/{chain.device} page={page}，变化 {len(changed)}/{len(lst)} 行")
+        return fp, [k in changed for k in keys]
+
+    def write(self, kind: str, rows: List[Dict[str, Any]], chain: PageChain, page: int,
+              page_items: int | None = None, fp: Fingerprint | None = None):
+        """
+        写库：有后台写入器时提交后立即返回（跨页攒批），否则同步 upsert。
+        检查点（含指纹）在数据写库成功或已落盘 spool 后才推进；rows 为空（整页未变化）时直接推进。
+        page_items 为该页原始条数（去重后 rows 可能少于它），用于短页判断。
+        """
+        if page_items is None:
+            page_items = len(rows)
+        done = partial(self.checkpoint, chain, page, page_items, fp)
+        with self._lock:
+            self._chain_items[chain] = self._chain_items.get(chain, 0) + page_items
+        if self.writer is not None:
+            self.writer.submit(kind, rows, on_durable=done)
+            self.count(ok=1, items=len(rows), chain=chain)
+            return
+        t0 = time.perf_counter()
+        upserted = WRITE_FLUSHERS[kind](rows) if rows else 0
+        if rows:
+            METRICS.observe_flush(kind, len(rows), time.perf_counter() - t0, True)
+        self.count(ok=1, items=upserted, chain=chain)
+        done()
+
+
+def _brand_pairs(args) -> List[tuple]:
+    """按所选接口返回 [(brand_name, brand_id)]。"""
+    if args.api == "indexPlus":
+        # 旧接口，按 brand_id 抓取
+        return [(BRAND_MAP.get(b, str(b)), b) for b in args.brands]
+    # 新接口 /rank/index，按 brand 名称抓取
+    pairs = []
+    for brand_name in args.brands_names:
+        # 映射为 brand_id 便于后续落库（rankings 表使用 brand_id）
+        brand_id = BRAND_NAME_TO_ID.get(brand_name, None)
+        if brand_id is None:
+            logging.warning(f"未知 brand 名称: {brand_name}")
+            continue
+        pairs.append((brand_name, brand_id))
+    return pairs
+
+
+def build_chains(args, start: datetime, end: datetime) -> List[PageChain]:
+    """把 日期 × genre × country × device × 榜单 展开为翻页链路（每条链路 1..max_pages 页）。"""
+    pages = tuple(range(1, args.max_pages + 1))
+    genres = getattr(args, "genres", None) or [args.genre]
+    if args.api == "index" and len(set(genres)) > 1:
+        # app_ratings 不区分请求 genre：多分类会互相覆盖同 app 同日的行，续抓/进度也会把未抓的分类算作已完成
+        raise ValueError(f"--api index 一次只能抓一个分类，收到 {sorted(set(genres))}")
+    countries = getattr(args, "countries", None) or [args.country]
+    devices = getattr(args, "devices", None) or [args.device]
+    brands = _brand_pairs(args)
+    chains: List[PageChain] = []
+    for d in daterange(start, end):
+        date_str = d.strftime("%Y-%m-%d")
+        for genre in genres:
+            for country in countries:
+                for device in devices:
+                    for brand_name, brand_id in brands:
+                        chains.append(PageChain(args.api, date_str, brand_name, brand_id,
+                                                genre, country, device, pages))
+    return chains
+
+
+def fetch_chain_page(chain: PageChain, page: int, limiter=None) -> Dict[str, Any]:
+    if chain.api == "indexPlus":
+        return fetch_rank_page(chain.date_str, chain.brand_id, chain.genre, page,
+                               country=chain.country, device=chain.device, analysis=None, limiter=limiter)
+    return fetch_rank_index(chain.date_str, chain.brand, chain.genre, page,
+                            country=chain.country, device=chain.device, limiter=limiter)
+
+
+def _select(seq: List[Any], keep: List[bool] | None) -> List[Any]:
+    return seq if keep is None else [x for x, k in zip(seq, keep) if k]
+
+
+def _flat_line(fields: Dict[str, Any], pre: Dict[str, str | None]) -> str:
+    """扁平 JSONL 行：标量字段正常序列化，pre 中已序列化的 JSON 片段（rank_a/b/c 等）直接拼接。"""
+    head = jsonfast.dumps(fields)
+    if not pre:
+        return head
+    tail = "".join(f',"{k}":{v if v is not None else "null"}' for k, v in pre.items())
+    return head[:-1] + tail + "}"
+
+
+def _save_raw_page(state: CrawlState, chain: PageChain, page: int, data: Dict[str, Any]):
+    if state.archive is None:
+        return
+    try:
+        state.archive.append(chain, page, data, body=data.get("_body"))
+    except OSError as e:
+        logging.warning(f"原始响应归档失败 (date={chain.date_str}, brand={chain.brand}, page={page}): {e}")
+
+
+def handle_plus_page(state: CrawlState, chain: PageChain, page: int, data: Dict[str, Any]) -> bool:
+    """旧接口单页处理：保存 → 扁平 → build_rows → 写库。返回是否继续翻页。"""
+    date_str, brand_id = chain.date_str, chain.brand_id
+    state.count(pages=1, chain=chain)
+    # —— 保存 & 处理 ——
+    _save_raw_page(state, chain, page, data)
+    code = data.get("code")
+    if code != 10000:
+        logging.warning(f"非成功返回：code={code}, msg={data.get('msg')} (date={date_str}, brand={brand_id}, page={page})")
+        state.fail(chain, f"code={code} page={page}")
+        return False
+    lst: List[Dict[str, Any]] = data.get("list", []) or []
+    if not lst:
+        state.checkpoint(chain, page, 0)
+        return False
+    item_jsons = [jsonfast.dumps(it) for it in lst]
+    if state.f_flat:
+        recs = []
+        for item in lst:
+            app = item.get("appInfo", {}) or {}
+            klass = item.get("class", {}) or {}
+            recs.append(jsonfast.dumps({
+                "dt": date_str,
+                "brand_id": brand_id,
+                "genre": chain.genre,
+                "index": item.get("index"),
+                "rank": int(klass.get("ranking")) if klass.get("ranking") else None,
+                "change": item.get("change"),
+                "is_ad": item.get("is_ad"),
+                "appId": app.get("appId"),
+                "appName": app.get("appName"),
+                "publisher": app.get("publisher"),
+            }))
+        state.write_flat(recs)
+    fp, keep = state.dedup_page(chain, page, lst, item_jsons)
+    rows = build_rows(date_str, brand_id, chain.genre, _select(lst, keep), _select(item_jsons, keep),
+                      country=chain.country, device=chain.device)
+    state.write("rankings", rows, chain, page, page_items=len(lst), fp=fp)
+    return state.more_pages(len(lst))
+
+
+def handle_index_page(state: CrawlState, chain: PageChain, page: int, data: Dict[str, Any]) -> bool:
+    """新接口单页处理：保存 → 扁平 → normalize → 写库(app_ratings)。返回是否继续翻页。"""
+    date_str, brand_name = chain.date_str, chain.brand
+    # 以 URL 解析出的 brand 为准，保证与请求一致
+    brand_used = data.get("_brand_used") or brand_name
+    if brand_used not in BRAND_ALLOWED:
+        logging.warning(f"解析到的 brand 非法: {brand_used}, 跳过该页 (date={date_str}, page={page})")
+        state.fail(chain, f"bad brand {brand_used}")
+        return False
+    # 用解析后的 brand 重新计算 brand_id，保持一致性
+    brand_id = BRAND_NAME_TO_ID.get(brand_used, chain.brand_id)
+    state.count(pages=1, chain=chain)
+    # —— 保存 ——
+    _save_raw_page(state, chain, page, data)
+    code = data.get("code")
+    if code != 10000:
+        logging.warning(f"非成功返回：code={code}, msg={data.get('msg')} (date={date_str}, brand={brand_name}, page={page})")
+        state.fail(chain, f"code={code} page={page}")
+        return False
+    lst: List[Dict[str, Any]] = data.get("rankInfo", []) or []
+    if not lst:
+        state.checkpoint(chain, page, 0)
+        return False
+    # —— 每条只序列化一次：raw_json / rank_a/b/c 的 JSON 串由入库记录与扁平行共用 ——
+    item_jsons = [jsonfast.dumps(it) for it in lst]
+    records = [
+        normalize_rankinfo_to_app_ratings(
+            date_str, brand_id, brand_used, chain.genre, chain.country, chain.device, it, item_json=j
+        )
+        for it, j in zip(lst, item_jsons)
+    ]
+    # —— 扁平调试：写入更丰富的新字段 ——
+    if state.f_flat:
+        recs = []
+        for item, rec in zip(lst, records):
+            app = item.get("appInfo", {}) or {}
+            recs.append(_flat_line({
+                "dt": date_str,
+                "brand": brand_name,
+                "brand_id": brand_id,
+                "genre": chain.genre,
+                "index": item.get("index"),
+                "app_id": item.get("app_id") or app.get("appId"),
+                "appName": app.get("appName"),
+                "icon": app.get("icon"),
+                "publisher": app.get("publisher"),
+                "country": app.get("country"),
+                "keywordCover": item.get("keywordCover"),
+                "keywordCoverTop3": item.get("keywordCoverTop3"),
+                "rating": (item.get("comment") or {}).get("rating"),
+                "rating_num": (item.get("comment") or {}).get("num"),
+                "is_ad": item.get("is_ad"),
+            }, {"rank_a": rec["rank_a"], "rank_b": rec["rank_b"], "rank_c": rec["rank_c"]}))
+        state.write_flat(recs)
+    # —— ODS Parquet：整页记录（不受去重影响，与库内快照一致）——
+    if state.parquet is not None:
+        state.parquet.add(records)
+    # —— 入库到 app_ratings（优先），否则兜底写旧主表；内容未变化的行不再写库 ——
+    fp, keep = state.dedup_page(chain, page, lst, item_jsons)
+    if upsert_app_ratings:
+        state.write("app_ratings", _select(records, keep), chain, page, page_items=len(lst), fp=fp)
+    else:
+        rows = build_rows(date_str, brand_id, chain.genre, _select(lst, keep), _select(item_jsons, keep),
+                          country=chain.country, device=chain.device)
+        state.write("rankings", rows, chain, page, page_items=len(lst), fp=fp)
+    return state.more_pages(len(lst))
+
+
+def handle_page(state: CrawlState, chain: PageChain, page: int, data: Dict[str, Any]) -> bool:
+    if chain.api == "indexPlus":
+        return handle_plus_page(state, chain, page, data)
+    return handle_index_page(state, chain, page, data)
+
+
+def run_crawl(state: CrawlState, chains: List[PageChain], fetch_fn, handle_fn, concurrency: int,
+              sleep: float = 0.0, on_chain_done=None) -> None:
+    """crawl() 外包一层：维护 state.pending_chains（crawl_chains_pending 指标）。"""
+    chains = list(chains)
+    state.add_pending(len(chains))
+
+    def done(chain: PageChain, ok: bool, err: str):
+        state.add_pending(-1)
+        if on_chain_done is not None:
+            on_chain_done(chain, ok, err)
+
+    crawl(chains, fetch_fn, handle_fn, concurrency=concurrency, sleep=sleep, on_chain_done=done)
+
+
+def register_gauges(state: CrawlState, limiter, writer: BatchWriter | None, queue: CrawlQueue | None) -> None:
+    METRICS.register_gauge("crawl_chains_pending", lambda: state.pending_chains, help="本进程尚未完成的抓取链路数")
+    if getattr(limiter, "adaptive", False):
+        METRICS.register_gauge("qimai_request_rate", lambda: limiter.snapshot()["rate"], help="自适应控制器当前速率（次/秒）")
+        METRICS.register_gauge("qimai_error_rate", lambda: limiter.snapshot()["error_rate"], help="滑动窗口错误率")
+    if writer is not None:
+        METRICS.register_gauge("crawl_writer_pending_rows", lambda: writer.pending_rows, help="后台写入器积压行数")
+        METRICS.register_gauge("crawl_spool_files", writer.pending_spool_files, help="待回放的 spool 文件数")
+    if queue is not None:
+        METRICS.register_gauge(
+            "crawl_queue_pending_tasks",
+            lambda: sum(int(p["pending"]) + int(p["expired"]) for p in queue.progress()),
+            help="共享任务队列中待领取的任务数",
+        )
+
+
+def run_queue_worker(args, queue: CrawlQueue, state: CrawlState, fetch_fn, handle_fn) -> int:
+    """
+    队列 worker：循环领取一批任务并发抓取，链路成功（且数据已写库/落盘）后标记 done，
+    失败则退回队列等待重试。返回处理的任务数。
+    """
+    worker = args.worker_id or default_worker_id()
+    handled = 0
+
+    def on_done(chain: PageChain, ok: bool, err: str):
+        err = state.pop_failure(chain) or err
+        if not ok or err:
+            queue.fail(worker, chain, err)
+            return
+        finish = partial(queue.complete, worker, chain)
+        if state.writer is not None:
+            state.writer.after_pending(finish)
+        else:
+            finish()
+
+    while True:
+        chains = queue.lease(worker, args.concurrency * 2, args.lease_seconds)
+        if not chains:
+            break
+        handled += len(chains)
+        logging.info(f"[{worker}] 领取 {len(chains)} 个任务")
+        run_crawl(state, chains, fetch_fn, handle_fn, concurrency=args.concurrency, sleep=args.sleep,
+                  on_chain_done=on_done)
+    return handled
+
+
+def follow_latest(args, state: CrawlState, ledger: CheckpointLedger, fetch_fn, handle_fn) -> None:
+    """
+    常驻模式：每 --poll-interval 秒检查最近 --follow-days 天里尚未完成的 (日期 × 分区)。
+    第 1 页为空/非 10000 说明当天榜单尚未发布，下一轮再试；有数据则顺序翻页，遇短页即停，
+    数据写库（或落盘）后在账本中标记该天完成，之后不再请求。
+    """
+    def on_done(chain: PageChain, ok: bool, err: str):
+        err = state.pop_failure(chain) or err
+        items = state.pop_chain_items(chain)
+        if not ok or err or items <= 0:
+            return
+        mark = partial(ledger.mark_day_complete, chain, items)
+        if state.writer is not None:
+            state.writer.after_pending(mark)
+        else:
+            mark()
+        logging.info(f"榜单已完成：{chain.date_str} {chain.brand} genre={chain.genre} "
+                     f"{chain.country}/{chain.device}（{items} 条）")
+
+    while True:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        first = today - timedelta(days=max(1, args.follow_days) - 1)
+        completed = ledger.completed_days(first.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
+        todo = [c for c in build_chains(args, first, today) if chain_key(c) not in completed]
+        if todo:
+            logging.info(f"[follow] 待检查 {len(todo)} 个未完成分区（{first:%Y-%m-%d} ~ {today:%Y-%m-%d}）")
+            run_crawl(state, todo, fetch_fn, handle_fn, concurrency=args.concurrency, sleep=args.sleep,
+                      on_chain_done=on_done)
+            if state.parquet is not None:
+                state.parquet.flush()  # 每轮落一次文件，新榜单日及时进入 ODS
+        if args.follow_once:
+            return
+        time.sleep(args.poll_interval)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--start", type=str, help="起始日期 YYYY-MM-DD（含）",
@@ -270,26 +779,104 @@ def main():
     parser.add_argument("--end", type=str, help="结束日期 YYYY-MM-DD（含）",
                         default=datetime.utcnow().strftime("%Y-%m-%d"))
     parser.add_argument("--genre", type=int, default=36, help="分类 genre ID（默认 36）")
-    # parser.add_argument("--brands", type=int, nargs="*", default=[0, 1, 2],
-    #                     help="榜单类型 brand_id 列表：0付费/1免费/2畅销")
+    parser.add_argument("--brands", type=int, nargs="*", default=[0, 1, 2],
+                        help="当 --api=indexPlus 时使用的榜单类型 brand_id 列表：0付费/1免费/2畅销")
     parser.add_argument("--api", choices=["indexPlus", "index"], default="index", help="选择使用的新/旧API：index(新)/indexPlus(旧)")
     parser.add_argument("--brands_names", type=str, nargs="*", default=["free", "paid", "grossing"], help="当 --api=index 时使用的 brand 名称列表：free/paid/grossing")
     parser.add_argument("--max_pages", type=int, default=10, help="每天每分类每榜单最多抓多少页（每页20条）")
     parser.add_argument("--out", type=str, default="qimai_out", help="输出目录")
-    parser.add_argument("--sleep", type=float, default=0.5, help="请求间隔（秒）")
-    parser.add_argument("--save-raw", action="store_true", help="保存原始响应 JSON")
+    parser.add_argument("--sleep", type=float, default=None, help="同一链路内翻页间隔（秒）；默认自适应调速时 0，--fixed-rate 时 0.5")
+    parser.add_argument("--concurrency", type=int, default=4, help="最大在途请求数（并发链路数），1 即串行")
+    parser.add_argument("--rate", type=float, default=4.0, help="全局请求速率（次/秒，含重试）；自适应模式下为初始速率，<=0 不限速")
+    parser.add_argument("--fixed-rate", action="store_true", help="关闭自适应调速，始终按 --rate 发请求")
+    parser.add_argument("--min-rate", type=float, default=0.2, help="自适应调速下限（次/秒）")
+    parser.add_argument("--max-rate", type=float, default=20.0, help="自适应调速上限（次/秒）")
+    parser.add_argument("--rate-increase", type=float, default=0.5, help="健康时每秒提速量（次/秒）")
+    parser.add_argument("--rate-decrease", type=float, default=0.5, help="遇 429/超时/非 10000 时的降速系数")
+    parser.add_argument("--rate-report", type=float, default=30.0, help="速率/错误率输出间隔（秒），写入 <out>/rate_state.json")
+    parser.add_argument("--resume", action="store_true", help="断点续抓：结合库内行数与检查点账本，只抓缺失/短页")
+    parser.add_argument("--ledger", type=str, default=None, help="检查点账本路径（默认 <out>/ledger.sqlite3）")
+    parser.add_argument("--sync-write", action="store_true", help="每页同步写库（关闭后台批量写入器）")
+    parser.add_argument("--batch-rows", type=int, default=None,
+                        help="后台写入器每批行数（默认 2000；--bulk-load 时 50000）")
+    parser.add_argument("--bulk-load", action="store_true",
+                        help="回填模式：批次经 LOAD DATA LOCAL INFILE 装入临时表再集合式合并（需服务端 local_infile=ON）")
+    parser.add_argument("--flush-interval", type=float, default=None,
+                        help="后台写入器最长攒批时间（秒，默认 5；--bulk-load 时 30）")
+    parser.add_argument("--spool-dir", type=str, default=None, help="写库失败/积压时的落盘目录（默认 <out>/spool）")
+    parser.add_argument("--save-raw", action="store_true", help="原始响应写入 <out>/raw 分段归档")
+    parser.add_argument("--raw-dir", type=str, default=None, help="归档目录（默认 <out>/raw）")
+    parser.add_argument("--replay", action="store_true", help="不请求网络，从归档重放 normalize + upsert")
     parser.add_argument("--save-flat", action="store_true", help="保存扁平 JSONL 记录")
+    parser.add_argument("--save-parquet", type=str, nargs="?", const="", default=None, metavar="ROOT",
+                        help="index 接口记录按天写入 ODS Parquet（默认 <out>/ods_app_ratings；需要 pyarrow）")
+    parser.add_argument("--parquet-batch-rows", type=int, default=20000, help="每个 Parquet 文件的最大行数")
     parser.add_argument("--cookie", type=str, default=None, help="直接传 Cookie 字符串（从浏览器复制）")
     parser.add_argument("--cookie_file", type=str, default=None, help="包含一行 Cookie 字符串的文件路径")
     parser.add_argument("--headers-file", type=str, default=None, help="仅包含 Cookie 与 User-Agent 的文件")
-    parser.add_argument("--country", type=str, default="cn", choices=["cn", "us"], help="国家：cn/us")
-    parser.add_argument("--device", type=str, default="iphone", choices=["iphone"], help="设备：iphone")
+    parser.add_argument("--country", type=str, default="cn", help="国家：cn/us/...")
+    parser.add_argument("--device", type=str, default="iphone", help="设备：iphone/ipad")
+    parser.add_argument("--genres", type=int, nargs="*", default=None, help="多个分类 genre ID（覆盖 --genre；仅 --api indexPlus 支持多个）")
+    parser.add_argument("--countries", type=str, nargs="*", default=None, help="多个国家（覆盖 --country）")
+    parser.add_argument("--devices", type=str, nargs="*", default=None, help="多个设备（覆盖 --device）")
+    parser.add_argument("--queue", type=str, default=None, help="共享任务队列（SQLite）路径；多进程指向同一文件即可分摊")
+    parser.add_argument("--enqueue", action="store_true", help="仅把 日期×genre×country×device×榜单 展开写入 --queue 后退出")
+    parser.add_argument("--queue-status", action="store_true", help="打印 --queue 各分区进度后退出")
+    parser.add_argument("--worker-id", type=str, default=None, help="worker 标识（默认 主机名-进程号）")
+    parser.add_argument("--lease-seconds", type=float, default=300.0, help="任务租约时长（秒），过期可被其他 worker 重领")
+    parser.add_argument("--max-attempts", type=int, default=5, help="单任务最多尝试次数")
+    parser.add_argument("--follow", action="store_true", help="常驻模式：持续检测并抓取最新发布的榜单日（忽略 --start/--end）")
+    parser.add_argument("--follow-days", type=int, default=2, help="--follow 时回看的天数（含今天），用于补抓晚发布的榜单")
+    parser.add_argument("--poll-interval", type=float, default=300.0, help="--follow 轮询间隔（秒）")
+    parser.add_argument("--follow-once", action="store_true", help="--follow 只检查一轮后退出（适合 cron）")
+    parser.add_argument("--base-url", type=str, default=None, help="接口根地址（默认 https://api.qimai.cn；压测可指向 mock_qimai.py）")
+    parser.add_argument("--no-db", action="store_true", help="不写数据库（只测抓取层；检查点/去重照常记录）")
+    parser.add_argument("--no-dedup", action="store_true", help="关闭页内容指纹去重（库被清空/恢复后需强制重写时使用）")
+    parser.add_argument("--metrics-port", type=int, default=0, help="在该端口暴露 Prometheus /metrics（0=关闭）")
+    parser.add_argument("--metrics-file", type=str, default=None, help="周期写入 Prometheus 文本格式指标的文件")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="指标文件写入/吞吐摘要日志间隔（秒）")
     args = parser.parse_args()
     args.max_pages = min(5, max(1, args.max_pages))  # 平台最多5页=Top200
+    if args.api == "index" and len(set(args.genres or [])) > 1:
+        parser.error("--api index 不支持多个 --genres（app_ratings 不区分分类，会互相覆盖）；请逐个分类运行或改用 --api indexPlus")
+    args.concurrency = max(1, args.concurrency)
+    if args.batch_rows is None:
+        args.batch_rows = 50000 if args.bulk_load else 2000
+    if args.flush_interval is None:
+        args.flush_interval = 30.0 if args.bulk_load else 5.0
+    if args.bulk_load and not args.no_db:
+        WRITE_FLUSHERS.update(rankings=bulk_upsert_rows, app_ratings=bulk_upsert_app_ratings)
+    if args.sleep is None:
+        args.sleep = 0.5 if (args.fixed_rate or args.rate <= 0) else 0.0
 
     start = datetime.strptime(args.start, "%Y-%m-%d")
     end = datetime.strptime(args.end, "%Y-%m-%d")
 
+    if args.base_url:
+        set_base_url(args.base_url)
+        logging.info(f"接口根地址：{args.base_url}")
+    if args.no_db:
+        for kind in list(WRITE_FLUSHERS):
+            WRITE_FLUSHERS[kind] = len
+
+    queue = CrawlQueue(args.queue, max_attempts=args.max_attempts) if args.queue else None
+    if queue is not None and (args.enqueue or args.queue_status):
+        try:
+            if args.enqueue:
+                chains = build_chains(args, start, end)
+                if args.resume:
+                    ledger = CheckpointLedger(args.ledger or os.path.join(args.out, "ledger.sqlite3"))
+                    db_counts = {} if args.no_db else load_db_counts(chains)
+                    chains = plan_chains(chains, ledger, db_counts, max_pages=args.max_pages)
+                    ledger.close()
+                added = queue.enqueue(chains)
+                print(f"Enqueued {added} new tasks ({len(chains) - added} already queued) -> {args.queue}")
+            if args.queue_status:
+                print(format_progress(queue.progress()))
+        finally:
+            queue.close()
+        return
+
     # 1) 先从文件加载（若提供），仅应用 UA & Cookie
     headers_file_used = False
     if getattr(args, 'cookie_file', None) and not args.cookie:
@@ -318,146 +905,118 @@ def main():
         SESSION.headers['Cookie'] = ck_final
     # logging.info(f"最终请求头(仅UA/Cookie): {SESSION.headers}")
 
-    raw_root, flat_root, f_flat = None, None, None
-    if args.save_raw:
-        raw_root = os.path.join(args.out, "raw")
-        ensure_dir(raw_root)
+    # 连接池至少容纳全部并发线程，避免 "Connection pool is full" 反复建连
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, args.concurrency))
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+    if args.fixed_rate or args.rate <= 0:
+        limiter = RateLimiter(args.rate, burst=args.concurrency)
+    else:
+        limiter = AimdRateController(args.rate, min_rate=args.min_rate, max_rate=args.max_rate,
+                                     increase=args.rate_increase, decrease=args.rate_decrease,
+                                     burst=args.concurrency)
+
+    raw_root = args.raw_dir or os.path.join(args.out, "raw")
+    archive = None
+    flat_root, f_flat = None, None
+    if args.save_raw and not args.replay:
+        archive = RawArchive(raw_root)
     if args.save_flat:
         flat_root = os.path.join(args.out, "flat")
         ensure_dir(flat_root)
         flat_path = os.path.join(flat_root, "records.jsonl")
         f_flat = open(flat_path, "a", encoding="utf-8")
+    parquet = None
+    if args.save_parquet is not None:
+        parquet = ParquetSink(args.save_parquet or os.path.join(args.out, "ods_app_ratings"),
+                              batch_rows=args.parquet_batch_rows)
 
-    total_ok, total_pages, total_items = 0, 0, 0
+    ledger = CheckpointLedger(args.ledger or os.path.join(args.out, "ledger.sqlite3"))
+    writer = None
+    if not args.sync_write:
+        writer = BatchWriter(
+            WRITE_FLUSHERS,
+            args.spool_dir or os.path.join(args.out, "spool"),
+            batch_rows=args.batch_rows,
+            flush_interval=args.flush_interval,
+            max_pending_rows=max(50000, args.batch_rows * 4),
+            on_flush=METRICS.observe_flush,
+        ).start()
+    state = CrawlState(args, archive=archive, f_flat=f_flat, ledger=ledger, writer=writer, parquet=parquet)
+    register_gauges(state, limiter, writer, queue)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    stop_metrics = start_dump(args.metrics_file, interval=args.metrics_interval)
+    stop_reporter = None
+    if limiter.adaptive and not args.replay:
+        stop_reporter = start_reporter(limiter, interval=args.rate_report,
+                                       path=os.path.join(args.out, "rate_state.json"))
+    fetch_fn = partial(fetch_chain_page, limiter=limiter)
+    handle_fn = partial(handle_page, state)
 
     try:
-        for d in daterange(start, end):
-            date_str = d.strftime("%Y-%m-%d")
-            if args.api == "indexPlus":
-                # 旧接口，按 brand_id 抓取
-                for brand_id in args.brands:
-                    genre = args.genre
-                    for page in range(1, args.max_pages + 1):
-                        data = fetch_rank_page(date_str, brand_id, genre, page, country=args.country, device=args.device, analysis=None)
-                        total_pages += 1
-                        # —— 保存 & 处理 ——
-                        if args.save_raw and raw_root:
-                            raw_dir = os.path.join(raw_root, date_str, f"brand_{brand_id}", f"genre_{args.genre}")
-                            ensure_dir(raw_dir)
-                            raw_file = os.path.join(raw_dir, f"page_{page}.json")
-                            with open(raw_file, "w", encoding="utf-8") as fp:
-                                json.dump(data, fp, ensure_ascii=False)
-                        code = data.get("code")
-                        if code != 10000:
-                            logging.warning(f"非成功返回：code={code}, msg={data.get('msg')} (date={date_str}, brand={brand_id}, page={page})")
-                            break
-                        lst: List[Dict[str, Any]] = data.get("list", []) or []
-                        if not lst:
-                            break
-                        if args.save_flat and f_flat:
-                            for item in lst:
-                                app = item.get("appInfo", {}) or {}
-                                klass = item.get("class", {}) or {}
-                                rec = {
-                                    "dt": date_str,
-                                    "brand_id": brand_id,
-                                    "genre": args.genre,
-                                    "index": item.get("index"),
-                                    "rank": int(klass.get("ranking")) if klass.get("ranking") else None,
-                                    "change": item.get("change"),
-                                    "is_ad": item.get("is_ad"),
-                                    "appId": app.get("appId"),
-                                    "appName": app.get("appName"),
-                                    "publisher": app.get("publisher"),
-                                }
-                                f_flat.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                        upserted = upsert_page(date_str, brand_id, args.genre, lst)
-                        total_items += upserted
-                        total_ok += 1
-                        time.sleep(args.sleep)
-            else:
-                # 新接口 /rank/index，按 brand 名称抓取
-                for brand_name in args.brands_names:
-                    # 映射为 brand_id 便于后续落库（upsert_page 可使用 brand_id）
-                    brand_id = BRAND_NAME_TO_ID.get(brand_name, None)
-                    if brand_id is None:
-                        logging.warning(f"未知 brand 名称: {brand_name}")
-                        continue
-                    genre = args.genre
-                    for page in range(1, args.max_pages + 1):
-                        data = fetch_rank_index(date_str, brand_name, genre, page, country=args.country, device=args.device)
-                        # 以 URL 解析出的 brand 为准，保证与请求一致
-                        brand_used = data.get("_brand_used") or brand_name
-                        if brand_used not in BRAND_ALLOWED:
-                            logging.warning(f"解析到的 brand 非法: {brand_used}, 跳过该页 (date={date_str}, page={page})")
-                            break
-                        # 用解析后的 brand 重新计算 brand_id，保持一致性
-                        brand_id = BRAND_NAME_TO_ID.get(brand_used, brand_id)
-                        total_pages += 1
-                        # —— 保存 ——
-                        if args.save_raw and raw_root:
-                            raw_dir = os.path.join(raw_root, date_str, f"brand_{brand_name}", f"genre_{args.genre}")
-                            ensure_dir(raw_dir)
-                            raw_file = os.path.join(raw_dir, f"page_{page}.json")
-                            with open(raw_file, "w", encoding="utf-8") as fp:
-                                json.dump(data, fp, ensure_ascii=False)
-                        code = data.get("code")
-                        if code != 10000:
-                            logging.warning(f"非成功返回：code={code}, msg={data.get('msg')} (date={date_str}, brand={brand_name}, page={page})")
-                            break
-                        lst: List[Dict[str, Any]] = data.get("rankInfo", []) or []
-                        if not lst:
-                            break
-                        # —— 扁平调试：写入更丰富的新字段 ——
-                        if args.save_flat and f_flat:
-                            for item in lst:
-                                app = item.get("appInfo", {}) or {}
-                                rec = {
-                                    "dt": date_str,
-                                    "brand": brand_name,
-                                    "brand_id": brand_id,
-                                    "genre": args.genre,
-                                    "index": item.get("index"),
-                                    "app_id": item.get("app_id") or app.get("appId"),
-                                    "appName": app.get("appName"),
-                                    "icon": app.get("icon"),
-                                    "publisher": app.get("publisher"),
-                                    "country": app.get("country"),
-                                    "keywordCover": item.get("keywordCover"),
-                                    "keywordCoverTop3": item.get("keywordCoverTop3"),
-                                    "rank_a": item.get("rank_a"),
-                                    "rank_b": item.get("rank_b"),
-                                    "rank_c": item.get("rank_c"),
-                                    "rating": (item.get("comment") or {}).get("rating"),
-                                    "rating_num": (item.get("comment") or {}).get("num"),
-                                    "is_ad": item.get("is_ad"),
-                                }
-                                f_flat.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                        # —— 入库到 app_ratings（优先），否则兜底写旧主表 ——
-                        records = [
-                            normalize_rankinfo_to_app_ratings(
-                                date_str, brand_id, brand_used, args.genre, args.country, args.device, it
-                            )
-                            for it in lst
-                        ]
-                        if upsert_app_ratings:
-                            upserted = upsert_app_ratings(records)
-                        else:
-                            upserted = upsert_page(date_str, brand_id, args.genre, lst)
-
-                        total_items += upserted
-                        total_ok += 1
-                        time.sleep(args.sleep)
-
+        if args.follow:
+            follow_latest(args, state, ledger, fetch_fn, handle_fn)
+        elif args.replay:
+            wanted = {(c.date_str, c.api, c.brand, c.genre, c.country, c.device)
+                      for c in build_chains(args, start, end)}
+            chains, locations = ArchiveReader(raw_root).plan(args.start, args.end, wanted)
+            logging.info(f"归档重放：{len(chains)} 条链路 / {len(locations)} 页（{raw_root}）")
+            run_crawl(state, chains, replay_fetcher(locations), handle_fn, concurrency=args.concurrency)
+        elif queue is not None:
+            handled = run_queue_worker(args, queue, state, fetch_fn, handle_fn)
+            logging.info(f"队列已无可领取任务，本 worker 共处理 {handled} 个")
+        else:
+            chains = build_chains(args, start, end)
+            if args.resume:
+                db_counts = {} if args.no_db else load_db_counts(chains)
+                chains = plan_chains(chains, ledger, db_counts, max_pages=args.max_pages)
+            logging.info(f"共 {len(chains)} 条链路，并发={args.concurrency}，限速={args.rate}/s")
+            run_crawl(state, chains, fetch_fn, handle_fn, concurrency=args.concurrency, sleep=args.sleep)
     finally:
+        stop_metrics.set()
+        if stop_reporter is not None:
+            stop_reporter.set()
+        if writer is not None:
+            writer.close()
         if f_flat:
             f_flat.close()
+        if parquet is not None:
+            parquet.close()
+        ledger.close()
+        if queue is not None:
+            print(format_progress(queue.progress()))
+            queue.close()
 
-    print(f"Done. {total_ok} ok pages / {total_pages} total pages scanned / {total_items} items upserted")
+    print(f"Done. {state.total_ok} ok pages / {state.total_pages} total pages scanned / {state.total_items} items upserted")
+    if state.dedup:
+        print(f"Dedup: {state.pages_unchanged} unchanged pages skipped / {state.pages_changed} changed pages "
+              f"({state.rows_changed} rows changed)")
+    if METRICS.total("app_ratings_upsert_rows_total"):
+        by = {k: int(METRICS.total_by("app_ratings_upsert_rows_total", "result", k))
+              for k in ("inserted", "changed", "unchanged")}
+        print(f"app_ratings: {by['inserted']} inserted / {by['changed']} changed / {by['unchanged']} unchanged")
+    if parquet is not None:
+        print(f"Parquet:    {parquet.rows} rows / {parquet.files} files -> {parquet.root}")
+    dump_file(args.metrics_file)
+    summ = METRICS.summary()
+    print(f"Throughput: {summ['pages_per_s']:.2f} pages/s / {summ['items_per_s']:.1f} items/s "
+          f"over {summ['elapsed']:.0f}s")
+    if args.metrics_file:
+        print(f"Metrics:    {args.metrics_file}")
+    if limiter.adaptive and not args.replay:
+        snap = limiter.snapshot()
+        print(f"Rate: final {snap['rate']} req/s / error rate {snap['error_rate']:.1%} / "
+              f"{snap['cuts']} cuts / errors {snap['errors']}")
+    if writer is not None:
+        print(f"Writer: {writer.flushed_rows} rows in {writer.flush_count} flushes / "
+              f"{writer.spooled_rows} spooled / {writer.drained_rows} drained / "
+              f"{writer.pending_spool_files()} spool files left")
     if flat_root:
         print(f"Flat JSONL: {os.path.join(flat_root, 'records.jsonl')}")
-    if raw_root:
-        print(f"Raw JSON:   {raw_root}")
+    if archive is not None:
+        print(f"Raw archive: {raw_root} ({archive.pages} pages, "
+              f"{archive.raw_bytes} -> {archive.stored_bytes} bytes)")
 
 if __name__ == "__main__":
     # 小心被限流；如遇 429/黑页，减小 --sleep 或手工加 cookie/代理
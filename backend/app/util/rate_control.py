@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应请求速率控制（AIMD，供 rank_crawl.py 使用）
+- 与 RateLimiter 同接口（acquire / record），可直接替换。
+- 加性增：每次健康响应 rate += increase / rate，即以约 increase 次/秒² 的斜率缓慢提速，直到 max_rate。
+- 乘性减：429 / 超时 / 非 10000 code / 其他请求异常时 rate *= decrease（不低于 min_rate），
+  同时清空令牌桶；cooldown 秒内的后续错误视为同一次拥塞（在途请求的余波），不重复降速。
+- snapshot() 导出当前速率、滑动窗口错误率与各类错误计数；start_reporter() 定期写日志/JSON 文件。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.util.crawl_engine import RateLimiter
+
+# 触发降速的结果类型
+THROTTLE_OUTCOMES = ("429", "timeout", "code", "error")
+
+
+class AimdRateController(RateLimiter):
+    """线程安全的 AIMD 令牌桶。"""
+
+    adaptive = True
+
+    def __init__(self, rate: float, min_rate: float = 0.2, max_rate: float = 20.0,
+                 increase: float = 0.5, decrease: float = 0.5, cooldown: float = 2.0,
+                 burst: int = 1, window: int = 200):
+        super().__init__(rate, burst=burst)
+        self.min_rate = max(0.01, float(min_rate))
+        self.max_rate = max(self.min_rate, float(max_rate))
+        self.rate = min(self.max_rate, max(self.min_rate, float(rate)))
+        self.increase = float(increase)
+        self.decrease = min(0.99, max(0.01, float(decrease)))
+        self.cooldown = float(cooldown)
+        self._window: deque = deque(maxlen=max(10, int(window)))
+        self._last_cut = 0.0
+        self.requests = 0
+        self.cuts = 0
+        self.errors: Dict[str, int] = dict.fromkeys(THROTTLE_OUTCOMES, 0)
+
+    def record(self, outcome: str) -> None:
+        ok = outcome == "ok"
+        with self._lock:
+            self.requests += 1
+            self._window.append(0 if ok else 1)
+            if ok:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+                return
+            self.errors[outcome] = self.errors.get(outcome, 0) + 1
+            now = time.monotonic()
+            if now - self._last_cut < self.cooldown:
+                return
+            old = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0.0
+            self._last_cut = now
+            self.cuts += 1
+        logging.warning(f"上游限流信号({outcome})：请求速率 {old:.2f} → {self.rate:.2f} 次/秒")
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return sum(self._window) / len(self._window) if self._window else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._window)
+            return {
+                "rate": round(self.rate, 3),
+                "error_rate": round(sum(self._window) / n, 4) if n else 0.0,
+                "window": n,
+                "requests": self.requests,
+                "cuts": self.cuts,
+                "errors": dict(self.errors),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+            }
+
+
+def start_reporter(controller: AimdRateController, interval: float = 30.0,
+                   path: Optional[str] = None) -> threading.Event:
+    """后台定期输出控制器状态（日志 + 可选 JSON 文件，原子替换）；返回用于停止的 Event。"""
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            snap = controller.snapshot()
+            logging.info(f"[rate] {snap['rate']:.2f} 次/秒，错误率 {snap['error_rate']:.1%}，"
+                         f"请求 {snap['requests']}，降速 {snap['cuts']} 次，错误 {snap['errors']}")
+            if path:
+                try:
+                    tmp = path + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as fp:
+                        json.dump({**snap, "ts": time.time()}, fp, ensure_ascii=False)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logging.warning(f"写入速率状态失败: {e}")
+
+    threading.Thread(target=_loop, name="rate-reporter", daemon=True).start()
+    return stop
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原始响应分段归档（替代 --save-raw 下“每页一个 JSON 文件”的目录树）
+- 每个抓取日一个目录：raw/<YYYY-MM-DD>/seg-<pid>.gz + seg-<pid>.idx
+  * .gz：每页响应压缩成一个独立 gzip member 追加写入；整个文件仍是合法的 gzip（zcat 即得 JSONL）。
+  * .idx：每页一行 JSON 索引 {api, brand, brand_id, genre, country, device, page, offset, length, fetched_at}，
+    按 offset/length 可直接定位单页，无需解压整段。
+  * 每个进程写自己的段文件，多 worker 共享同一 raw 目录互不冲突。
+- ArchiveReader：按日期区间/链路过滤读取，供 rank_crawl.py --replay 离线重放（重新 normalize + upsert）。
+- 旧目录树（raw/<date>/brand_x/genre_y/page_n.json）可用本模块 --pack 一次性转换。
+
+用法：
+  python -m app.util.raw_archive --root qimai_out/raw --stats
+  python -m app.util.raw_archive --root qimai_out/raw --pack [--remove]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core import jsonfast
+from app.util.crawl_engine import BRAND_MAP, BRAND_NAME_TO_ID, PageChain
+
+_SEG_PREFIX = "seg-"
+
+# 链路键：(date, api, brand, genre, country, device)
+ChainKey = Tuple[str, str, str, int, str, str]
+
+
+def _chain_key(c: PageChain) -> ChainKey:
+    return (c.date_str, c.api, c.brand, c.genre, c.country, c.device)
+
+
+class RawArchive:
+    """追加式写入器（线程安全）。每次写入 open/append/close，进程崩溃最多丢失最后一页的索引。"""
+
+    def __init__(self, root: str, compresslevel: int = 6):
+        self.root = root
+        self.compresslevel = compresslevel
+        self._seg = f"{_SEG_PREFIX}{os.getpid()}"
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, chain: PageChain, page: int, data: Dict[str, Any], body: Optional[bytes] = None) -> None:
+        """body 为接口响应原文时直接归档（不再重新序列化）；否则序列化 data（去掉内部 "_" 前缀字段）。"""
+        if body is None:
+            body = jsonfast.dumpb({k: v for k, v in data.items() if not k.startswith("_")})
+        payload = body.strip().replace(b"\n", b" ") + b"\n"
+        blob = gzip.compress(payload, compresslevel=self.compresslevel)
+        day_dir = os.path.join(self.root, chain.date_str)
+        with self._lock:
+            os.makedirs(day_dir, exist_ok=True)
+            seg_path = os.path.join(day_dir, self._seg + ".gz")
+            with open(seg_path, "ab") as fp:
+                offset = fp.seek(0, os.SEEK_END)
+                fp.write(blob)
+            entry = {
+                "api": chain.api, "brand": chain.brand, "brand_id": chain.brand_id, "genre": chain.genre,
+                "country": chain.country, "device": chain.device, "page": page,
+                "offset": offset, "length": len(blob), "fetched_at": round(time.time(), 3),
+            }
+            # 先写数据再写索引：索引里出现的条目一定可读
+            with open(os.path.join(day_dir, self._seg + ".idx"), "a", encoding="utf-8") as fp:
+                fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.pages += 1
+            self.raw_bytes += len(payload)
+            self.stored_bytes += len(blob)
+
+
+class ArchiveReader:
+    """按日期区间读取归档；同一链路同一页出现多次时取最后一次抓取。"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _days(self, start: str, end: str) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if start <= d <= end and os.path.isdir(os.path.join(self.root, d)))
+
+    def entries(self, start: str, end: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """逐条产出 (date, segment_path, index_entry)。"""
+        for day in self._days(start, end):
+            day_dir = os.path.join(self.root, day)
+            for name in sorted(os.listdir(day_dir)):
+                if not (name.startswith(_SEG_PREFIX) and name.endswith(".idx")):
+                    continue
+                seg_path = os.path.join(day_dir, name[:-4] + ".gz")
+                with open(os.path.join(day_dir, name), "r", encoding="utf-8") as fp:
+                    for line in fp:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield day, seg_path, json.loads(line)
+                        except ValueError:
+                            logging.warning(f"跳过损坏的索引行: {name}")
+
+    def plan(self, start: str, end: str,
+             wanted: Optional[Set[ChainKey]] = None) -> Tuple[List[PageChain], Dict[Tuple, Tuple[str, int, int]]]:
+        """
+        汇总为重放链路：返回 (chains, locations)；
+        locations[(chain_key, page)] = (segment_path, offset, length)。
+        wanted 非空时仅保留其中的链路（由 build_chains 的过滤条件生成）。
+        """
+        locations: Dict[Tuple, Tuple[str, int, int]] = {}
+        meta: Dict[ChainKey, Tuple[str, int, Set[int]]] = {}
+        for day, seg_path, e in self.entries(start, end):
+            key = (day, e["api"], e["brand"], int(e["genre"]), e["country"], e["device"])
+            if wanted is not None and key not in wanted:
+                continue
+            page = int(e["page"])
+            locations[(key, page)] = (seg_path, int(e["offset"]), int(e["length"]))
+            m = meta.setdefault(key, (e["brand"], int(e.get("brand_id", -1)), set()))
+            m[2].add(page)
+        chains = [
+            PageChain(key[1], key[0], brand, brand_id, key[3], key[4], key[5], tuple(sorted(pages)))
+            for key, (brand, brand_id, pages) in sorted(meta.items())
+        ]
+        return chains, locations
+
+    @staticmethod
+    def read(location: Tuple[str, int, int]) -> Dict[str, Any]:
+        seg_path, offset, length = location
+        with open(seg_path, "rb") as fp:
+            fp.seek(offset)
+            blob = fp.read(length)
+        return jsonfast.loads(gzip.decompress(blob))
+
+
+def replay_fetcher(locations: Dict[Tuple, Tuple[str, int, int]]):
+    """返回与 fetch_chain_page 同签名的函数：从归档读取而不是请求网络。"""
+    def _fetch(chain: PageChain, page: int) -> Dict[str, Any]:
+        loc = locations.get((_chain_key(chain), page))
+        if loc is None:
+            return {}
+        return ArchiveReader.read(loc)
+    return _fetch
+
+
+# ---------- 旧目录树转换 ----------
+_LEGACY_RE = re.compile(r"^brand_(?P<brand>[^/]+)/genre_(?P<genre>\d+)/page_(?P<page>\d+)\.json$")
+
+
+def pack_legacy(root: str, country: str = "cn", device: str = "iphone", remove: bool = False) -> int:
+    """把 raw/<date>/brand_x/genre_y/page_n.json 转成分段归档。旧文件不含国家/设备，按参数补齐。"""
+    archive = RawArchive(root)
+    packed = 0
+    for day in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        day_dir = os.path.join(root, day)
+        if not os.path.isdir(day_dir):
+            continue
+        for dirpath, _dirs, files in os.walk(day_dir):
+            for fname in sorted(files):
+                rel = os.path.relpath(os.path.join(dirpath, fname), day_dir).replace(os.sep, "/")
+                m = _LEGACY_RE.match(rel)
+                if not m:
+                    continue
+                brand = m.group("brand")
+                if brand.isdigit():
+                    api, brand_id, brand = "indexPlus", int(brand), BRAND_MAP.get(int(brand), brand)
+                else:
+                    api, brand_id = "index", BRAND_NAME_TO_ID.get(brand, -1)
+                path = os.path.join(dirpath, fname)
+                with open(path, "r", encoding="utf-8") as fp:
+                    data = json.load(fp)
+                chain = PageChain(api, day, brand, brand_id, int(m.group("genre")), country, device, ())
+                archive.append(chain, int(m.group("page")), data)
+                packed += 1
+                if remove:
+                    os.remove(path)
+    return packed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Qimai 原始响应分段归档工具")
+    parser.add_argument("--root", type=str, required=True, help="归档根目录（如 qimai_out/raw）")
+    parser.add_argument("--start", type=str, default="0000-00-00")
+    parser.add_argument("--end", type=str, default="9999-99-99")
+    parser.add_argument("--stats", action="store_true", help="统计各日页数与压缩后大小")
+    parser.add_argument("--pack", action="store_true", help="把旧的每页一个 JSON 文件转换为分段归档")
+    parser.add_argument("--remove", action="store_true", help="--pack 后删除旧文件")
+    parser.add_argument("--country", type=str, default="cn", help="--pack 时补齐的国家")
+    parser.add_argument("--device", type=str, default="iphone", help="--pack 时补齐的设备")
+    args = parser.parse_args()
+
+    if args.pack:
+        n = pack_legacy(args.root, country=args.country, device=args.device, remove=args.remove)
+        print(f"Packed {n} legacy page files")
+    if args.stats:
+        reader = ArchiveReader(args.root)
+        per_day: Dict[str, List[int]] = {}
+        for day, _seg, e in reader.entries(args.start, args.end):
+            s = per_day.setdefault(day, [0, 0])
+            s[0] += 1
+            s[1] += int(e["length"])
+        for day, (pages, size) in sorted(per_day.items()):
+            print(f"{day}  pages={pages:<6} bytes={size}")
+        print(f"Total: {len(per_day)} days / {sum(v[0] for v in per_day.values())} pages / "
+              f"{sum(v[1] for v in per_day.values())} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把热表里的历史 raw_json 迁到 raw_payloads 副表（压缩 + 内容寻址）
+- 按主键区间分批：读 raw_json → 写 raw_payloads（INSERT IGNORE）→ 回写 raw_hash 并把 raw_json 置 NULL，每批一个事务。
+- 可重复执行：只处理 raw_hash IS NULL 且 raw_json 非空的行，中断后重跑即可继续。
+- 注意：app_ratings 历史行的 raw_json 入库时已截断到 2000 字符，迁过去的仍是截断内容（通常不是合法 JSON），
+  无法从库内恢复；需要完整原文时用 rank_crawl --replay --no-dedup 从归档重放覆盖这些行。
+- --optimize 迁移后执行 OPTIMIZE TABLE 回收空间；前后打印 information_schema 中的表大小。
+
+用法：
+  python -m app.util.raw_payload_migrate --tables app_ratings appstore_rankings_daily --batch 5000 --optimize
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+_HERE = Path(__file__).resolve()
+_BACKEND_DIR = _HERE.parents[2]  # .../hive_app/backend
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from sqlalchemy import text
+
+from app.db.base import SessionLocal
+from app.services import raw_payload_service
+
+TABLES = ("app_ratings", "appstore_rankings_daily")
+
+
+def table_size(db, table: str) -> str:
+    row = db.execute(text(
+        "SELECT table_rows, data_length, index_length FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = :t"), {"t": table}).first()
+    if row is None:
+        return "n/a"
+    rows, data, idx = row
+    return f"~{rows} rows, data {data / 1048576:.1f} MiB, index {idx / 1048576:.1f} MiB"
+
+
+def migrate_table(table: str, batch: int = 5000, dry_run: bool = False) -> int:
+    select_sql = text(
+        f"SELECT id, chart_date, raw_json FROM {table} "
+        "WHERE id > :last AND raw_hash IS NULL AND raw_json IS NOT NULL ORDER BY id LIMIT :n"
+    )
+    # 带上分区列 chart_date，分区表上只访问一个分区
+    update_sql = text(f"UPDATE {table} SET raw_hash = :raw_hash, raw_json = NULL WHERE id = :id AND chart_date = :d")
+    last, moved, t0 = 0, 0, time.time()
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(select_sql, {"last": last, "n": batch}).all()
+            if not rows:
+                break
+            last = rows[-1][0]
+            items = [{"id": i, "d": d, "raw_json": r if isinstance(r, str) else r.decode("utf-8")} for i, d, r in rows]
+            items, payloads = raw_payload_service.extract(items)
+            updates = [{"id": it["id"], "d": it["d"], "raw_hash": it["raw_hash"]} for it in items if it.get("raw_hash")]
+            if not dry_run and updates:
+                db.execute(raw_payload_service.INSERT_SQL, payloads)
+                db.execute(update_sql, updates)
+                db.commit()
+            moved += len(updates)
+            logging.info(f"[{table}] id<={last}：累计 {moved} 行，{len(payloads)} 个新载荷本批，"
+                         f"{moved / max(1e-6, time.time() - t0):.0f} 行/秒")
+    return moved
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="历史 raw_json 迁移到 raw_payloads 副表")
+    parser.add_argument("--tables", nargs="+", default=list(TABLES), choices=TABLES)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写库")
+    parser.add_argument("--optimize", action="store_true", help="迁移后 OPTIMIZE TABLE 回收空间")
+    args = parser.parse_args()
+
+    if not raw_payload_service.SIDE_STORE:
+        logging.warning("RAW_SIDE_STORE=0：写入路径仍内联 raw_json，迁移后新数据不会进入副表")
+    for table in args.tables:
+        with SessionLocal() as db:
+            logging.info(f"[{table}] 迁移前：{table_size(db, table)}")
+        moved = migrate_table(table, batch=args.batch, dry_run=args.dry_run)
+        with SessionLocal() as db:
+            if args.optimize and not args.dry_run and moved:
+                db.execute(text(f"OPTIMIZE TABLE {table}"))
+            logging.info(f"[{table}] 迁移 {moved} 行；迁移后：{table_size(db, table)}")
+        print(f"{table}: {moved} rows moved to raw_payloads")
+
+
+if __name__ == "__main__":
+    main()
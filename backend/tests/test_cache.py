@@ -0,0 +1,55 @@
+# tests/test_cache.py
+import asyncio
+
+from app.core.cache import LRUCache, ResponseCache
+
+
+def test_lru_evicts_oldest_by_bytes():
+    c = LRUCache(max_bytes=30)
+    c.set("a", b"x" * 9)   # 10 字节（值 + 键）
+    c.set("b", b"x" * 9)
+    c.set("c", b"x" * 9)
+    assert c.bytes == 30
+    c.set("d", b"x" * 9)
+    assert c.get("a") is None
+    assert len(c) == 3 and c.bytes == 30
+
+
+def test_lru_get_refreshes_recency():
+    c = LRUCache(max_bytes=30)
+    for k in "abc":
+        c.set(k, b"x" * 9)
+    assert c.get("a") is not None
+    c.set("d", b"x" * 9)
+    assert c.get("b") is None
+    assert c.get("a") is not None
+    assert c.hits == 2 and c.misses == 1
+
+
+def test_lru_one_large_value_evicts_several():
+    c = LRUCache(max_bytes=30)
+    for k in "abc":
+        c.set(k, b"x" * 9)
+    c.set("d", b"x" * 19)  # 20 字节，需淘汰 a、b
+    assert c.get("a") is None and c.get("b") is None
+    assert c.get("c") is not None
+    assert c.bytes == 30
+
+
+def test_lru_replace_updates_size_and_oversize_is_skipped():
+    c = LRUCache(max_bytes=30)
+    c.set("a", b"x" * 9)
+    c.set("a", b"x" * 4)
+    assert c.bytes == 5 and len(c) == 1
+    c.set("big", b"x" * 100)
+    assert c.get("big") is None
+    assert c.bytes == 5
+
+
+def test_response_cache_round_trip_local_only():
+    cache = ResponseCache(max_bytes=1 << 20)
+    key = cache.key("t", {"b": 2, "a": "x"}, 3)
+    assert key == cache.key("t", {"a": "x", "b": 2}, 3)
+    assert key != cache.key("t", {"a": "x", "b": 2}, 4)
+    asyncio.run(cache.set(key, {"items": [1, 2], "total": 2}))
+    assert asyncio.run(cache.get(key)) == {"items": [1, 2], "total": 2}
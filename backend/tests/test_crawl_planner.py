@@ -0,0 +1,69 @@
+# tests/test_crawl_planner.py
+import pytest
+
+from app.util.crawl_engine import PageChain
+from app.util.crawl_planner import PAGE_SIZE, CheckpointLedger, missing_pages, plan_chains
+
+PAGES = (1, 2, 3, 4, 5)
+
+
+def _chain(date_str="2025-01-01", brand="free", pages=PAGES):
+    return PageChain("index", date_str, brand, 1, 36, "cn", "iphone", pages)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    led = CheckpointLedger(str(tmp_path / "ledger.sqlite3"))
+    yield led
+    led.close()
+
+
+def test_missing_pages_no_record_fetches_all():
+    assert missing_pages(PAGES, {}) == PAGES
+
+
+def test_missing_pages_skips_full_pages():
+    assert missing_pages(PAGES, {1: PAGE_SIZE, 2: PAGE_SIZE}) == (3, 4, 5)
+
+
+def test_missing_pages_refetches_short_page():
+    assert missing_pages(PAGES, {1: PAGE_SIZE, 2: 7, 3: PAGE_SIZE}) == (2, 4, 5)
+
+
+def test_missing_pages_stops_at_empty_page():
+    assert missing_pages(PAGES, {1: PAGE_SIZE, 2: 0}) == ()
+
+
+def test_missing_pages_short_page_followed_by_empty_is_final():
+    assert missing_pages(PAGES, {1: PAGE_SIZE, 2: 7, 3: 0}) == ()
+
+
+def test_plan_chains_shrinks_to_gaps(ledger):
+    c = _chain()
+    ledger.record(c, 1, PAGE_SIZE)
+    ledger.record(c, 2, 5)
+    (planned,) = plan_chains([c], ledger)
+    assert planned.pages == (2, 3, 4, 5)
+    assert planned.date_str == c.date_str and planned.brand == c.brand
+
+
+def test_plan_chains_skips_ledger_complete_and_full_days(ledger):
+    done, full, todo = _chain("2025-01-01"), _chain("2025-01-02"), _chain("2025-01-03")
+    for p in PAGES:
+        ledger.record(done, p, PAGE_SIZE)
+    db_counts = {("index", "2025-01-02", "free", 36, "cn", "iphone"): 5 * PAGE_SIZE}
+    planned = plan_chains([done, full, todo], ledger, db_counts, max_pages=5)
+    assert [c.date_str for c in planned] == ["2025-01-03"]
+    assert planned[0].pages == PAGES
+
+
+def test_plan_chains_skips_days_marked_complete(ledger):
+    c = _chain()
+    ledger.mark_day_complete(c, 120)
+    assert plan_chains([c], ledger) == []
+
+
+def test_plan_chains_db_count_short_of_full_still_planned(ledger):
+    c = _chain()
+    db_counts = {("index", c.date_str, "free", 36, "cn", "iphone"): 5 * PAGE_SIZE - 1}
+    assert len(plan_chains([c], ledger, db_counts, max_pages=5)) == 1
@@ -0,0 +1,83 @@
+# tests/test_crawl_queue.py
+import pytest
+
+from app.util import crawl_queue
+from app.util.crawl_engine import PageChain
+from app.util.crawl_queue import CrawlQueue
+
+
+class _Clock:
+    def __init__(self, t=1_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(crawl_queue.time, "time", c)
+    return c
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    q = CrawlQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    yield q
+    q.close()
+
+
+def _chain(date_str="2025-01-01"):
+    return PageChain("indexPlus", date_str, "free", 1, 36, "cn", "iphone", (1, 2, 3))
+
+
+def _status(queue):
+    (p,) = queue.progress()
+    return {k: p[k] for k in ("pending", "leased", "expired", "done", "failed")}
+
+
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue([_chain()]) == 1
+    assert queue.enqueue([_chain(), _chain("2025-01-02")]) == 1
+
+
+def test_lease_is_exclusive_until_expiry(queue, clock):
+    queue.enqueue([_chain()])
+    assert queue.lease("w1", 10, lease_seconds=60) == [_chain()]
+    assert queue.lease("w2", 10, lease_seconds=60) == []
+    clock.t += 61
+    assert _status(queue)["expired"] == 1
+    assert queue.lease("w2", 10, lease_seconds=60) == [_chain()]
+
+
+def test_stale_worker_cannot_complete_released_task(queue, clock):
+    queue.enqueue([_chain()])
+    queue.lease("w1", 1, lease_seconds=60)
+    clock.t += 61
+    queue.lease("w2", 1, lease_seconds=60)
+    queue.complete("w1", _chain())  # 原 worker 租约已被接管，回写无效
+    assert _status(queue)["leased"] == 1
+    queue.complete("w2", _chain())
+    assert _status(queue)["done"] == 1
+
+
+def test_expired_lease_fails_after_max_attempts(queue, clock):
+    queue.enqueue([_chain()])
+    queue.lease("w1", 1, lease_seconds=60)
+    clock.t += 61
+    queue.lease("w2", 1, lease_seconds=60)  # 第 2 次（= max_attempts）
+    clock.t += 61
+    assert queue.lease("w3", 1, lease_seconds=60) == []
+    assert _status(queue)["failed"] == 1
+
+
+def test_fail_returns_to_pending_until_limit(queue):
+    queue.enqueue([_chain()])
+    queue.lease("w1", 1)
+    queue.fail("w1", _chain(), "boom")
+    assert _status(queue)["pending"] == 1
+    queue.lease("w1", 1)
+    queue.fail("w1", _chain(), "boom")
+    assert _status(queue)["failed"] == 1
+    assert queue.lease("w1", 1) == []
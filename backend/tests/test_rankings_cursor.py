@@ -0,0 +1,81 @@
+# tests/test_rankings_cursor.py
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import asc, create_engine, desc, select
+from sqlalchemy.orm import Session
+
+from app.api.v1.rankings import ALLOWED_SORT_COLUMNS, _decode_cursor, _encode_cursor, _seek
+from app.db.base import Base
+from app.db.models.rating import AppRatings
+
+D1 = date(2025, 1, 1)
+
+
+def test_cursor_round_trip_restores_types():
+    c = _encode_cursor("chart_date", "desc", D1, 7)
+    assert _decode_cursor(c, "chart_date", "desc") == (D1, 7)
+    c = _encode_cursor("rating", "asc", Decimal("4.5"), 3)
+    assert _decode_cursor(c, "rating", "asc") == (Decimal("4.5"), 3)
+    c = _encode_cursor("rating_count", "asc", None, 9)
+    assert _decode_cursor(c, "rating_count", "asc") == (None, 9)
+
+
+def test_cursor_rejects_garbage_and_mismatched_sort():
+    with pytest.raises(HTTPException) as e:
+        _decode_cursor("not-a-cursor", "index", "asc")
+    assert e.value.status_code == 400
+    c = _encode_cursor("index", "asc", 1, 1)
+    with pytest.raises(HTTPException):
+        _decode_cursor(c, "index", "desc")
+    with pytest.raises(HTTPException):
+        _decode_cursor(c, "rating_count", "asc")
+
+
+# ---------- 按游标翻完全部页，与一次性排序结果一致（SQLite 与 MySQL 的 NULL 排序相同） ----------
+@pytest.fixture
+def db():
+    table = AppRatings.__table__
+    autoinc = table.c.id.autoincrement
+    table.c.id.autoincrement = False  # SQLite 不支持复合主键上的自增
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[table])
+    table.c.id.autoincrement = autoinc
+    counts = [None, 5, None, 5, 1, None, 9, 1]
+    with Session(engine) as s:
+        s.execute(table.insert(), [
+            dict(id=i, app_id=f"a{i}", country="cn", brand="free", device="iphone", chart_date=D1,
+                 update_time=D1, index=i, rating_count=n)
+            for i, n in enumerate(counts, start=1)
+        ])
+        yield s
+
+
+def _walk(db, sort_key, sort_dir, page_size):
+    sort_col = ALLOWED_SORT_COLUMNS[sort_key]
+    direction = asc if sort_dir == "asc" else desc
+    base = select(AppRatings).order_by(direction(sort_col), direction(AppRatings.id))
+    seen, cursor = [], None
+    while True:
+        stmt = base
+        if cursor:
+            value, last_id = _decode_cursor(cursor, sort_key, sort_dir)
+            stmt = stmt.where(_seek(sort_col, sort_dir, value, last_id))
+        rows = db.execute(stmt.limit(page_size + 1)).scalars().all()
+        seen += [r.id for r in rows[:page_size]]
+        if len(rows) <= page_size:
+            return seen, [r.id for r in db.execute(base).scalars()]
+        last = rows[page_size - 1]
+        cursor = _encode_cursor(sort_key, sort_dir, getattr(last, sort_col.key), last.id)
+
+
+@pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+@pytest.mark.parametrize("page_size", [1, 2, 3])
+def test_cursor_pages_cover_null_sort_keys(db, sort_dir, page_size):
+    seen, expected = _walk(db, "rating_count", sort_dir, page_size)
+    assert seen == expected
+    assert len(expected) == 8
+    nulls = [1, 3, 6]
+    assert (expected[:3] if sort_dir == "asc" else expected[-3:]) == (nulls if sort_dir == "asc" else nulls[::-1])
@@ -0,0 +1,50 @@
+# tests/test_rate_control.py
+import pytest
+
+from app.util import rate_control
+from app.util.rate_control import AimdRateController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_control.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_additive_increase_stops_at_ceiling():
+    c = AimdRateController(4.0, max_rate=5.0, increase=2.0)
+    c.record("ok")
+    assert c.rate == pytest.approx(4.5)
+    for _ in range(20):
+        c.record("ok")
+    assert c.rate == 5.0
+
+
+def test_initial_rate_clamped_to_bounds():
+    assert AimdRateController(100.0, max_rate=8.0).rate == 8.0
+    assert AimdRateController(0.01, min_rate=0.5).rate == 0.5
+
+
+def test_errors_within_cooldown_cut_once(clock):
+    c = AimdRateController(8.0, decrease=0.5, cooldown=2.0)
+    c.record("429")
+    assert c.rate == 4.0
+    clock[0] += 1.0
+    c.record("timeout")
+    assert c.rate == 4.0
+    assert c.cuts == 1
+    assert c.errors["429"] == 1 and c.errors["timeout"] == 1
+    clock[0] += 1.5
+    c.record("code")
+    assert c.rate == 2.0
+    assert c.cuts == 2
+
+
+def test_cut_never_goes_below_floor(clock):
+    c = AimdRateController(1.0, min_rate=0.4, decrease=0.5, cooldown=1.0)
+    for _ in range(5):
+        clock[0] += 2.0
+        c.record("error")
+    assert c.rate == 0.4
+    assert c.snapshot()["error_rate"] == 1.0
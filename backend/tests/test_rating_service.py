@@ -0,0 +1,92 @@
+# tests/test_rating_service.py
+import contextlib
+from datetime import date
+
+import pytest
+
+from app.services import rating_service
+from app.services.rating_service import parse_count, row_hash, typed_fields
+
+
+def _rec(app_id, **kw):
+    rec = {"chart_date": date(2025, 1, 1), "country": "cn", "device": "iphone", "brand": "free",
+           "app_id": app_id, "app_name": f"app-{app_id}", "index": 1, "rating_num": "132万"}
+    rec.update(kw)
+    return rec
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("132万", 1_320_000),
+    ("1.2亿", 120_000_000),
+    ("12,345", 12345),
+    ("3.5w", 35_000),
+    ("2K+", 2_000),
+    (" 88 ", 88),
+    (7, 7),
+    ("", None),
+    ("暂无", None),
+    (None, None),
+    (True, None),
+])
+def test_parse_count(raw, expected):
+    assert parse_count(raw) == expected
+
+
+def test_typed_fields_parses_json_and_dict_scopes():
+    out = typed_fields({
+        "rank_a": '{"genre": "游戏", "ranking": "3", "change": -2}',
+        "rank_b": {"genre": "", "ranking": None, "change": "x"},
+        "rank_c": "not json",
+        "rating_num": "132万",
+    })
+    assert out["rank_a_genre"] == "游戏"
+    assert out["rank_a_ranking"] == 3
+    assert out["rank_a_change"] == -2
+    assert out["rank_b_genre"] is None
+    assert out["rank_b_ranking"] is None
+    assert out["rank_b_change"] is None
+    assert out["rank_c_genre"] is None and out["rank_c_ranking"] is None
+    assert out["rating_count"] == 1_320_000
+
+
+def test_row_hash_distinguishes_none_from_empty():
+    assert row_hash(_rec("a")) == row_hash(_rec("a"))
+    assert row_hash(_rec("a", app_name=None)) != row_hash(_rec("a", app_name=""))
+    assert row_hash(_rec("a")) != row_hash(_rec("a", index=2))
+    # id 不计入指纹
+    assert row_hash(_rec("a", id=1)) == row_hash(_rec("a", id=2))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    state = {"found": {}, "written": None, "new_rows": None}
+    monkeypatch.setattr(rating_service, "SessionLocal", lambda: contextlib.nullcontext(object()))
+    monkeypatch.setattr(rating_service, "_existing_hashes", lambda db, recs: state["found"])
+
+    def _upsert(table, rows, db=None, new_rows=None):
+        state["written"], state["new_rows"] = rows, new_rows
+    monkeypatch.setattr(rating_service, "upsert_sync", _upsert)
+    return state
+
+
+def _key(rec):
+    return tuple(rec[k] for k in rating_service._KEY)
+
+
+def test_counts_inserted_changed_unchanged(fake_db):
+    same, changed, new = _rec("same"), _rec("changed"), _rec("new")
+    fake_db["found"] = {
+        _key(same): row_hash(rating_service.fill_typed(_rec("same"))),
+        _key(changed): "0" * 16,
+    }
+    counts = rating_service.upsert_app_ratings_counts([same, changed, new])
+    assert counts == {"inserted": 1, "changed": 1, "unchanged": 1}
+    assert [r["app_id"] for r in fake_db["written"]] == ["changed", "new"]
+    assert [r["app_id"] for r in fake_db["new_rows"]] == ["new"]
+
+
+def test_counts_last_duplicate_wins_and_unchanged_skips_write(fake_db):
+    first, last = _rec("a", index=1), _rec("a", index=2)
+    fake_db["found"] = {_key(last): row_hash(rating_service.fill_typed(_rec("a", index=2)))}
+    assert rating_service.upsert_app_ratings_counts([first, last]) == {"inserted": 0, "changed": 0, "unchanged": 1}
+    assert fake_db["written"] is None
@@ -0,0 +1,96 @@
+# tests/test_rollup_service.py
+import statistics
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.models.ranking import AppStoreRankingDaily
+from app.db.models.rollup import RankingGenreDaily
+from app.services import rollup_service
+
+D1, D2 = date(2025, 1, 1), date(2025, 1, 2)
+
+
+def test_stddev_pop_matches_statistics():
+    vals = [3, 7, 7, 19, 1]
+    got = rollup_service.stddev_pop(sum(vals), sum(v * v for v in vals), len(vals))
+    assert got == pytest.approx(statistics.pstdev(vals))
+
+
+def test_stddev_pop_empty_and_constant():
+    assert rollup_service.stddev_pop(0, 0, 0) is None
+    assert rollup_service.stddev_pop(15, 75, 3) == 0.0  # 5,5,5
+
+
+def test_merge_days_sums_across_genres():
+    rows = [
+        (D1, 3, 30, 3, 20, 200, 2, 4),
+        (D1, 2, 10, 1, 5, 25, 1, 2),
+        (D2, 1, 7, 1, None, None, 0, 1),
+    ]
+    out = rollup_service.merge_days(rows)
+    assert out[D1] == {"apps": 5, "best_rank_sum": 40, "best_rank_cnt": 4, "rank_sum": 25,
+                       "rank_sum_sq": 225, "rank_cnt": 3, "entries": 6}
+    assert out[D2]["rank_cnt"] == 0 and out[D2]["rank_sum"] == 0
+
+
+def test_merged_stddev_equals_stddev_over_all_rows():
+    a, b = [4, 9, 12], [1, 30]
+    rows = [(D1, 0, 0, 0, sum(v), sum(x * x for x in v), len(v), len(v)) for v in (a, b)]
+    m = rollup_service.merge_days(rows)[D1]
+    assert rollup_service.stddev_pop(m["rank_sum"], m["rank_sum_sq"], m["rank_cnt"]) == \
+        pytest.approx(statistics.pstdev(a + b))
+
+
+# ---------- 先删后插的按天重算（SQLite 上执行同一组语句） ----------
+@pytest.fixture
+def db():
+    facts = AppStoreRankingDaily.__table__
+    autoinc = facts.c.id.autoincrement
+    facts.c.id.autoincrement = False  # SQLite 不支持复合主键上的自增
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[facts, RankingGenreDaily.__table__])
+    facts.c.id.autoincrement = autoinc
+    with Session(engine) as s:
+        yield s
+
+
+def _fact(i, d, app_id, ranking, index, genre="36", app_genre="游戏"):
+    return dict(id=i, chart_date=d, brand_id=1, country="cn", device="iphone", genre=genre,
+                app_genre=app_genre, app_id=app_id, app_name=app_id, ranking=ranking, index=index)
+
+
+def _rollup(db):
+    R = RankingGenreDaily
+    return {(r.chart_date, r.genre, r.app_genre): (r.apps, r.best_rank_sum, r.best_rank_cnt, r.rank_cnt, r.entries)
+            for r in db.execute(select(R)).scalars()}
+
+
+def test_refresh_recomputes_day_and_is_idempotent(db):
+    facts = [
+        _fact(1, D1, "a", 3, 1), _fact(2, D1, "a", None, 2),        # 同日同 app：最好名次取 MIN(COALESCE)
+        _fact(3, D1, "b", None, 5, app_genre=None),                # app_genre 为空 → ''
+        _fact(4, D1, "a", 8, 4, genre="6014"),                     # 另一榜单分类单独成行
+        _fact(5, D2, "c", 1, 1),
+    ]
+    db.execute(AppStoreRankingDaily.__table__.insert(), facts)
+    assert rollup_service.refresh_sync(db, facts[:4]) == 1  # 只重算 D1
+    expected = {
+        (D1, "36", "游戏"): (1, 2, 1, 1, 2),
+        (D1, "36", ""): (1, 5, 1, 0, 1),
+        (D1, "6014", "游戏"): (1, 8, 1, 1, 1),
+    }
+    assert _rollup(db) == expected
+    rollup_service.refresh_sync(db, facts[:4])
+    assert _rollup(db) == expected  # 重复入库不累加
+
+
+def test_refresh_replaces_stale_rows(db):
+    db.execute(AppStoreRankingDaily.__table__.insert(), [_fact(1, D1, "a", 3, 3)])
+    rollup_service.refresh_sync(db, [_fact(1, D1, "a", 3, 3)])
+    db.execute(AppStoreRankingDaily.__table__.update().values(app_genre="工具"))
+    rollup_service.refresh_sync(db, [_fact(1, D1, "a", 3, 3)])
+    assert list(_rollup(db)) == [(D1, "36", "工具")]